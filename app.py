@@ -1,8 +1,16 @@
 import dash
 from dash import Dash, html, dcc
+import metricas
+import planilhas
+import perfis
+import exportacoes
 
 app = Dash(__name__, suppress_callback_exceptions=True, use_pages=True)
 server = app.server
+metricas.registrar(server)
+planilhas.registrar(server)
+perfis.registrar(server)
+exportacoes.registrar(server)
 
 SERVER_DATA_PATH = '/data/stores.xlsx' 
 
@@ -0,0 +1,12 @@
+"""Benchmarks com dados sintéticos para medir como o app escala.
+
+- gerador: cria stores.xlsx e b.xlsx realistas em qualquer tamanho
+- executar: chama os callbacks das páginas diretamente e mede latência e pico de memória
+- carga: sobe o servidor local e simula usuários concorrentes via HTTP
+
+Uso (a partir da raiz do repositório):
+
+    python -m benchmarks.executar --tamanhos 1000 10000 100000 --json resultados.json
+    python -m benchmarks.gerador data --clientes 10000
+    python -m benchmarks.carga --clientes 10000 --usuarios 1 2 4 8 --duracao 30
+"""
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from benchmarks.gerador import gerar_dados
+
+
+#REFERENTE AO TESTE DE CARGA!!!
+# Sobe o app.server localmente e reproduz o tráfego dos callbacks via
+# /_dash-update-component. Só usa a biblioteca padrão e localhost.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROTA_CALLBACKS = '/_dash-update-component'
+
+PAGINAS = ['/', '/dados', '/cadastro', '/novos_clientes', '/Emprestimos', '/agents-analysis']
+
+# Callbacks disparados ao abrir cada página (chave: trecho do output)
+CALLBACKS_INICIAIS = {
+    '/': ['cliente-dropdown.options', 'grafico-mensal.figure', 'ranking-previsao.data'],
+    '/dados': ['data-store.data', 'full-data-table.data'],
+    '/cadastro': ['cliente-transacao.options', 'cliente-faturamento.options', 'cliente-semanal.options'],
+    '/novos_clientes': ['cliente-select.options'],
+    '/Emprestimos': ['tabela-dados.data', 'soma-result.children'],
+    '/agents-analysis': ['dynamic-content.children', 'agent-table.data'],
+}
+
+# Peso de cada cenário no tráfego simulado
+CENARIOS = {
+    'navegacao': 3,
+    'cliente_dropdown': 3,
+    'date_picker': 3,
+    'salvar_formulario': 1,
+}
+
+
+class ClienteDash:
+    """Monta e envia requisições de callback a partir de /_dash-dependencies"""
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.dependencias = self._get_json('/_dash-dependencies')
+
+    def _get_json(self, caminho):
+        with urllib.request.urlopen(self.url + caminho, timeout=self.timeout) as resposta:
+            return json.loads(resposta.read())
+
+    def get(self, caminho):
+        with urllib.request.urlopen(self.url + caminho, timeout=self.timeout) as resposta:
+            return resposta.status, resposta.read()
+
+    def dependencia(self, trecho):
+        # Saídas com allow_duplicate (sufixo @hash) são de callbacks secundários
+        for dep in self.dependencias:
+            if trecho in dep['output'].strip('.').split('...') and not dep.get('clientside_function'):
+                return dep
+        raise KeyError(f"Callback com output '{trecho}' não encontrado")
+
+    def montar(self, dep, valores, disparo):
+        """Corpo da requisição; props ausentes em `valores` vão como None"""
+        def props(lista):
+            return [
+                {'id': p['id'], 'property': p['property'], 'value': valores.get(f"{p['id']}.{p['property']}")}
+                for p in lista
+            ]
+
+        saidas = [
+            {'id': s.split('@')[0].rsplit('.', 1)[0], 'property': s.split('@')[0].rsplit('.', 1)[1]}
+            for s in dep['output'].strip('.').split('...')
+        ]
+        return {
+            'output': dep['output'],
+            'outputs': saidas if dep['output'].startswith('..') else saidas[0],
+            'inputs': props(dep['inputs']),
+            'state': props(dep['state']),
+            'changedPropIds': [disparo] if disparo else [],
+        }
+
+    def chamar(self, trecho, valores, disparo=None):
+        """Dispara o callback e devolve (status, corpo em JSON ou None)"""
+        corpo = json.dumps(self.montar(self.dependencia(trecho), valores, disparo)).encode()
+        requisicao = urllib.request.Request(
+            self.url + ROTA_CALLBACKS, data=corpo, headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+                conteudo = resposta.read()
+                return resposta.status, (json.loads(conteudo) if conteudo else None)
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class Resultados:
+    def __init__(self):
+        self.amostras = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, segundos, ok):
+        with self._lock:
+            self.amostras.setdefault(nome, []).append((segundos, ok))
+
+
+def _percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+def _medir(resultados, nome, func):
+    inicio = time.perf_counter()
+    try:
+        status, corpo = func()
+        # 204 é PreventUpdate/no_update, resposta válida do Dash
+        ok = status in (200, 204)
+    except Exception:
+        corpo, ok = None, False
+    resultados.registrar(nome, time.perf_counter() - inicio, ok)
+    return corpo
+
+def _intervalo_aleatorio(rng, inicio, dias):
+    a = inicio + timedelta(days=rng.randrange(dias))
+    b = a + timedelta(days=rng.randrange(1, dias))
+    return a.isoformat(), b.isoformat()
+
+def navegacao(cliente, rng, resultados, contexto):
+    pagina = rng.choice(PAGINAS)
+    _medir(resultados, 'GET ' + pagina, lambda: cliente.get(pagina))
+    _medir(resultados, '_pages_content.children', lambda: cliente.chamar(
+        '_pages_content.children', {'_pages_location.pathname': pagina, '_pages_location.search': ''},
+        '_pages_location.pathname'
+    ))
+
+    valores = {
+        'interval-component.n_intervals': 0, 'refresh-interval.n_intervals': 0,
+        'sheet-selector.value': 'Sheet1', 'agent-selector.value': 'all',
+        'date-picker.start_date': '2025-01-01', 'date-picker.end_date': '2025-12-31',
+    }
+    for trecho in CALLBACKS_INICIAIS[pagina]:
+        corpo = _medir(resultados, trecho, lambda: cliente.chamar(trecho, valores))
+        # A tabela de dados recebe de volta o que o data-store devolveu
+        if trecho == 'data-store.data' and corpo:
+            valores['data-store.data'] = corpo['response']['data-store']['data']
+
+def cliente_dropdown(cliente, rng, resultados, contexto):
+    nomes = rng.sample(contexto['nomes'], k=rng.randint(1, 3))
+    inicio, fim = _intervalo_aleatorio(rng, date.today() - timedelta(days=365), 300)
+    _medir(resultados, 'grafico-mensal.figure', lambda: cliente.chamar('grafico-mensal.figure', {
+        'cliente-dropdown.value': nomes, 'date-range.start_date': inicio,
+        'date-range.end_date': fim, 'metodo-previsao.value': 'media',
+        'interval-component.n_intervals': 0
+    }, 'cliente-dropdown.value'))
+
+def date_picker(cliente, rng, resultados, contexto):
+    inicio, fim = _intervalo_aleatorio(rng, date(2025, 1, 1), 330)
+    valores = {'date-picker.start_date': inicio, 'date-picker.end_date': fim, 'tabela-dados.selected_rows': []}
+    for trecho in ['tabela-dados.data', 'soma-result.children', 'output-mensagem.children']:
+        _medir(resultados, trecho, lambda: cliente.chamar(trecho, valores, 'date-picker.start_date'))
+
+def salvar_formulario(cliente, rng, resultados, contexto):
+    _medir(resultados, 'alert-transacao.is_open', lambda: cliente.chamar('alert-transacao.is_open', {
+        'salvar-transacao.n_clicks': 1,
+        'cliente-transacao.value': rng.choice(contexto['cpfs']),
+        'data-transacao.date': (date.today() - timedelta(days=rng.randrange(30))).isoformat(),
+        'valor-transacao.value': round(rng.uniform(10, 2000), 2),
+    }, 'salvar-transacao.n_clicks'))
+
+def usuario_virtual(cliente, semente, fim, resultados, contexto):
+    rng = random.Random(semente)
+    funcoes = [globals()[nome] for nome in CENARIOS]
+    pesos = list(CENARIOS.values())
+    while time.monotonic() < fim:
+        rng.choices(funcoes, weights=pesos)[0](cliente, rng, resultados, contexto)
+        time.sleep(rng.uniform(0, contexto['pausa']))
+
+def executar_estagio(cliente, usuarios, duracao, contexto, semente):
+    resultados = Resultados()
+    fim = time.monotonic() + duracao
+    threads = [
+        threading.Thread(target=usuario_virtual, args=(cliente, semente + i, fim, resultados, contexto), daemon=True)
+        for i in range(usuarios)
+    ]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados, time.perf_counter() - inicio
+
+def imprimir(usuarios, resultados, decorrido):
+    total = sum(len(a) for a in resultados.amostras.values())
+    print(f"\n=== {usuarios} usuário(s) - {total} requisições em {decorrido:.1f}s ({total / decorrido:.2f} req/s) ===")
+    print(f"{'callback':<40}{'n':>7}{'req/s':>9}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'erros':>8}")
+    for nome, amostras in sorted(resultados.amostras.items()):
+        tempos = [t * 1000 for t, _ in amostras]
+        erros = sum(1 for _, ok in amostras if not ok) / len(amostras)
+        print(
+            f"{nome[:39]:<40}{len(amostras):>7}{len(amostras) / decorrido:>9.2f}{_percentil(tempos, 50):>11.1f}"
+            f"{_percentil(tempos, 95):>11.1f}{_percentil(tempos, 99):>11.1f}{erros:>8.1%}"
+        )
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def iniciar_servidor(pasta, porta):
+    """Sobe o app (servidor do Flask, com threads) com cwd na pasta dos dados gerados"""
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+    ambiente.pop('RENDER', None)
+    processo = subprocess.Popen(
+        [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={porta}, debug=False, threaded=True)"],
+        cwd=pasta, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{porta}'
+    limite = time.monotonic() + 300
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("O servidor encerrou durante a inicialização")
+        try:
+            urllib.request.urlopen(url + '/_dash-dependencies', timeout=5).close()
+            return processo, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    processo.terminate()
+    raise RuntimeError("O servidor não respondeu a tempo")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP dos callbacks do Dash")
+    parser.add_argument('--clientes', type=int, default=1000, help="Tamanho dos dados gerados")
+    parser.add_argument('--usuarios', type=int, nargs='+', default=[1, 2, 4, 8], help="Usuários virtuais de cada estágio")
+    parser.add_argument('--duracao', type=float, default=30, help="Segundos por estágio")
+    parser.add_argument('--pausa', type=float, default=1.0, help="Pausa máxima entre ações de um usuário (s)")
+    parser.add_argument('--url', help="Usa um servidor já rodando (ex.: gunicorn) em vez de subir um")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    contexto = {'pausa': args.pausa}
+
+    with tempfile.TemporaryDirectory(prefix='carga_') as pasta:
+        processo = None
+        try:
+            if args.url:
+                url = args.url
+            else:
+                gerar_dados(os.path.join(pasta, 'data'), n_clientes=args.clientes, seed=args.seed)
+                processo, url = iniciar_servidor(pasta, _porta_livre())
+                print(f"Servidor em {url} com {args.clientes} clientes")
+
+            cliente = ClienteDash(url)
+            # Clientes reais do servidor, pelas opções dos próprios dropdowns
+            _, corpo = cliente.chamar('cliente-dropdown.options', {'interval-component.n_intervals': 0})
+            contexto['nomes'] = [o['value'] for o in corpo['response']['cliente-dropdown']['options']][:1000]
+            _, corpo = cliente.chamar('cliente-transacao.options', {})
+            contexto['cpfs'] = [o['value'] for o in corpo['response']['cliente-transacao']['options']][:1000]
+
+            for i, usuarios in enumerate(args.usuarios):
+                resultados, decorrido = executar_estagio(cliente, usuarios, args.duracao, contexto, args.seed + i * 1000)
+                imprimir(usuarios, resultados, decorrido)
+        finally:
+            if processo:
+                processo.terminate()
+                processo.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
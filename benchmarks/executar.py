@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import statistics
+from datetime import datetime, timedelta
+
+from dash._utils import AttributeDict
+from dash._callback_context import context_value
+
+
+#REFERENTE AOS BENCHMARKS!!!
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAMANHOS = [1000, 10000, 100000]
+
+
+def _com_gatilho(prop_id, func, *args):
+    """Executa um callback como se `prop_id` tivesse disparado (ctx.triggered/triggered_id)"""
+    token = context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': 1}]))
+    try:
+        return func(*args)
+    finally:
+        context_value.reset(token)
+
+def montar_alvos():
+    """Lista (nome, função sem argumentos) de cada callback medido.
+
+    Os alvos que escrevem nas planilhas ficam por último para não alterar
+    a base das leituras.
+    """
+    sys.path.insert(0, RAIZ)
+    import app  # noqa: F401 - registra as páginas
+    import data_processing
+    import memoria
+    import planilhas
+    from pages import analise, agent_analysis, dados, Emprestimos, inputs, novos_clientes
+
+    import pandas as pd
+
+    cadastros = pd.read_excel(dados.EXCEL_PATH, sheet_name='Sheet1', usecols=['ESTABELECIMENTO NOME1', 'ESTABELECIMENTO CPF/CNPJ'], dtype=str)
+    nomes = cadastros['ESTABELECIMENTO NOME1'].head(3).tolist()
+    cpf = cadastros['ESTABELECIMENTO CPF/CNPJ'].iloc[0]
+    analise_30 = pd.read_excel(novos_clientes.EXCEL_PATH, sheet_name='30_days_analysis', usecols=['cpf_cnpj'], dtype=str)
+    cpf_novo_cliente = analise_30['cpf_cnpj'].iloc[0]
+
+    hoje = datetime.today()
+    inicio = (hoje - timedelta(days=365)).strftime('%Y-%m-%d')
+    fim = hoje.strftime('%Y-%m-%d')
+    inicio_emp, fim_emp = '2025-01-01', '2025-12-31'
+
+    def ler_abas_sequencial():
+        # PLANILHAS_PROCESSOS=1 só para esta leitura: mesmo arquivo, parse sem o pool
+        processos, planilhas.PROCESSOS = planilhas.PROCESSOS, 1
+        try:
+            return planilhas.ler_abas(analise.EXCEL_PATH, engine='openpyxl')
+        finally:
+            planilhas.PROCESSOS = processos
+
+    def recarregar_analise():
+        analise.cached_data['last_modified'] = None
+        analise.load_data()
+
+    registros_dados = dados.update_data_store('Sheet1')
+    vazio_emprestimos = [None] * len(Emprestimos.input_columns)
+    formulario = ['2025-06-15', 'Felipe', 'Benchmark', '', 1000, 880, 6, 1.5, 50, 0]
+    contador = {'cpf': 0}
+
+    def salvar_cadastro():
+        contador['cpf'] += 1
+        inputs.salvar_cadastro(
+            1, '2025-06-15', '2025-06-18', f"BENCH {contador['cpf']}", f"9{contador['cpf']:010d}",
+            'Outros', 'Responsável', '(11) 90000-0000', '', 'Ana Souza', 'ATIVO', 'HABILITADO',
+            'HABILITADO', '', 'NNA'
+        )
+
+    return [
+        ('data_processing.load_and_process_data', data_processing.load_and_process_data),
+        ('data_processing.load_and_process_data (fria)', lambda: (memoria.descartar(data_processing.ESPACO_PARTICOES), data_processing.load_and_process_data())),
+        ('planilhas.ler_abas (sequencial)', ler_abas_sequencial),
+        (f'planilhas.ler_abas (pool de {planilhas.PROCESSOS})', lambda: planilhas.ler_abas(analise.EXCEL_PATH, engine='openpyxl')),
+        ('analise.load_data', recarregar_analise),
+        ('analise.update_dropdown_options', lambda: analise.update_dropdown_options(0)),
+        ('analise.update_analysis', lambda: analise.update_analysis(nomes, inicio, fim, 'media', 0)),
+        ('analise.montar_figuras', lambda: analise.montar_figuras(analise.dados_atuais(), nomes, inicio, fim)),
+        ('analise.update_ranking', lambda: analise.update_ranking('media', 0)),
+        ('agent_analysis.update_analysis', lambda: agent_analysis.update_analysis(inicio_emp, fim_emp, 'all')),
+        ('dados.update_data_store', lambda: dados.update_data_store('Sheet1')),
+        ('dados.update_table', lambda: dados.update_table(registros_dados, 'ESTABELECIMENTO 00', None, ['ATIVO'])),
+        ('Emprestimos.filtrar_dados', lambda: Emprestimos.filtrar_dados(inicio_emp, fim_emp)),
+        ('Emprestimos.calcular_soma', lambda: Emprestimos.calcular_soma(inicio_emp, fim_emp)),
+        ('Emprestimos.gerenciar_dados (filtro)', lambda: _com_gatilho('date-picker.start_date', Emprestimos.gerenciar_dados, *vazio_emprestimos, None, None, None, inicio_emp, fim_emp, [])),
+        ('Emprestimos.gerenciar_dados (exportar)', lambda: _com_gatilho('exportar-btn.n_clicks', Emprestimos.gerenciar_dados, *vazio_emprestimos, None, 1, None, inicio_emp, fim_emp, [])),
+        ('data_processing.exportar_dados', lambda: data_processing.exportar_dados(data_processing.load_and_process_data())),
+        ('novos_clientes.update_dropdown', lambda: novos_clientes.update_dropdown(0)),
+        ('novos_clientes.update_cliente_selecionado', lambda: _com_gatilho('cliente-select.value', novos_clientes.update_cliente_selecionado, cpf_novo_cliente, 'auto', None)),
+        ('novos_clientes.update_cliente_selecionado (agrupamento)', lambda: _com_gatilho('agrupamento-transacoes.value', novos_clientes.update_cliente_selecionado, cpf_novo_cliente, 'semana', None)),
+        ('inputs.carregar_clientes', lambda: inputs.carregar_clientes(None)),
+        ('inputs.carregar_clientes_faturamento', lambda: inputs.carregar_clientes_faturamento(None)),
+        ('inputs.carregar_clientes_semanal', lambda: inputs.carregar_clientes_semanal(None)),
+        # Escritas
+        ('inputs.salvar_transacao', lambda: inputs.salvar_transacao(1, cpf, '2025-06-15', 150.0)),
+        ('inputs.salvar_faturamento', lambda: inputs.salvar_faturamento(1, cpf, 'Janeiro', 1234.5)),
+        ('inputs.salvar_semanal', lambda: inputs.salvar_semanal(1, cpf, 'Janeiro', 2, 321.0)),
+        ('inputs.salvar_cadastro', salvar_cadastro),
+        ('Emprestimos.gerenciar_dados (salvar)', lambda: _com_gatilho('salvar-btn.n_clicks', Emprestimos.gerenciar_dados, *formulario, 1, None, None, inicio_emp, fim_emp, [])),
+    ]
+
+def medir(func, repeticoes):
+    """Latências (s) de `repeticoes` execuções e o pico de memória (bytes) de uma execução extra"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+
+    # tracemalloc deixa a execução mais lenta, por isso roda separado das latências
+    tracemalloc.start()
+    try:
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return tempos, pico
+
+def executar_tamanho(repeticoes, filtro=None):
+    """Roda no diretório de dados já gerado (cwd) e devolve os resultados por alvo"""
+    resultados = []
+    for nome, func in montar_alvos():
+        if filtro and filtro not in nome:
+            continue
+        try:
+            tempos, pico = medir(func, repeticoes)
+            resultados.append({
+                'alvo': nome,
+                'mediana_ms': statistics.median(tempos) * 1000,
+                'min_ms': min(tempos) * 1000,
+                'max_ms': max(tempos) * 1000,
+                'pico_mb': pico / 1024 / 1024,
+            })
+        except Exception as e:
+            resultados.append({'alvo': nome, 'erro': str(e)})
+    return resultados
+
+def imprimir(tamanho, resultados):
+    print(f"\n=== {tamanho} clientes/empréstimos ===")
+    print(f"{'alvo':<45}{'mediana (ms)':>14}{'min (ms)':>12}{'max (ms)':>12}{'pico (MB)':>12}")
+    for r in resultados:
+        if 'erro' in r:
+            print(f"{r['alvo']:<45}  ERRO: {r['erro']}")
+            continue
+        print(f"{r['alvo']:<45}{r['mediana_ms']:>14.1f}{r['min_ms']:>12.1f}{r['max_ms']:>12.1f}{r['pico_mb']:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede latência e pico de memória dos callbacks com dados sintéticos")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--filtro', help="Mede só os alvos cujo nome contém este texto")
+    parser.add_argument('--json', help="Grava os resultados neste arquivo")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--_filho', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--_saida', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._filho:
+        resultados = executar_tamanho(args.repeticoes, args.filtro)
+        with open(args._saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f)
+        return
+
+    from benchmarks.gerador import gerar_dados
+
+    todos = {}
+    for tamanho in args.tamanhos:
+        # Cada tamanho roda num processo e diretório próprios: as páginas resolvem
+        # data/ a partir do cwd e carregam as planilhas na importação
+        with tempfile.TemporaryDirectory(prefix=f'bench_{tamanho}_') as pasta:
+            inicio = time.perf_counter()
+            gerar_dados(os.path.join(pasta, 'data'), n_clientes=tamanho, seed=args.seed)
+            print(f"Dados de {tamanho} gerados em {time.perf_counter() - inicio:.1f}s")
+
+            saida = os.path.join(pasta, 'resultados.json')
+            comando = [sys.executable, '-m', 'benchmarks.executar', '--_filho', '--_saida', saida,
+                       '--repeticoes', str(args.repeticoes)]
+            if args.filtro:
+                comando += ['--filtro', args.filtro]
+            ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+            ambiente.pop('RENDER', None)
+            subprocess.run(comando, cwd=pasta, env=ambiente, check=True)
+
+            with open(saida, encoding='utf-8') as f:
+                todos[tamanho] = json.load(f)
+        imprimir(tamanho, todos[tamanho])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(todos, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
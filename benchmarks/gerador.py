@@ -0,0 +1,191 @@
+import argparse
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+
+#REFERENTE AOS BENCHMARKS!!!
+
+# xlsxwriter é bem mais rápido para gerar 100k linhas; sem ele cai para o openpyxl
+MOTOR_EXCEL = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') else 'openpyxl'
+
+# Colunas mensais da Sheet1, na ordem da planilha real (Dezembro aparece duas vezes)
+MESES_SHEET1 = [
+    'Dezembro', 'Janeiro', 'Fevereiro', 'Marco', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+MESES_SEMANAIS = [
+    'Janeiro', 'Fevereiro', 'Marco', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+ABAS_EMPRESTIMOS = ['JAN', 'FEV', 'MAR', 'ABR', 'MAI', 'JUN', 'JUL', 'AGO', 'SET', 'OUT', 'NOV', 'DEZ']
+
+COLUNAS_EMPRESTIMOS = [
+    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
+    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
+    'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
+    '%trans', '%liberad'
+]
+
+TIPOS_COMERCIO = [
+    'Restaurantes', 'Cafeterias', 'Lanchonetes', 'Padarias e Confeitarias',
+    'Mercados e Mercearias', 'Farmácias e Drogarias', 'Serviços', 'Outros'
+]
+
+REPRESENTANTES = ['Ana Souza', 'Bruno Lima', 'Carla Dias', 'Diego Reis', 'Elisa Prado']
+AGENTES = ['Alessandro', 'Felipe', 'Marcos', 'Paula', 'Renata', 'Tiago']
+
+
+def _datas(rng, n, inicio, dias):
+    base = np.datetime64(inicio)
+    return pd.to_datetime(base + rng.integers(0, dias, n).astype('timedelta64[D]'))
+
+def gerar_cadastros(rng, n_clientes, hoje):
+    cpfs = (10_000_000_000 + rng.choice(89_999_999_999, n_clientes, replace=False)).astype(str)
+    cadastro = _datas(rng, n_clientes, hoje - np.timedelta64(400, 'D'), 400)
+
+    colunas = {
+        'DATA DE CADASTRO': cadastro.strftime('%d/%m/%Y'),
+        'DATA DE APROVAÇÃO': (cadastro + pd.Timedelta(days=3)).strftime('%d/%m/%Y'),
+        'ESTABELECIMENTO NOME1': [f'ESTABELECIMENTO {i:06d}' for i in range(n_clientes)],
+        'ESTABELECIMENTO CPF/CNPJ': cpfs,
+        'TIPO DE COMÉRCIO': rng.choice(TIPOS_COMERCIO, n_clientes),
+        'RESPONSÁVEL DO ESTABELECIMENTO': [f'Responsável {i}' for i in range(n_clientes)],
+        'RESPONSÁVEL E-MAIL': [f'contato{i}@exemplo.com' for i in range(n_clientes)],
+        'RESPONSÁVEL CPF/CNPJ': (20_000_000_000 + np.arange(n_clientes)).astype(str),
+        'RESPONSÁVEL TELEFONE': [f'(11) 9{i:08d}' for i in range(n_clientes)],
+        'STATUS': rng.choice(['ATIVO', 'PENDENTE', 'INATIVO'], n_clientes, p=[0.7, 0.2, 0.1]),
+        'REPRESENTANTE NOME1': rng.choice(REPRESENTANTES, n_clientes),
+        'PORTAL': rng.choice(['ATIVO', 'INATIVO'], n_clientes),
+        'PAGSEGURO': rng.choice(['HABILITADO', 'DESABILITADO'], n_clientes),
+        'PAGSEGURO EMAIL': [f'pag{i}@exemplo.com' for i in range(n_clientes)],
+        'SUB': rng.choice(['HABILITADO', 'NÃO HABILITADO'], n_clientes),
+        'BANKING': 'NÃO HABILITADO',
+        'PLANO PAG': rng.choice(['NNA', 'NNB', 'NNC', 'NND'], n_clientes),
+        'ATIVIDADE': rng.choice(['ATIVO', 'BAIXA', 'SEM MOVIMENTO'], n_clientes),
+        'P S': '',
+    }
+    df = pd.DataFrame(colunas)
+
+    # Faturamento com sazonalidade e clientes sem movimento em alguns meses
+    base = rng.lognormal(9, 1, n_clientes)
+    faturamento = pd.DataFrame({
+        f'Faturamento {mes}': np.where(
+            rng.random(n_clientes) < 0.15, 0, (base * rng.uniform(0.7, 1.3, n_clientes)).round(2)
+        )
+        for mes in MESES_SHEET1[:-1]
+    })
+    faturamento.insert(len(faturamento.columns), 'Faturamento Dezembro.1', (base * rng.uniform(0.7, 1.3, n_clientes)).round(2))
+    df = pd.concat([df, faturamento], axis=1)
+    df['Média de Faturamento'] = faturamento.replace(0, np.nan).mean(axis=1).fillna(0).round(2)
+
+    # Cabeçalho duplicado como na planilha real
+    df.columns = [('Faturamento Dezembro' if col == 'Faturamento Dezembro.1' else col) for col in df.columns]
+    return df
+
+def gerar_transacoes(rng, cpfs, por_cliente, hoje):
+    n = len(cpfs) * por_cliente
+    return pd.DataFrame({
+        'CPF/CNPJ': rng.choice(cpfs, n),
+        'DATA': _datas(rng, n, hoje - np.timedelta64(180, 'D'), 180).strftime('%d/%m/%Y'),
+        'VALOR (R$)': rng.lognormal(5, 1, n).round(2),
+        'STATUS': 'PROCESSADO'
+    })
+
+def gerar_semanais(rng, cpfs, mes):
+    # Nem todo cliente lança faturamento semanal em todo mês
+    cpfs = rng.choice(cpfs, max(1, len(cpfs) // 4), replace=False)
+    n = len(cpfs)
+    return pd.DataFrame({
+        'CPF/CNPJ': cpfs,
+        'MÊS': mes,
+        'SEMANA': rng.integers(1, 6, n),
+        'VALOR (R$)': rng.lognormal(7, 1, n).round(2),
+        'DATA REGISTRO': datetime(2025, 1, 1).strftime('%d/%m/%Y %H:%M')
+    })
+
+def gerar_analise_30_dias(rng, cpfs, hoje):
+    n = len(cpfs)
+    qtd = rng.integers(0, 30, n)
+    soma = (qtd * rng.lognormal(5, 1, n)).round(2)
+    return pd.DataFrame({
+        'cpf_cnpj': cpfs,
+        'data_cadastro': _datas(rng, n, hoje - np.timedelta64(45, 'D'), 45).date,
+        'frequencia': rng.choice(['aguardando', 'diaria', 'as_vezes', 'raramente'], n),
+        'soma_valores': soma,
+        'qtd_transacoes': qtd,
+        'media_valores': np.where(qtd > 0, (soma / np.maximum(qtd, 1)).round(2), 0.0)
+    })
+
+def gerar_emprestimos(rng, n_emprestimos, ano=2025):
+    valor_transacionado = rng.lognormal(8, 0.8, n_emprestimos).round(2)
+    valor_liberado = (valor_transacionado * rng.uniform(0.8, 0.9, n_emprestimos)).round(2)
+    taxa = (valor_transacionado * 0.05).round(2)
+    porcentagem = rng.choice([1.0, 1.5, 2.0], n_emprestimos)
+    comissao = (valor_liberado * porcentagem / 100).round(2)
+    extra = np.where(rng.random(n_emprestimos) < 0.1, 50.0, 0.0)
+    dualcred = (valor_transacionado - valor_liberado - taxa - comissao - extra).round(2)
+
+    return pd.DataFrame({
+        'data': _datas(rng, n_emprestimos, f'{ano}-01-01', 365),
+        'beneficiario': [f'Beneficiário {i}' for i in range(n_emprestimos)],
+        'valor_transacionado': valor_transacionado,
+        'valor_liberado': valor_liberado,
+        'taxa_de_juros': taxa,
+        'comissao_agente': comissao,
+        'extra_agente': extra,
+        'valor_dualcred': dualcred,
+        'nota_fiscal': (valor_transacionado * 0.032).round(2),
+        'porcentagem_agente': porcentagem,
+        'quantidade_parcelas': rng.integers(1, 19, n_emprestimos),
+        'agente': rng.choice(AGENTES, n_emprestimos),
+        '%trans': (dualcred / valor_transacionado * 100).round(2),
+        '%liberad': (dualcred / valor_liberado * 100).round(2)
+    })
+
+def gerar_dados(destino, n_clientes=1000, n_emprestimos=None, transacoes_por_cliente=3, seed=42):
+    """Gera stores.xlsx e b.xlsx em `destino` de forma determinística.
+
+    `n_emprestimos` assume `n_clientes` quando não informado. Retorna os
+    caminhos dos dois arquivos gerados.
+    """
+    rng = np.random.default_rng(seed)
+    hoje = np.datetime64(datetime.today().date())
+    n_emprestimos = n_emprestimos or n_clientes
+    os.makedirs(destino, exist_ok=True)
+
+    cadastros = gerar_cadastros(rng, n_clientes, hoje)
+    cpfs = cadastros['ESTABELECIMENTO CPF/CNPJ'].to_numpy()
+
+    stores_path = os.path.join(destino, 'stores.xlsx')
+    with pd.ExcelWriter(stores_path, engine=MOTOR_EXCEL) as writer:
+        cadastros.to_excel(writer, sheet_name='Sheet1', index=False)
+        gerar_transacoes(rng, cpfs, transacoes_por_cliente, hoje).to_excel(writer, sheet_name='Transacoes', index=False)
+        gerar_analise_30_dias(rng, cpfs[:max(1, len(cpfs) // 10)], hoje).to_excel(writer, sheet_name='30_days_analysis', index=False)
+        for mes in MESES_SEMANAIS:
+            gerar_semanais(rng, cpfs, mes).to_excel(writer, sheet_name=f'Faturamento {mes}', index=False)
+
+    emprestimos = gerar_emprestimos(rng, n_emprestimos)
+    b_path = os.path.join(destino, 'b.xlsx')
+    with pd.ExcelWriter(b_path, engine=MOTOR_EXCEL) as writer:
+        for numero, aba in enumerate(ABAS_EMPRESTIMOS, start=1):
+            emprestimos[emprestimos['data'].dt.month == numero].to_excel(writer, sheet_name=aba, index=False)
+
+    return stores_path, b_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera planilhas sintéticas para benchmark")
+    parser.add_argument('destino', help="Diretório de saída (ex.: data)")
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--emprestimos', type=int, default=None)
+    parser.add_argument('--transacoes-por-cliente', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for caminho in gerar_dados(args.destino, args.clientes, args.emprestimos, args.transacoes_por_cliente, args.seed):
+        print(caminho)
@@ -1,12 +1,16 @@
 import os
+import json
 import logging
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import openpyxl
-from openpyxl import Workbook
 from dash import dcc
 import io
+import planilhas
+import esquemas
+import memoria
 
 
 #REFERENTE A EMPRÉSTIMOS!!!
@@ -19,37 +23,35 @@ logger = logging.getLogger(__name__)
 
 # Configuração de caminhos dinâmica
 MOUNT_PATH = '/data' if os.environ.get('RENDER') else os.path.join(os.getcwd(), 'data')
+# Planilha antiga com abas JAN..DEZ (sem ano); só é lida para migrar para as partições
 EXCEL_PATH = os.path.join(MOUNT_PATH, 'b.xlsx')
 
+# Livro de empréstimos particionado por ano-mês: um .xlsx por 'AAAA-MM' e um
+# manifesto com as partições existentes, para consultas e escritas tocarem só
+# os meses envolvidos
+PARTICOES_PATH = os.path.join(MOUNT_PATH, 'emprestimos')
+MANIFESTO_PATH = os.path.join(PARTICOES_PATH, 'manifesto.json')
+
+COLUNAS_PARTICAO = [
+    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
+    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
+    'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
+    '%trans', '%liberad'
+]
+
+# Abas da exportação: uma por partição, com o mês abreviado como na planilha
+# antiga (JAN..DEZ) e o ano, ex.: 'JAN 2025'
+NOMES_MESES = ['JAN', 'FEV', 'MAR', 'ABR', 'MAI', 'JUN', 'JUL', 'AGO', 'SET', 'OUT', 'NOV', 'DEZ']
+
+# Escritas do manifesto em série dentro do processo
+_lock_particoes = threading.Lock()
+
 def setup_persistent_environment():
     try:
-        os.makedirs(MOUNT_PATH, exist_ok=True)
+        os.makedirs(PARTICOES_PATH, exist_ok=True)
 
-        if not os.path.exists(EXCEL_PATH):
-            wb = Workbook()
-            
-            # Remove sheet padrão vazio se existir
-            if 'Sheet' in wb.sheetnames:
-                del wb['Sheet']
-            
-            # Cria aba JAN com cabeçalhos
-            ws = wb.create_sheet("JAN")
-            headers = [
-                'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
-                'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
-                'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
-                '%trans', '%liberad'
-            ]
-            ws.append(headers)
-            
-            # Cria outras abas mensais vazias
-            months = ['FEV', 'MAR', 'ABR', 'MAI', 'JUN', 
-                     'JUL', 'AGO', 'SET', 'OUT', 'NOV', 'DEZ']
-            for month in months:
-                ws = wb.create_sheet(month)
-                ws.append(headers)
-            
-            wb.save(EXCEL_PATH)
+        if not os.path.exists(MANIFESTO_PATH):
+            _migrar_planilha_mensal()
         
         if not os.access(MOUNT_PATH, os.W_OK):
             logger.error(f"Sem permissão de escrita em: {MOUNT_PATH}")
@@ -59,101 +61,160 @@ def setup_persistent_environment():
         logger.error(f"Falha na configuração inicial: {str(e)}")
         raise
 
-def sanitize_column_name(col):
-    return (
-        str(col)
-        .strip()
-        .lower()
-        .replace(" ", "_")
-        .replace("ç", "c")
-        .replace("ã", "a")
-        .replace("õ", "o")
-        .replace("ó", "o")
-        .replace("ô", "o")
-        .replace("à", "a")
-        .replace("é", "e")
-        .replace("ê", "e")
-        .replace("ú", "u")
-        .replace("%", "porcento")
-        .replace("(", "")
-        .replace(")", "")
-    )
-
-def load_and_process_data():
-    """Carrega dados mantendo a estrutura por abas"""
+# =====================================
+# PARTIÇÕES ANO-MÊS
+# =====================================
+def chave_particao(data):
+    """'AAAA-MM' da data (None se a data for inválida)"""
+    data = pd.to_datetime(data, errors='coerce')
+    return None if pd.isna(data) else f'{data.year:04d}-{data.month:02d}'
+
+def caminho_particao(chave):
+    return os.path.join(PARTICOES_PATH, f'{chave}.xlsx')
+
+def ler_manifesto():
+    """{'versao': 1, 'particoes': {'AAAA-MM': {arquivo, linhas, inicio, fim}}}"""
     try:
-        setup_persistent_environment()
-        logger.info("Iniciando processamento de dados...")
-
-        # Mapeamento de colunas
-        column_mapping = {
-            'beneficiário': 'beneficiario',
-            'comissão_agente': 'comissao_agente',
-            'chave_pix_cpf': 'chave_pix',
-            '%_trans': '%trans',
-            '%_liberad': '%liberad',
-            'máquina': 'maquina'
-        }
+        with open(MANIFESTO_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'versao': 1, 'particoes': {}}
 
-        # Carregar abas como dicionário de DataFrames
-        sheets = pd.read_excel(EXCEL_PATH, sheet_name=None, engine='openpyxl')
-        
-        # Processar cada aba individualmente
-        processed_sheets = {}
-        for sheet_name, df in sheets.items():
-            try:
-                # Sanitizar e padronizar colunas
-                df.columns = [sanitize_column_name(col) for col in df.columns]
-                df.rename(columns=column_mapping, inplace=True, errors='ignore')
-                
-                # Adicionar colunas faltantes com valores padrão
-                required_columns = [
-                    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
-                    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
-                    'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
-                    '%trans', '%liberad'
-                ]
-                
-                for col in required_columns:
-                    if col not in df.columns:
-                        df[col] = pd.NaT if col == 'data' else 0.0
-                # Cálculos condicionais
-                df['valor_dualcred'] = (
-                    df['valor_transacionado'] 
-                    - df['valor_liberado'] 
-                    - df['taxa_de_juros'] 
-                    - df['comissao_agente'] 
-                    - df['extra_agente']
-                ).round(2)
-
-                df['%trans'] = np.where(
-                    df['valor_transacionado'] > 0,
-                    (df['valor_dualcred'] / df['valor_transacionado']) * 100,
-                    0
-                ).round(2)
-
-                df['%liberad'] = np.where(
-                    df['valor_liberado'] > 0,
-                    (df['valor_dualcred'] / df['valor_liberado']) * 100,
-                    0
-                ).round(2)
-
-                df['nota_fiscal'] = (df['valor_transacionado'] * 0.032).round(2)
-
-                # Ordenar colunas conforme layout original
-                df = df.reindex(columns=[
-                    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
-                    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
-                    'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
-                    '%trans', '%liberad'
-                ])
+def _gravar_manifesto(manifesto):
+    temporario = f'{MANIFESTO_PATH}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2, sort_keys=True)
+    planilhas.trocar_arquivo(temporario, MANIFESTO_PATH)
+
+def particoes_no_periodo(manifesto, start_date=None, end_date=None):
+    """Chaves das partições cujo mês cruza [start_date, end_date], em ordem"""
+    chaves = sorted(manifesto['particoes'])
+    if start_date is not None and not pd.isna(pd.to_datetime(start_date, errors='coerce')):
+        primeira = chave_particao(start_date)
+        chaves = [chave for chave in chaves if chave >= primeira]
+    if end_date is not None and not pd.isna(pd.to_datetime(end_date, errors='coerce')):
+        ultima = chave_particao(end_date)
+        chaves = [chave for chave in chaves if chave <= ultima]
+    return chaves
+
+def periodo_padrao(manifesto=None):
+    """(início, fim) do ano da partição mais recente, ou None sem partições.
+
+    É o período que a página abre e que o import aquece: anos anteriores só são
+    lidos quando pedidos.
+    """
+    particoes = (manifesto or ler_manifesto())['particoes']
+    if not particoes:
+        return None
+    fim = pd.to_datetime(max(p['fim'] for p in particoes.values()))
+    return pd.Timestamp(fim.year, 1, 1), fim
+
+def nome_aba_exportacao(chave):
+    """'AAAA-MM' -> 'MMM AAAA' (ex.: '2025-01' -> 'JAN 2025')"""
+    ano, mes = chave.split('-')
+    return f'{NOMES_MESES[int(mes) - 1]} {ano}'
+
+def _migrar_planilha_mensal():
+    """Cria o manifesto; se houver b.xlsx, distribui as linhas dele nas partições"""
+    if not os.path.exists(EXCEL_PATH):
+        _gravar_manifesto({'versao': 1, 'particoes': {}})
+        return
+
+    logger.info(f"Migrando {EXCEL_PATH} para partições ano-mês em {PARTICOES_PATH}")
+    abas = planilhas.ler_abas(EXCEL_PATH, engine='openpyxl')
+    frames = [esquemas.normalizar(df, 'emprestimos') for df in abas.values()]
+    esquemas.unificar_categorias(frames, 'agente')
+    livro = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUNAS_PARTICAO)
+    if not salvar_no_excel(livro):
+        raise RuntimeError("Falha ao migrar b.xlsx para partições")
+
+def sanitize_column_name(col):
+    return esquemas.sanitizar_coluna(col)
+
+# Partições já tipadas, com as somas acumuladas do relatório, no cache central:
+# uma entrada {'mtime', 'df', 'somas'} por 'AAAA-MM', reaproveitada enquanto o
+# arquivo não mudar. Partição despejada pelo orçamento é lida de novo do disco
+ESPACO_PARTICOES = 'data_processing.particoes'
+
+def _processar_particao(df):
+    # Nomes, colunas faltantes, ordem e tipos conforme o esquema
+    df = esquemas.normalizar(df, 'emprestimos')
+
+    # Cálculos condicionais
+    df['valor_dualcred'] = (
+        df['valor_transacionado'] 
+        - df['valor_liberado'] 
+        - df['taxa_de_juros'] 
+        - df['comissao_agente'] 
+        - df['extra_agente']
+    ).round(2)
+
+    df['%trans'] = np.where(
+        df['valor_transacionado'] > 0,
+        (df['valor_dualcred'] / df['valor_transacionado']) * 100,
+        0
+    ).round(2)
+
+    df['%liberad'] = np.where(
+        df['valor_liberado'] > 0,
+        (df['valor_dualcred'] / df['valor_liberado']) * 100,
+        0
+    ).round(2)
+
+    df['nota_fiscal'] = (df['valor_transacionado'] * 0.032).round(2)
+    return df
+
+def _particao_em_cache(chave, mtime):
+    entrada = memoria.obter(ESPACO_PARTICOES, chave)
+    return entrada if entrada is not None and entrada['mtime'] == mtime else None
+
+def carregar_particoes(start_date=None, end_date=None):
+    """{'AAAA-MM': {'mtime', 'df', 'somas'}} das partições que cruzam o período.
+
+    Só partições alteradas (ou despejadas do cache) desde a última chamada são
+    lidas de novo. Os DataFrames são os do cache: não devem ser alterados.
+    """
+    setup_persistent_environment()
+    manifesto = ler_manifesto()
+    chaves = particoes_no_periodo(manifesto, start_date, end_date)
 
-                processed_sheets[sheet_name] = df
-                #logger.info(f"Aba {sheet_name} processada com sucesso")
+    mtimes = {}
+    for chave in chaves:
+        try:
+            mtimes[chave] = os.path.getmtime(caminho_particao(chave))
+        except OSError:
+            logger.error(f"Partição {chave} está no manifesto mas o arquivo não existe")
 
+    particoes = {chave: _particao_em_cache(chave, mtime) for chave, mtime in mtimes.items()}
+    alteradas = [chave for chave, entrada in particoes.items() if entrada is None]
+    if alteradas:
+        logger.info(f"Iniciando processamento de dados ({len(alteradas)} partições)...")
+        # Parse das partições em paralelo
+        lidas = planilhas.ler_arquivos([caminho_particao(chave) for chave in alteradas], engine='openpyxl')
+        for chave in alteradas:
+            try:
+                df = _processar_particao(lidas[caminho_particao(chave)])
+                entrada = {'mtime': mtimes[chave], 'df': df, 'somas': construir_somas_acumuladas(df)}
+                particoes[chave] = memoria.guardar(ESPACO_PARTICOES, chave, entrada)
             except Exception as e:
-                logger.error(f"Erro na aba {sheet_name}: {str(e)}")
-                continue
+                logger.error(f"Erro na partição {chave}: {str(e)}")
+
+    return {chave: entrada for chave, entrada in particoes.items() if entrada is not None}
+
+def load_and_process_data(start_date=None, end_date=None):
+    """Carrega as partições ano-mês que cruzam o período (todas, sem período).
+
+    Devolve {'AAAA-MM': DataFrame}; só partições alteradas desde a última
+    chamada são lidas de novo.
+    """
+    try:
+        # Cópia rasa: quem chama pode criar/trocar colunas sem afetar o cache
+        processed_sheets = {
+            chave: entrada['df'].copy(deep=False)
+            for chave, entrada in carregar_particoes(start_date, end_date).items()
+        }
+        # Mesmas categorias de agente em todas as partições: o concat mantém o dtype
+        esquemas.unificar_categorias(list(processed_sheets.values()), 'agente')
 
         return processed_sheets  # Retorna dicionário de DataFrames
 
@@ -162,76 +223,136 @@ def load_and_process_data():
         return {}
     
 
-def salvar_no_excel(df):
-    """Salva o DataFrame dividindo as linhas por abas mensais."""
+def salvar_no_excel(df, particoes=None):
+    """Salva o livro regravando só as partições ano-mês em `particoes`.
+
+    Sem `particoes`, regrava todas (as do livro e as do manifesto). Partição
+    que ficou sem linhas é apagada. Linhas sem data válida não são salvas.
+    """
     try:
         logger.info("Salvando dados...")
-        setup_persistent_environment()
+        os.makedirs(PARTICOES_PATH, exist_ok=True)
 
-        # Mapear meses para nomes das abas
-        month_names = {
-            1: 'JAN', 2: 'FEV', 3: 'MAR', 4: 'ABR', 5: 'MAI', 6: 'JUN',
-            7: 'JUL', 8: 'AGO', 9: 'SET', 10: 'OUT', 11: 'NOV', 12: 'DEZ'
-        }
+        datas = pd.to_datetime(df['data'], errors='coerce')
+        chaves_linhas = datas.dt.strftime('%Y-%m')
+        if datas.isna().any():
+            logger.warning(f"{int(datas.isna().sum())} linhas sem data válida não foram salvas")
 
-        # Criar um writer para o Excel
-        writer = pd.ExcelWriter(EXCEL_PATH, engine='openpyxl')
+        with _lock_particoes:
+            manifesto = ler_manifesto()
+            if particoes is None:
+                particoes = set(chaves_linhas.dropna()) | set(manifesto['particoes'])
 
-        # Dividir o DataFrame por mês e salvar em abas
-        df['data'] = pd.to_datetime(df['data'])
-        df['month'] = df['data'].dt.month.map(month_names)
+            for chave in sorted(set(particoes) - {None}):
+                linhas = chaves_linhas == chave
+                df_particao = df.loc[linhas].assign(data=datas[linhas]).reindex(columns=COLUNAS_PARTICAO)
+                caminho = caminho_particao(chave)
 
-        for sheet_name in month_names.values():
-            # Filtrar dados do mês
-            df_month = df[df['month'] == sheet_name].drop(columns=['month'])
+                if df_particao.empty:
+                    if os.path.exists(caminho):
+                        os.remove(caminho)
+                    manifesto['particoes'].pop(chave, None)
+                    continue
 
-            # Garantir a ordem das colunas
-            df_month = df_month.reindex(columns=[
-                'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
-                'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
-                'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
-                '%trans', '%liberad'
-            ])
+                # escritor_excel troca o arquivo de uma vez: leitores nunca veem a partição pela metade
+                with planilhas.escritor_excel(caminho, engine='openpyxl') as writer:
+                    df_particao.to_excel(writer, sheet_name=chave, index=False)
 
-            # Salvar na aba correspondente
-            df_month.to_excel(
-                writer,
-                sheet_name=sheet_name,
-                index=False
-            )
+                manifesto['particoes'][chave] = {
+                    'arquivo': os.path.basename(caminho),
+                    'linhas': len(df_particao),
+                    'inicio': df_particao['data'].min().strftime('%Y-%m-%d'),
+                    'fim': df_particao['data'].max().strftime('%Y-%m-%d'),
+                }
+
+            _gravar_manifesto(manifesto)
 
-        writer.close()
         return True
     except Exception as e:
         logger.error(f"Erro ao salvar: {str(e)}")
         return False
     
+# =====================================
+# SOMAS ACUMULADAS DO RELATÓRIO
+# =====================================
+colunas_relatorio = [
+    'valor_transacionado', 'valor_liberado', 'comissao_agente',
+    'valor_dualcred', 'extra_agente', 'nota_fiscal'
+]
+
+def _valores_relatorio(linhas, col):
+    if col not in linhas:
+        return np.zeros(len(linhas))
+    return pd.to_numeric(linhas[col], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+
+def construir_somas_acumuladas(df):
+    """Ordena o livro por data e monta as somas acumuladas das colunas do relatório.
+
+    Com as somas prontas, o total de qualquer período custa duas buscas
+    binárias por coluna em vez de um filtro sobre o livro inteiro.
+    """
+    datas = pd.to_datetime(df['data'], errors='coerce') if 'data' in df else pd.Series(dtype='datetime64[ns]')
+    ordenado = df.assign(data=datas).loc[datas.notna()].sort_values('data', kind='stable')
+
+    somas = {}
+    for col in colunas_relatorio:
+        somas[col] = np.concatenate(([0.0], np.cumsum(_valores_relatorio(ordenado, col))))
+
+    return {
+        'datas': ordenado['data'].to_numpy(dtype='datetime64[ns]'),
+        'somas': somas
+    }
+
+def somar_periodo(indice, start_date, end_date):
+    """Totais das colunas do relatório entre duas datas (inclusivas)"""
+    if pd.isna(start_date) or pd.isna(end_date):
+        return {col: 0.0 for col in indice['somas']}
+
+    inicio = np.searchsorted(indice['datas'], np.datetime64(pd.Timestamp(start_date), 'ns'), side='left')
+    fim = np.searchsorted(indice['datas'], np.datetime64(pd.Timestamp(end_date), 'ns'), side='right')
+    fim = max(fim, inicio)
+    return {col: float(acumulado[fim] - acumulado[inicio]) for col, acumulado in indice['somas'].items()}
+
+def somar_particoes(particoes, start_date, end_date):
+    """Totais do período somando as somas acumuladas de cada partição"""
+    totais = {col: 0.0 for col in colunas_relatorio}
+    for entrada in particoes.values():
+        for col, valor in somar_periodo(entrada['somas'], start_date, end_date).items():
+            totais[col] += valor
+    return totais
+
+def gerar_exportacao(processed_sheets, destino):
+    """Grava as abas no formato de exportação em `destino` (caminho ou buffer).
+
+    Uma aba por partição 'AAAA-MM', em ordem, com o nome 'MMM AAAA'.
+    """
+    with planilhas.escritor_excel(destino, engine='openpyxl') as writer:
+        for chave, df in sorted(processed_sheets.items()):
+            sheet_name = nome_aba_exportacao(chave)
+            logger.info(f"Exportando aba: {sheet_name}")
+            
+            # Verificar se df tem as colunas necessárias
+            if df.empty:
+                logger.warning(f"Aba {sheet_name} vazia")
+                continue
+                
+            df.to_excel(
+                writer,
+                sheet_name=sheet_name,
+                index=False,
+                columns=[
+                    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
+                    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
+                    'nota_fiscal', 'quantidade_parcelas', 'agente', '%trans', '%liberad'
+                ]
+            )
+
 def exportar_dados(processed_sheets):
     """Exporta mantendo a estrutura por abas"""
     try:
         logger.info("Iniciando exportação...")
         buffer = io.BytesIO()
-        
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            for sheet_name, df in processed_sheets.items():
-                logger.info(f"Exportando aba: {sheet_name}")
-                
-                # Verificar se df tem as colunas necessárias
-                if df.empty:
-                    logger.warning(f"Aba {sheet_name} vazia")
-                    continue
-                    
-                df.to_excel(
-                    writer,
-                    sheet_name=sheet_name,
-                    index=False,
-                    columns=[
-                        'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
-                        'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
-                        'nota_fiscal', 'quantidade_parcelas', 'agente', '%trans', '%liberad'
-                    ]
-                )
-        
+        gerar_exportacao(processed_sheets, buffer)
         buffer.seek(0)
         logger.info("Exportação concluída com sucesso")
         return dcc.send_bytes(
@@ -244,13 +365,13 @@ def exportar_dados(processed_sheets):
         logger.error(f"Erro na exportação: {str(e)}", exc_info=True)  # Log detalhado
         return None
     
-# Inicialização segura
+# Inicialização segura: só aquece o cache com o período que a página abre,
+# sem guardar outra referência às partições
 try:
-    processed_sheets = load_and_process_data()
-    if not processed_sheets:
+    particoes_carregadas = len(load_and_process_data(*(periodo_padrao() or ())))
+    if not particoes_carregadas:
         logger.warning("Nenhuma aba válida encontrada")
     else:
-        logger.info(f"Dados carregados: {len(processed_sheets)} abas")
+        logger.info(f"Dados carregados: {particoes_carregadas} abas")
 except Exception as e:
-    logger.error(f"Falha crítica: {str(e)}")
-    processed_sheets = {}
\ No newline at end of file
+    logger.error(f"Falha crítica: {str(e)}")
\ No newline at end of file
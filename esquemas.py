@@ -0,0 +1,227 @@
+import functools
+import logging
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+#REFERENTE AOS ESQUEMAS DAS PLANILHAS!!!
+# Nome canônico, tipo e valor padrão das colunas de cada aba. O plano de
+# normalização (renomear, completar, ordenar, converter) é montado uma vez por
+# assinatura de cabeçalho e reaproveitado em todas as cargas seguintes.
+
+logger = logging.getLogger(__name__)
+
+# Nomes canônicos usados pelas páginas
+CPF_CADASTRO = 'ESTABELECIMENTO CPF/CNPJ'
+NOME_CADASTRO = 'ESTABELECIMENTO NOME1'
+CPF = 'CPF/CNPJ'
+
+# Ordem das colunas mensais da Sheet1 ('Dezembro.1' é o Dezembro do ano atual)
+COLUNAS_FATURAMENTO_MENSAL = [
+    'Faturamento Dezembro', 'Faturamento Janeiro', 'Faturamento Fevereiro', 'Faturamento Marco',
+    'Faturamento Abril', 'Faturamento Maio', 'Faturamento Junho', 'Faturamento Julho',
+    'Faturamento Agosto', 'Faturamento Setembro', 'Faturamento Outubro', 'Faturamento Novembro',
+    'Faturamento Dezembro.1'
+]
+
+COLUNAS_EMPRESTIMOS = [
+    'data', 'beneficiario', 'valor_transacionado', 'valor_liberado',
+    'taxa_de_juros', 'comissao_agente', 'extra_agente', 'valor_dualcred',
+    'nota_fiscal', 'porcentagem_agente', 'quantidade_parcelas', 'agente',
+    '%trans', '%liberad'
+]
+
+# colunas: canônicas na ordem da aba; aliases: chave normalizada -> canônica;
+# tipos: 'numero' (float64), 'data' (datetime64), 'categoria', 'texto' (identificadores);
+# vazios: valor das categorias em branco; estrito: descarta colunas fora do esquema
+ESQUEMAS = {
+    'emprestimos': {
+        'colunas': COLUNAS_EMPRESTIMOS,
+        'aliases': {
+            'chave_pix_cpf': 'chave_pix',
+            'porcentotrans': '%trans',
+            'porcento_trans': '%trans',
+            'porcentoliberad': '%liberad',
+            'porcento_liberad': '%liberad',
+        },
+        'padroes': {'data': pd.NaT, 'agente': 'Não Informado'},
+        'padrao': 0.0,
+        'tipos': {
+            'data': 'data', 'agente': 'categoria',
+            'valor_transacionado': 'numero', 'valor_liberado': 'numero', 'taxa_de_juros': 'numero',
+            'comissao_agente': 'numero', 'extra_agente': 'numero', 'porcentagem_agente': 'numero',
+        },
+        'vazios': {'agente': 'Não Informado'},
+        'estrito': True,
+        'sanitizar': True,
+    },
+    'cadastros': {
+        'colunas': [CPF_CADASTRO, NOME_CADASTRO, 'STATUS'] + COLUNAS_FATURAMENTO_MENSAL,
+        'aliases': {'faturamento_marco': 'Faturamento Marco'},
+        'padroes': {CPF_CADASTRO: np.nan, NOME_CADASTRO: np.nan, 'STATUS': np.nan},
+        'padrao': 0.0,
+        'tipos': {CPF_CADASTRO: 'texto', 'STATUS': 'categoria', **{col: 'numero' for col in COLUNAS_FATURAMENTO_MENSAL}},
+        'estrito': False,
+    },
+    'transacoes': {
+        'colunas': [CPF, 'DATA', 'VALOR (R$)', 'STATUS'],
+        'aliases': {},
+        'padroes': {CPF: np.nan, 'DATA': np.nan, 'STATUS': np.nan},
+        'padrao': 0.0,
+        'tipos': {CPF: 'texto', 'DATA': 'data', 'VALOR (R$)': 'numero', 'STATUS': 'categoria'},
+        'estrito': False,
+    },
+    'faturamento_semanal': {
+        'colunas': [CPF, 'MÊS', 'SEMANA', 'VALOR (R$)', 'DATA REGISTRO'],
+        'aliases': {'mes': 'MÊS'},
+        'padroes': {CPF: np.nan, 'MÊS': np.nan, 'DATA REGISTRO': np.nan},
+        'padrao': 0.0,
+        'tipos': {CPF: 'texto', 'SEMANA': 'numero', 'VALOR (R$)': 'numero'},
+        'estrito': False,
+    },
+}
+
+# Textos que valem como célula vazia numa coluna categórica
+VALORES_VAZIOS = ['', 'nan', 'None', 'null']
+
+# Troca feita por sanitize_column_name, numa única passada
+_TABELA_SANITIZACAO = str.maketrans({
+    ' ': '_', 'ç': 'c', 'ã': 'a', 'õ': 'o', 'ó': 'o', 'ô': 'o', 'à': 'a',
+    'é': 'e', 'ê': 'e', 'ú': 'u', '%': 'porcento', '(': '', ')': ''
+})
+
+
+def sanitizar_coluna(col):
+    """Mesmo resultado de data_processing.sanitize_column_name"""
+    return str(col).strip().lower().translate(_TABELA_SANITIZACAO)
+
+@functools.lru_cache(maxsize=4096)
+def chave_coluna(col):
+    """Chave de comparação de cabeçalhos: sem acento, minúscula, '_' no lugar de espaço"""
+    texto = unicodedata.normalize('NFKD', str(col)).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(texto.strip().lower().split())
+
+def _assinatura(df):
+    return tuple(zip(map(str, df.columns), map(str, df.dtypes)))
+
+@functools.lru_cache(maxsize=256)
+def _plano(nome, assinatura):
+    esquema = ESQUEMAS[nome]
+    canonicas = {chave_coluna(col): col for col in esquema['colunas']}
+    canonicas.update(esquema['aliases'])
+
+    renomear, tipos_observados = {}, {}
+    for col, dtype in assinatura:
+        original = col
+        if esquema.get('sanitizar'):
+            col = sanitizar_coluna(col)
+        destino = canonicas.get(chave_coluna(col), col)
+        # O primeiro cabeçalho que cai num nome canônico fica com ele
+        if destino in tipos_observados:
+            destino = col
+        if destino != original:
+            renomear[original] = destino
+        tipos_observados[destino] = dtype
+
+    faltantes = [col for col in esquema['colunas'] if col not in tipos_observados]
+
+    # Colunas faltantes recebem o padrão e também passam pela conversão
+    astype, coagir, datas, categorias, identificadores = {}, [], [], [], []
+    for col, tipo in esquema['tipos'].items():
+        dtype = tipos_observados.get(col, 'object')
+        if tipo == 'numero':
+            if dtype == 'float64':
+                continue
+            if dtype.startswith(('int', 'float', 'bool')):
+                astype[col] = 'float64'
+            else:
+                coagir.append(col)
+        elif tipo == 'data' and not dtype.startswith('datetime64'):
+            datas.append(col)
+        elif tipo == 'categoria' and dtype != 'category':
+            categorias.append(col)
+        elif tipo == 'texto':
+            if dtype.startswith(('int', 'uint')):
+                astype[col] = str
+            else:
+                # Coluna com célula em branco vem float64 (ou object misturado)
+                identificadores.append(col)
+
+    ordem = list(esquema['colunas']) if esquema['estrito'] else None
+    return renomear, faltantes, ordem, astype, coagir, datas, categorias, identificadores
+
+def _para_categoria(serie, vazio):
+    texto = serie.astype('string').str.strip()
+    texto = texto.mask(texto.isin(VALORES_VAZIOS))
+    if vazio is not None:
+        texto = texto.fillna(vazio)
+    return texto.astype(object).where(texto.notna(), np.nan).astype('category')
+
+def _para_identificador(serie):
+    # 12345678901.0 vira '12345678901'; vazios continuam NaN
+    if pd.api.types.is_float_dtype(serie):
+        serie = serie.round().astype('Int64')
+    elif serie.dtype == object:
+        serie = serie.map(lambda v: int(v) if isinstance(v, float) and v.is_integer() else v)
+    texto = serie.astype('string').str.replace(r'\D', '', regex=True)
+    texto = texto.mask(texto == '')
+    return texto.astype(object).where(texto.notna(), np.nan)
+
+def identificador(valor):
+    """CPF/CNPJ só com dígitos, para comparar com as colunas normalizadas ('' se vazio)"""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return re.sub(r'\D', '', str(valor))
+
+def identificadores(serie):
+    """Como identificador(), para uma coluna inteira"""
+    return _para_identificador(serie).fillna('')
+
+def unificar_categorias(frames, col):
+    """Deixa `col` com as mesmas categorias em todos os frames, para o concat manter o dtype"""
+    presentes = [df[col] for df in frames if col in df and isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if not presentes:
+        return frames
+    todas = pd.api.types.union_categoricals(presentes, ignore_order=True).categories
+    for df in frames:
+        if col in df and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.set_categories(todas)
+    return frames
+
+def normalizar(df, nome):
+    """Aplica o esquema `nome` ao DataFrame lido da planilha.
+
+    Renomeia para os nomes canônicos, cria colunas faltantes com o padrão do
+    esquema, reordena (esquemas estritos) e converte os tipos: dinheiro em
+    float64, datas em datetime64, status/agente como categoria e CPF/CNPJ como
+    texto só com dígitos. As páginas
+    recebem o frame já tipado e não precisam converter de novo.
+    """
+    renomear, faltantes, ordem, astype, coagir, datas, categorias, identificadores = _plano(nome, _assinatura(df))
+    esquema = ESQUEMAS[nome]
+
+    if renomear:
+        df = df.rename(columns=renomear)
+    if faltantes:
+        df = df.assign(**{col: esquema['padroes'].get(col, esquema['padrao']) for col in faltantes})
+    if ordem is not None:
+        df = df.reindex(columns=ordem)
+    if astype:
+        df = df.astype(astype)
+    for col in coagir:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in datas:
+        # Texto vem como dd/mm/aaaa nas abas preenchidas pelo app
+        df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True, format='mixed')
+    for col in categorias:
+        if col in df:
+            df[col] = _para_categoria(df[col], esquema.get('vazios', {}).get(col))
+    for col in identificadores:
+        if col in df:
+            df[col] = _para_identificador(df[col])
+    return df
@@ -0,0 +1,95 @@
+import logging
+import os
+import re
+import threading
+
+from flask import abort, request, send_file
+
+
+#REFERENTE AS EXPORTAÇÕES EM CACHE!!!
+# Cada exportação é gerada uma vez por versão da planilha de origem (mtime +
+# tamanho) e guardada em disco; só uma escrita na origem gera outra. O download
+# sai pela rota /exportar/<nome> com ETag, então quem já tem a versão leva 304.
+
+logger = logging.getLogger(__name__)
+
+MOUNT_PATH = '/data' if os.environ.get('RENDER') else os.path.join(os.getcwd(), 'data')
+EXPORTACOES_PATH = os.path.join(MOUNT_PATH, 'exportacoes')
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+TENTATIVAS = 3
+
+_artefatos = {}
+_locks = {}
+
+
+def registrar_artefato(nome, origem, gerar, nome_download):
+    """Registra a exportação `nome`: `gerar(destino)` grava o .xlsx a partir de `origem`"""
+    _artefatos[nome] = {'origem': origem, 'gerar': gerar, 'download': nome_download}
+    _locks.setdefault(nome, threading.Lock())
+
+def url(nome):
+    return f'/exportar/{nome}'
+
+def versao(caminho):
+    info = os.stat(caminho)
+    return f'{info.st_mtime_ns:x}-{info.st_size:x}'
+
+def _limpar_versoes(nome, manter):
+    padrao = re.compile(rf'^{re.escape(nome)}-[0-9a-f]+-[0-9a-f]+\.xlsx$')
+    for arquivo in os.listdir(EXPORTACOES_PATH):
+        if padrao.match(arquivo) and arquivo != os.path.basename(manter):
+            try:
+                os.remove(os.path.join(EXPORTACOES_PATH, arquivo))
+            except OSError:
+                pass
+
+def caminho_artefato(nome):
+    """(caminho, versão) da exportação da versão atual da origem, gerando só se ainda não existe"""
+    artefato = _artefatos[nome]
+    with _locks[nome]:
+        for _ in range(TENTATIVAS):
+            atual = versao(artefato['origem'])
+            caminho = os.path.join(EXPORTACOES_PATH, f'{nome}-{atual}.xlsx')
+            if os.path.exists(caminho):
+                return caminho, atual
+
+            os.makedirs(EXPORTACOES_PATH, exist_ok=True)
+            # Nome começando com ponto não casa com _limpar_versoes de outro processo
+            temporario = os.path.join(EXPORTACOES_PATH, f'.{nome}-{atual}.{os.getpid()}.xlsx')
+            artefato['gerar'](temporario)
+
+            # Origem alterada durante a geração: o conteúdo não é da versão `atual`
+            if versao(artefato['origem']) != atual:
+                os.remove(temporario)
+                continue
+            os.replace(temporario, caminho)
+            _limpar_versoes(nome, caminho)
+            logger.info(f"Exportação {nome} gerada para a versão {atual}")
+            return caminho, atual
+    raise RuntimeError(f"Origem de {nome} mudou durante {TENTATIVAS} gerações seguidas")
+
+def _baixar(nome):
+    if nome not in _artefatos:
+        abort(404)
+    artefato = _artefatos[nome]
+
+    # Cliente já tem a versão atual: 304 sem nem olhar o artefato
+    if request.if_none_match.contains(versao(artefato['origem'])):
+        return '', 304, {'ETag': f'"{versao(artefato["origem"])}"'}
+
+    caminho, atual = caminho_artefato(nome)
+    resposta = send_file(
+        caminho,
+        mimetype=TIPO_XLSX,
+        as_attachment=True,
+        download_name=artefato['download'],
+        etag=atual,
+        conditional=True
+    )
+    # Sempre revalida: a próxima escrita muda a versão
+    resposta.cache_control.no_cache = True
+    return resposta
+
+def registrar(server):
+    """Rota de download das exportações registradas pelas páginas"""
+    server.add_url_rule('/exportar/<nome>', 'exportar', _baixar)
@@ -0,0 +1,310 @@
+import base64
+import io
+import logging
+import os
+import unicodedata
+import pandas as pd
+from openpyxl import Workbook
+import planilhas
+import esquemas
+
+
+#REFERENTE A IMPORTAÇÃO EM LOTE!!!
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_TRANSACOES = list(esquemas.ESQUEMAS['transacoes']['colunas'])
+
+# Nomes aceitos no cabeçalho do arquivo enviado (já sem acentos e em minúsculas)
+ALIASES_CPF = ['cpf/cnpj', 'cpf_cnpj', 'cpf', 'cnpj', 'estabelecimento cpf/cnpj', 'documento']
+ALIASES_DATA = ['data', 'data da transacao', 'data_transacao', 'date']
+ALIASES_VALOR = ['valor', 'valor (r$)', 'valor_r$', 'valor r$', 'value', 'faturamento']
+ALIASES_MES = ['mes', 'month', 'mes faturamento', 'mes_faturamento']
+
+MESES = [
+    'Janeiro', 'Fevereiro', 'Marco', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+
+def _chave_cabecalho(col):
+    texto = unicodedata.normalize('NFKD', str(col)).encode('ascii', 'ignore').decode('ascii')
+    return texto.strip().lower()
+
+def _localizar_coluna(df, aliases):
+    for col in df.columns:
+        if _chave_cabecalho(col) in aliases:
+            return col
+    return None
+
+def ler_arquivo_enviado(contents, filename):
+    """Decodifica o conteúdo de um dcc.Upload (CSV ou xlsx) em DataFrame de texto"""
+    _, conteudo = contents.split(',', 1)
+    dados = base64.b64decode(conteudo)
+    nome = (filename or '').lower()
+
+    if nome.endswith(('.xlsx', '.xlsm', '.xls')):
+        return planilhas.ler_excel(io.BytesIO(dados), dtype=str, engine='openpyxl')
+
+    texto = dados.decode('utf-8-sig', errors='replace')
+    # sep=None deixa o pandas detectar ';' (Excel pt-BR) ou ','
+    return pd.read_csv(io.StringIO(texto), sep=None, engine='python', dtype=str)
+
+def ler_grade_colada(texto):
+    """Lê uma grade colada do Excel (tabulação), ';' ou ',' com ou sem cabeçalho"""
+    texto = texto.strip()
+    # Cópia do Excel vem separada por tabulação; vírgula pode ser decimal
+    sep = '\t' if '\t' in texto else (';' if ';' in texto else None)
+    grade = pd.read_csv(io.StringIO(texto), sep=sep, engine='python', dtype=str, header=None)
+    primeira = [_chave_cabecalho(valor) for valor in grade.iloc[0]]
+    aliases = ALIASES_CPF + ALIASES_MES + ALIASES_VALOR + ALIASES_DATA
+    if any(valor in aliases for valor in primeira):
+        grade.columns = grade.iloc[0].astype(str)
+        grade = grade.iloc[1:].reset_index(drop=True)
+    else:
+        grade.attrs['linha_inicial'] = 1
+    return grade
+
+def _localizar_colunas(enviado, *aliases):
+    colunas = [_localizar_coluna(enviado, grupo) for grupo in aliases]
+    if None in colunas:
+        if len(enviado.columns) != len(aliases):
+            raise ValueError(f"O arquivo deve conter {len(aliases)} colunas")
+        colunas = list(enviado.columns)
+    return colunas
+
+def _texto(serie):
+    return serie.astype(str).where(serie.notna(), '')
+
+def normalizar_cpf(serie):
+    """Mantém apenas os dígitos do CPF/CNPJ (vetorizado)"""
+    return esquemas.identificadores(_texto(serie).str.replace(r'\.0$', '', regex=True))
+
+def converter_valores(serie):
+    """Converte valores monetários em texto ('1.234,56', 'R$ 10', '10.5', '1.234') para float.
+
+    Com vírgula, ponto é milhar e vírgula é decimal. Sem vírgula, ponto seguido
+    de grupos de três dígitos ('1.234', '1.234.567') também é milhar; os demais
+    ('10.5') são decimais.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce')
+
+    texto = _texto(serie).str.replace(r'[R$\s]', '', regex=True)
+    brasileiro = texto.str.contains(',', regex=False) | texto.str.fullmatch(r'-?\d{1,3}(\.\d{3})+')
+    texto = texto.where(
+        ~brasileiro,
+        texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    )
+    return pd.to_numeric(texto, errors='coerce')
+
+# Faixa de números de série de data do Excel (1900-01-01 a 9999-12-31)
+SERIAL_EXCEL_MIN, SERIAL_EXCEL_MAX = 1, 2958465
+
+def converter_datas(serie):
+    """Converte datas em formatos variados (dd/mm/aaaa, ISO, Excel) para datetime.
+
+    Números (ou texto numérico) na faixa de série do Excel são dias desde
+    1899-12-30; o resto passa pelo parse de texto.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+
+    numeros = pd.to_numeric(serie, errors='coerce')
+    serial = numeros.between(SERIAL_EXCEL_MIN, SERIAL_EXCEL_MAX)
+    datas = pd.to_datetime(numeros.where(serial), origin='1899-12-30', unit='D', errors='coerce')
+    if serial.all():
+        return datas
+
+    texto = serie.where(~serial)
+    if pd.api.types.is_numeric_dtype(texto):
+        # Números fora da faixa não são datas
+        return datas
+    return datas.fillna(pd.to_datetime(texto, errors='coerce', dayfirst=True, format='mixed'))
+
+def _mapa_clientes(clientes_df):
+    """CPF normalizado -> CPF/CNPJ como está gravado na Sheet1"""
+    cadastrados = clientes_df[esquemas.CPF_CADASTRO].dropna().astype(str).str.strip()
+    cadastrados = cadastrados[cadastrados != '']
+    return pd.Series(cadastrados.values, index=normalizar_cpf(cadastrados).values)
+
+def validar_transacoes(enviado, clientes_df, transacoes_df):
+    """Valida em uma única passagem vetorizada as transações de um arquivo.
+
+    Retorna (validas, erros): `validas` já no layout da aba Transacoes e
+    `erros` com o número da linha no arquivo e o motivo de cada rejeição.
+    """
+    col_cpf, col_data, col_valor = _localizar_colunas(enviado, ALIASES_CPF, ALIASES_DATA, ALIASES_VALOR)
+
+    df = pd.DataFrame({
+        # +1 do cabeçalho, +1 para contar a partir de 1
+        'linha': enviado.index + enviado.attrs.get('linha_inicial', 2),
+        'cpf_original': _texto(enviado[col_cpf]).str.strip(),
+        'cpf': normalizar_cpf(enviado[col_cpf]),
+        'data': converter_datas(enviado[col_data]),
+        'valor': converter_valores(enviado[col_valor]).round(2)
+    })
+
+    clientes = _mapa_clientes(clientes_df)
+    clientes = clientes[~clientes.index.duplicated()]
+
+    # Chaves das transações já gravadas (CPF, data, valor)
+    existentes = pd.DataFrame({
+        'cpf': normalizar_cpf(transacoes_df.get(esquemas.CPF, pd.Series(dtype=str))),
+        'data': converter_datas(transacoes_df.get('DATA', pd.Series(dtype=str))).dt.normalize(),
+        'valor': converter_valores(transacoes_df.get('VALOR (R$)', pd.Series(dtype=float))).round(2)
+    })
+    chaves_existentes = pd.MultiIndex.from_frame(existentes)
+    chaves = pd.MultiIndex.from_arrays([df['cpf'], df['data'].dt.normalize(), df['valor']])
+
+    motivos = {
+        'CPF/CNPJ vazio': df['cpf'] == '',
+        'CPF/CNPJ inválido': (df['cpf'] != '') & ~df['cpf'].str.len().isin([11, 14]),
+        'Cliente não cadastrado': df['cpf'].str.len().isin([11, 14]) & ~df['cpf'].isin(clientes.index),
+        'Data inválida': df['data'].isna(),
+        'Valor inválido': df['valor'].isna(),
+        'Valor deve ser positivo': df['valor'] <= 0,
+        'Duplicada no arquivo': pd.Series(chaves.duplicated(keep='first'), index=df.index),
+        'Já registrada': pd.Series(chaves.isin(chaves_existentes), index=df.index)
+    }
+
+    erro = pd.Series('', index=df.index)
+    for motivo, mascara in motivos.items():
+        erro = erro + mascara.fillna(False).astype(bool).map({True: motivo + '; ', False: ''})
+    erro = erro.str.rstrip('; ')
+
+    ok = erro == ''
+    validas = pd.DataFrame({
+        esquemas.CPF: df.loc[ok, 'cpf'].map(clientes),
+        'DATA': df.loc[ok, 'data'].dt.strftime('%d/%m/%Y'),
+        'VALOR (R$)': df.loc[ok, 'valor'].astype(float),
+        'STATUS': 'PROCESSADO'
+    })[COLUNAS_TRANSACOES]
+
+    erros = pd.DataFrame({
+        'LINHA': df.loc[~ok, 'linha'],
+        esquemas.CPF: df.loc[~ok, 'cpf_original'],
+        'MOTIVO': erro[~ok]
+    })
+
+    return validas.reset_index(drop=True), erros.reset_index(drop=True)
+
+def gravar_transacoes(file_path, validas):
+    """Anexa todas as transações validadas à aba Transacoes em um único salvamento"""
+    if os.path.exists(file_path):
+        wb = planilhas.carregar_workbook(file_path)
+    else:
+        wb = Workbook()
+        wb.active.title = 'Transacoes'
+        wb.active.append(COLUNAS_TRANSACOES)
+
+    try:
+        if 'Transacoes' in wb.sheetnames:
+            ws = wb['Transacoes']
+        else:
+            ws = wb.create_sheet('Transacoes')
+            ws.append(COLUNAS_TRANSACOES)
+
+        for linha in validas.itertuples(index=False):
+            ws.append(list(linha))
+
+        planilhas.salvar_workbook(wb, file_path)
+    finally:
+        wb.close()
+
+    logger.info(f"{len(validas)} transações importadas em lote")
+    return len(validas)
+
+# =====================================
+# FATURAMENTO MENSAL EM LOTE
+# =====================================
+def normalizar_mes(serie):
+    """Converte nomes ('Março', 'marco', 'mar') ou números (3, '03') no mês canônico da Sheet1"""
+    chave = _texto(serie).map(_chave_cabecalho).str.replace(r'\.0$', '', regex=True)
+    por_nome = {_chave_cabecalho(mes): mes for mes in MESES}
+    por_nome.update({_chave_cabecalho(mes)[:3]: mes for mes in MESES})
+    por_numero = {str(i): mes for i, mes in enumerate(MESES, start=1)}
+    por_numero.update({f'{i:02d}': mes for i, mes in enumerate(MESES, start=1)})
+    return chave.map({**por_nome, **por_numero})
+
+def resolver_faturamento(enviado, header, cpfs_planilha):
+    """Casa todas as linhas do arquivo com a Sheet1 em um único join.
+
+    `header` é o cabeçalho da Sheet1 e `cpfs_planilha` a coluna de CPF/CNPJ
+    na ordem das linhas (linha 2 em diante). Retorna (atualizacoes, erros,
+    nao_encontrados), com `atualizacoes` trazendo linha e coluna (base 1)
+    de cada célula a gravar.
+    """
+    col_cpf, col_mes, col_valor = _localizar_colunas(enviado, ALIASES_CPF, ALIASES_MES, ALIASES_VALOR)
+
+    df = pd.DataFrame({
+        'linha_arquivo': enviado.index + enviado.attrs.get('linha_inicial', 2),
+        'cpf_original': _texto(enviado[col_cpf]).str.strip(),
+        'cpf': normalizar_cpf(enviado[col_cpf]),
+        'mes': normalizar_mes(enviado[col_mes]),
+        'valor': converter_valores(enviado[col_valor]).round(2)
+    })
+
+    # 'Faturamento Marco' e 'Faturamento Março' coexistem em planilhas antigas
+    colunas_mes = {}
+    for idx, nome in enumerate(header, start=1):
+        chave = _chave_cabecalho(nome)
+        if chave.startswith('faturamento '):
+            colunas_mes.setdefault(chave.replace('faturamento ', '', 1), idx)
+    df['coluna'] = df['mes'].map(lambda mes: colunas_mes.get(_chave_cabecalho(mes)) if isinstance(mes, str) else None)
+
+    motivos = {
+        'CPF/CNPJ vazio': df['cpf'] == '',
+        'Mês inválido': df['mes'].isna(),
+        'Coluna do mês não existe na planilha': df['mes'].notna() & df['coluna'].isna(),
+        'Valor inválido': df['valor'].isna()
+    }
+    erro = pd.Series('', index=df.index)
+    for motivo, mascara in motivos.items():
+        erro = erro + mascara.fillna(False).astype(bool).map({True: motivo + '; ', False: ''})
+    erro = erro.str.rstrip('; ')
+
+    erros = pd.DataFrame({
+        'LINHA': df.loc[erro != '', 'linha_arquivo'],
+        esquemas.CPF: df.loc[erro != '', 'cpf_original'],
+        'MOTIVO': erro[erro != '']
+    }).reset_index(drop=True)
+
+    # A última ocorrência de (cliente, mês) no arquivo prevalece
+    validas = df[erro == ''].drop_duplicates(subset=['cpf', 'coluna'], keep='last')
+
+    planilha = pd.DataFrame({
+        'linha': range(2, len(cpfs_planilha) + 2),
+        'cpf': normalizar_cpf(pd.Series(cpfs_planilha, dtype=object))
+    })
+    planilha = planilha[planilha['cpf'] != ''].drop_duplicates(subset='cpf', keep='first')
+
+    unidas = validas.merge(planilha, on='cpf', how='left')
+    nao_encontrados = unidas.loc[unidas['linha'].isna(), 'cpf_original'].unique().tolist()
+    atualizacoes = unidas[unidas['linha'].notna()].astype({'linha': int, 'coluna': int})
+
+    return atualizacoes[['linha', 'coluna', 'valor', 'cpf', 'mes']], erros, nao_encontrados
+
+def importar_faturamento(file_path, enviado):
+    """Aplica o faturamento mensal em lote na Sheet1 com um único salvamento"""
+    wb = planilhas.carregar_workbook(file_path)
+    try:
+        ws = wb['Sheet1']
+        header = [cell.value for cell in ws[1]]
+        col_cpf = header.index(esquemas.CPF_CADASTRO) + 1
+        cpfs_planilha = [
+            row[0] for row in ws.iter_rows(min_row=2, min_col=col_cpf, max_col=col_cpf, values_only=True)
+        ]
+
+        atualizacoes, erros, nao_encontrados = resolver_faturamento(enviado, header, cpfs_planilha)
+
+        for linha, coluna, valor in atualizacoes[['linha', 'coluna', 'valor']].itertuples(index=False):
+            ws.cell(row=linha, column=coluna, value=float(valor))
+
+        if not atualizacoes.empty:
+            planilhas.salvar_workbook(wb, file_path)
+    finally:
+        wb.close()
+
+    logger.info(f"Faturamento em lote: {len(atualizacoes)} células atualizadas, {len(nao_encontrados)} CPFs sem cadastro")
+    return atualizacoes, erros, nao_encontrados
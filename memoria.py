@@ -0,0 +1,165 @@
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+#REFERENTE AO CACHE EM MEMÓRIA!!!
+# Um LRU só para o processo todo, com orçamento em bytes: cada entrada guarda o
+# próprio tamanho e as menos usadas saem quando o total passa do orçamento. As
+# páginas separam as entradas por espaço ('analise.figuras', ...), e os
+# acertos, faltas e despejos de cada espaço saem no /metrics. Derivados que
+# podem ser refeitos entram com guardar(); os snapshots atuais das planilhas,
+# que as páginas não podem perder, entram com fixar(): contam no orçamento
+# (sobra menos para o LRU) mas nunca são despejados.
+
+logger = logging.getLogger(__name__)
+
+ORCAMENTO_BYTES = int(float(os.environ.get('CACHE_ORCAMENTO_MB', '256')) * 1024 * 1024)
+# Acima disso uma lista tem o tamanho estimado por amostra
+AMOSTRA_ITENS = 200
+
+# {(espaço, chave): (valor, tamanho)}, do menos para o mais recente
+_entradas = OrderedDict()
+# {(espaço, chave): (valor, tamanho)} fixadas, fora do despejo
+_fixas = {}
+_total_bytes = 0
+_contadores = {}
+_lock = threading.RLock()
+
+
+def tamanho_de(valor):
+    """Bytes aproximados de `valor`, contando o conteúdo de DataFrames e containers"""
+    if isinstance(valor, (pd.DataFrame, pd.Series, pd.Index)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum() if isinstance(uso, pd.Series) else uso)
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_de(k) + tamanho_de(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)) and len(valor) > AMOSTRA_ITENS:
+        # Listas grandes (registros de tabela) são estimadas por uma amostra
+        passo = len(valor) // AMOSTRA_ITENS
+        amostra = sum(tamanho_de(item) for item in valor[::passo][:AMOSTRA_ITENS])
+        return sys.getsizeof(valor) + amostra * len(valor) // AMOSTRA_ITENS
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(tamanho_de(item) for item in valor)
+    return sys.getsizeof(valor)
+
+def _contar(espaco, evento, quantidade=1):
+    contadores = _contadores.setdefault(espaco, {'acertos': 0, 'faltas': 0, 'despejos': 0})
+    contadores[evento] += quantidade
+
+def _remover(chave_completa):
+    global _total_bytes
+    _, tamanho = (_entradas.pop(chave_completa) if chave_completa in _entradas else _fixas.pop(chave_completa))
+    _total_bytes -= tamanho
+
+def _despejar():
+    # Só as entradas do LRU saem; as fixas continuam contando no total
+    while _total_bytes > ORCAMENTO_BYTES and _entradas:
+        (espaco_antigo, chave_antiga), _ = next(iter(_entradas.items()))
+        _remover((espaco_antigo, chave_antiga))
+        _contar(espaco_antigo, 'despejos')
+        logger.debug(f"Despejado do cache: {espaco_antigo} {chave_antiga!r}")
+
+def obter(espaco, chave, padrao=None):
+    """Valor guardado em (espaco, chave), ou `padrao` se não estiver no cache"""
+    with _lock:
+        entrada = _entradas.get((espaco, chave)) or _fixas.get((espaco, chave))
+        if entrada is None:
+            _contar(espaco, 'faltas')
+            return padrao
+        if (espaco, chave) in _entradas:
+            _entradas.move_to_end((espaco, chave))
+        _contar(espaco, 'acertos')
+        return entrada[0]
+
+def guardar(espaco, chave, valor, tamanho=None):
+    """Guarda `valor` e despeja as entradas menos recentes até caber no orçamento.
+
+    Valor maior que o orçamento inteiro não é guardado (conta como despejo).
+    """
+    global _total_bytes
+    tamanho = tamanho_de(valor) if tamanho is None else tamanho
+    with _lock:
+        if (espaco, chave) in _entradas or (espaco, chave) in _fixas:
+            _remover((espaco, chave))
+        if tamanho > ORCAMENTO_BYTES:
+            _contar(espaco, 'despejos')
+            logger.warning(f"Entrada {espaco} de {tamanho} bytes não cabe no orçamento de {ORCAMENTO_BYTES}")
+            return valor
+
+        _entradas[(espaco, chave)] = (valor, tamanho)
+        _total_bytes += tamanho
+        _despejar()
+        if (espaco, chave) not in _entradas:
+            # As fixas sozinhas já ocupam o orçamento
+            logger.warning(f"Entrada {espaco} de {tamanho} bytes não coube ao lado das entradas fixas")
+    return valor
+
+def fixar(espaco, chave, valor, tamanho=None):
+    """Guarda `valor` fora do despejo, contando o tamanho no orçamento.
+
+    Substitui a entrada anterior da mesma chave; as do LRU saem para abrir espaço.
+    """
+    global _total_bytes
+    tamanho = tamanho_de(valor) if tamanho is None else tamanho
+    with _lock:
+        if (espaco, chave) in _entradas or (espaco, chave) in _fixas:
+            _remover((espaco, chave))
+        _fixas[(espaco, chave)] = (valor, tamanho)
+        _total_bytes += tamanho
+        _despejar()
+        if _total_bytes > ORCAMENTO_BYTES:
+            logger.warning(f"Entradas fixas somam {_total_bytes} bytes, acima do orçamento de {ORCAMENTO_BYTES}")
+    return valor
+
+def descartar(espaco, chave=None):
+    """Remove (espaco, chave), ou todas as entradas do espaço quando `chave` é None"""
+    with _lock:
+        if chave is not None:
+            if (espaco, chave) in _entradas or (espaco, chave) in _fixas:
+                _remover((espaco, chave))
+            return
+        for chave_completa in [c for c in list(_entradas) + list(_fixas) if c[0] == espaco]:
+            _remover(chave_completa)
+
+def estatisticas():
+    """{espaço: {'acertos', 'faltas', 'despejos', 'entradas', 'bytes'}} mais o total e o orçamento"""
+    with _lock:
+        por_espaco = {
+            espaco: dict(contadores, entradas=0, bytes=0)
+            for espaco, contadores in _contadores.items()
+        }
+        for (espaco, _), (_, tamanho) in list(_entradas.items()) + list(_fixas.items()):
+            resumo = por_espaco.setdefault(espaco, {'acertos': 0, 'faltas': 0, 'despejos': 0, 'entradas': 0, 'bytes': 0})
+            resumo['entradas'] += 1
+            resumo['bytes'] += tamanho
+        return {'espacos': por_espaco, 'bytes': _total_bytes, 'orcamento': ORCAMENTO_BYTES}
+
+def texto_metricas():
+    """Linhas no formato texto do Prometheus com os números do cache"""
+    resumo = estatisticas()
+    linhas = [
+        "# HELP dash_cache_budget_bytes Orçamento de memória do cache",
+        "# TYPE dash_cache_budget_bytes gauge",
+        f"dash_cache_budget_bytes {resumo['orcamento']}",
+    ]
+    series = [
+        ('dash_cache_hits_total', 'counter', 'acertos', 'Leituras do cache que encontraram a entrada'),
+        ('dash_cache_misses_total', 'counter', 'faltas', 'Leituras do cache sem a entrada'),
+        ('dash_cache_evictions_total', 'counter', 'despejos', 'Entradas despejadas pelo orçamento de memória'),
+        ('dash_cache_entries', 'gauge', 'entradas', 'Entradas no cache'),
+        ('dash_cache_bytes', 'gauge', 'bytes', 'Bytes estimados das entradas no cache'),
+    ]
+    for metrica, tipo, campo, descricao in series:
+        linhas.append(f"# HELP {metrica} {descricao}")
+        linhas.append(f"# TYPE {metrica} {tipo}")
+        for espaco, valores in sorted(resumo['espacos'].items()):
+            linhas.append(f'{metrica}{{espaco="{espaco}"}} {valores[campo]}')
+    return linhas
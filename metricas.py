@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+import memoria
+
+
+#REFERENTE ÀS MÉTRICAS DOS CALLBACKS!!!
+
+logger = logging.getLogger(__name__)
+
+ROTA_CALLBACKS = '/_dash-update-component'
+
+# Limites dos histogramas (le) de cada métrica
+BUCKETS = {
+    'dash_callback_duration_seconds': [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    'dash_callback_workbook_parse_seconds': [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    'dash_callback_rows_read': [0, 10, 100, 1000, 10000, 100000, 1000000],
+    'dash_callback_response_bytes': [1024, 10240, 102400, 1048576, 10485760, 104857600],
+}
+
+DESCRICOES = {
+    'dash_callback_duration_seconds': 'Tempo total da requisição do callback',
+    'dash_callback_workbook_parse_seconds': 'Tempo gasto lendo planilhas Excel dentro do callback',
+    'dash_callback_rows_read': 'Linhas lidas de planilhas Excel pelo callback',
+    'dash_callback_response_bytes': 'Tamanho da resposta serializada do callback',
+}
+
+# Estado em memória do processo: {metrica: {callback: {'buckets': [...], 'soma': x, 'total': n}}}
+_histogramas = {nome: {} for nome in BUCKETS}
+_erros = {}
+_lock = threading.Lock()
+
+
+def _observar(metrica, callback_id, valor):
+    limites = BUCKETS[metrica]
+    with _lock:
+        serie = _histogramas[metrica].setdefault(
+            callback_id, {'buckets': [0] * len(limites), 'soma': 0.0, 'total': 0}
+        )
+        for i, limite in enumerate(limites):
+            if valor <= limite:
+                serie['buckets'][i] += 1
+        serie['soma'] += valor
+        serie['total'] += 1
+
+def registrar_leitura(segundos, linhas):
+    """Soma uma leitura de planilha na requisição atual (fora de requisição é ignorada)"""
+    if not has_request_context():
+        return
+    g.metricas_leitura = getattr(g, 'metricas_leitura', 0.0) + segundos
+    g.metricas_linhas = getattr(g, 'metricas_linhas', 0) + linhas
+
+def identificar_callback():
+    """Usa as saídas do callback como identificador (ex.: 'tabela-dados.data')"""
+    try:
+        corpo = request.get_json(silent=True) or {}
+    except Exception:
+        corpo = {}
+    saida = corpo.get('output') or 'desconhecido'
+    # Callbacks com várias saídas chegam como '..a.b...c.d..'
+    return saida.strip('.').replace('...', ',') or 'desconhecido'
+
+def _antes():
+    if request.path == ROTA_CALLBACKS:
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_leitura = 0.0
+        g.metricas_linhas = 0
+
+def _depois(response):
+    inicio = getattr(g, 'metricas_inicio', None)
+    if inicio is None:
+        return response
+
+    try:
+        callback_id = identificar_callback()
+        _observar('dash_callback_duration_seconds', callback_id, time.perf_counter() - inicio)
+        _observar('dash_callback_workbook_parse_seconds', callback_id, g.metricas_leitura)
+        _observar('dash_callback_rows_read', callback_id, g.metricas_linhas)
+        if not response.direct_passthrough:
+            _observar('dash_callback_response_bytes', callback_id, len(response.get_data()))
+        if response.status_code >= 400:
+            with _lock:
+                _erros[callback_id] = _erros.get(callback_id, 0) + 1
+    except Exception as e:
+        logger.error(f"Erro ao registrar métricas: {str(e)}")
+    return response
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatar_limite(limite):
+    return str(int(limite)) if float(limite).is_integer() else str(limite)
+
+def gerar_texto_metricas():
+    """Métricas no formato texto do Prometheus (version 0.0.4)"""
+    linhas = []
+    with _lock:
+        for metrica, series in _histogramas.items():
+            linhas.append(f"# HELP {metrica} {DESCRICOES[metrica]}")
+            linhas.append(f"# TYPE {metrica} histogram")
+            for callback_id, serie in sorted(series.items()):
+                rotulo = f'callback="{_escapar(callback_id)}"'
+                for limite, contagem in zip(BUCKETS[metrica], serie['buckets']):
+                    linhas.append(f'{metrica}_bucket{{{rotulo},le="{_formatar_limite(limite)}"}} {contagem}')
+                linhas.append(f'{metrica}_bucket{{{rotulo},le="+Inf"}} {serie["total"]}')
+                linhas.append(f'{metrica}_sum{{{rotulo}}} {serie["soma"]}')
+                linhas.append(f'{metrica}_count{{{rotulo}}} {serie["total"]}')
+
+        linhas.append("# HELP dash_callback_errors_total Respostas de callback com status >= 400")
+        linhas.append("# TYPE dash_callback_errors_total counter")
+        for callback_id, total in sorted(_erros.items()):
+            linhas.append(f'dash_callback_errors_total{{callback="{_escapar(callback_id)}"}} {total}')
+
+    linhas.extend(memoria.texto_metricas())
+    return '\n'.join(linhas) + '\n'
+
+def registrar(server):
+    """Instala os hooks de medição e a rota /metrics no servidor Flask do Dash.
+
+    Os histogramas ficam na memória de cada processo; com vários workers do
+    gunicorn cada um expõe os próprios números.
+    """
+    server.before_request(_antes)
+    server.after_request(_depois)
+    server.add_url_rule(
+        '/metrics', 'metricas',
+        lambda: Response(gerar_texto_metricas(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    )
@@ -0,0 +1,56 @@
+import logging
+import os
+import threading
+
+
+#REFERENTE AO OBSERVADOR DAS PLANILHAS!!!
+# Uma thread por arquivo olha o mtime e recarrega o cache em segundo plano, para
+# que os callbacks nunca esperem o parse de uma planilha alterada.
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre verificações do mtime (o disco do Render não tem inotify)
+INTERVALO_SEGUNDOS = float(os.environ.get('OBSERVADOR_INTERVALO', '5'))
+
+
+def _mtime(caminho):
+    try:
+        return os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+def _observar(caminho, recarregar, intervalo, parar, vencido):
+    # Primeira volta sempre chama recarregar: cobre mudanças entre a carga inicial e a thread
+    visto, anterior = None, _mtime(caminho)
+    while not parar.wait(intervalo):
+        atual = _mtime(caminho)
+        # Só recarrega com o mtime parado por uma volta inteira: a gravação já terminou
+        estavel = atual == anterior
+        anterior = atual
+        if atual is None or not estavel:
+            continue
+        if atual == visto and not (vencido and vencido()):
+            continue
+        try:
+            # recarregar devolve False quando a carga falhou: tenta de novo na próxima volta
+            if recarregar() is not False:
+                visto = atual
+        except Exception as e:
+            logger.error(f"Erro ao recarregar {caminho}: {str(e)}")
+
+def observar(caminho, recarregar, intervalo=INTERVALO_SEGUNDOS, vencido=None):
+    """Chama `recarregar()` numa thread daemon sempre que o mtime de `caminho` mudar.
+
+    `vencido()`, se passado, é consultado a cada volta: devolvendo True, recarrega
+    mesmo sem mudança no arquivo (ex.: virada do ano). Devolve o Event que
+    encerra a thread quando setado.
+    """
+    parar = threading.Event()
+    threading.Thread(
+        target=_observar,
+        args=(caminho, recarregar, intervalo, parar, vencido),
+        name=f'observador-{os.path.basename(caminho)}',
+        daemon=True
+    ).start()
+    logger.info(f"Observando {caminho} a cada {intervalo:g}s")
+    return parar
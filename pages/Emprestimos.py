@@ -2,8 +2,11 @@ import dash
 from dash import register_page, html, dcc, dash_table, callback, Input, Output, State
 import pandas as pd
 import numpy as np
+import os
 from datetime import datetime
 import data_processing
+import exportacoes
+import memoria
 
 
 #REFERENTE A EMPRÉSTIMOS!!!
@@ -11,8 +14,13 @@ import data_processing
 # Registra a página
 register_page(__name__, path='/Emprestimos')
 
-# Carrega dados e configurações
-processed_sheets = data_processing.load_and_process_data()
+# Exportação gerada uma vez por versão do livro (toda escrita regrava o manifesto)
+exportacoes.registrar_artefato(
+    'emprestimos',
+    data_processing.MANIFESTO_PATH,
+    lambda destino: data_processing.gerar_exportacao(data_processing.load_and_process_data(), destino),
+    'Dados_Atualizados.xlsx'
+)
 
 # Concatena todas as abas e cria fallback para estrutura vazia
 base_columns = [
@@ -22,17 +30,65 @@ base_columns = [
     '%trans', '%liberad'
 ]
 
-if processed_sheets:
-    df = pd.concat(processed_sheets.values(), ignore_index=True)
+def _livro(particoes):
+    """Partições concatenadas, indexadas por ('AAAA-MM', linha na partição)"""
+    if not particoes:
+        livro = pd.DataFrame(columns=base_columns)
+        livro.index = pd.MultiIndex.from_tuples([], names=['particao', 'linha'])
+        return livro
+    livro = pd.concat(particoes, names=['particao', 'linha'])
     # Adiciona colunas faltantes da base_columns
-    df = df.reindex(columns=base_columns, fill_value=np.nan) 
-else:
-    df = pd.DataFrame(columns=base_columns)
+    return livro.reindex(columns=base_columns, fill_value=np.nan)
+
+def _particao(chave):
+    """DataFrame atual de uma partição 'AAAA-MM' (vazio se ela não existir)"""
+    inicio = pd.Timestamp(f'{chave}-01')
+    particoes = data_processing.carregar_particoes(inicio, inicio)
+    if chave in particoes:
+        return particoes[chave]['df']
+    if chave in data_processing.ler_manifesto()['particoes']:
+        # Regravar a partição sem as linhas atuais apagaria o mês inteiro
+        raise RuntimeError(f"Partição {chave} não pôde ser lida")
+    return pd.DataFrame(columns=base_columns)
+
+# Datas padrão: o ano da partição mais recente, a partir do manifesto e sem
+# carregar o livro; anos anteriores só são lidos quando o período pedir
+min_date, max_date = data_processing.periodo_padrao() or (pd.to_datetime('2025-01-01'), pd.to_datetime('2025-12-31'))
 
-# Configura datas padrão seguras
-min_date = df['data'].min() if not df.empty else pd.to_datetime('2025-01-01')
-max_date = df['data'].max() if not df.empty else pd.to_datetime('2025-12-31')
+# =============================================
+# CONSULTA POR PERÍODO (tabela + relatório)
+# =============================================
+# A página não guarda o livro: cada consulta monta a visão do período a partir
+# das partições no cache do data_processing. Um resultado por (início, fim,
+# versão do manifesto), compartilhado pela tabela, pelo relatório e pelo
+# gerenciar_dados; toda escrita regrava o manifesto
+ESPACO_CONSULTAS = 'emprestimos.consultas'
 
+def consultar_periodo(start_date, end_date):
+    """Linhas (já com nota fiscal), índices (partição, linha) e totais do período, calculados uma vez"""
+    chave = (start_date, end_date, os.path.getmtime(data_processing.MANIFESTO_PATH))
+    consulta = memoria.obter(ESPACO_CONSULTAS, chave)
+    if consulta is not None:
+        return consulta
+
+    particoes = data_processing.carregar_particoes(start_date or None, end_date or None)
+    livro = _livro({particao: entrada['df'] for particao, entrada in particoes.items()})
+    inicio = pd.to_datetime(start_date, errors='coerce') if start_date else livro['data'].min()
+    fim = pd.to_datetime(end_date, errors='coerce') if end_date else livro['data'].max()
+
+    mask = (livro['data'] >= inicio) & (livro['data'] <= fim)
+    df_filtrado = livro.loc[mask].copy()
+    df_filtrado['nota_fiscal'] = (df_filtrado['valor_transacionado'] * 0.032).round(2)
+
+    consulta = {
+        'inicio': inicio,
+        'fim': fim,
+        'indices': df_filtrado.index.tolist(),
+        'registros': df_filtrado.to_dict("records"),
+        # Duas buscas binárias por coluna nas somas acumuladas de cada partição
+        'totais': data_processing.somar_particoes(particoes, inicio, fim),
+    }
+    return memoria.guardar(ESPACO_CONSULTAS, chave, consulta)
 
 # Configurações da página
 colors = {
@@ -127,10 +183,10 @@ layout = html.Div(
                     id="tabela-dados",
                     columns=[
                         {"name": col.upper(), "id": col} 
-                        for col in df.columns 
+                        for col in base_columns 
                         if col not in excluir_colunas
                     ],
-                    data=df.to_dict("records"),
+                    data=[],
                     page_size=15,
                     style_table={'minWidth': '100%', 'overflowX': 'auto'},
                     style_cell={
@@ -178,9 +234,10 @@ layout = html.Div(
                     'borderRadius': '5px'
                 }
             ),
-            html.Button(
+            html.A(
                 "Exportar Planilha",
                 id="exportar-btn",
+                href=exportacoes.url('emprestimos'),
                 n_clicks=0,
                 style={
                     'backgroundColor': colors['text'],
@@ -188,7 +245,9 @@ layout = html.Div(
                     'margin': '5px',
                     'border': 'none',
                     'padding': '10px 20px',
-                    'borderRadius': '5px'
+                    'borderRadius': '5px',
+                    'display': 'inline-block',
+                    'textDecoration': 'none'
                 }
             ),
             html.Button(
@@ -220,20 +279,10 @@ layout = html.Div(
 )
 def filtrar_dados(start_date, end_date):
     try:
-        if df.empty:
-            return []
-            
-        start_date = pd.to_datetime(start_date) if start_date else min_date
-        end_date = pd.to_datetime(end_date) if end_date else max_date
-        
-        mask = (df['data'] >= start_date) & (df['data'] <= end_date)
-        df_filtrado = df.loc[mask].copy()
-        df_filtrado['nota_fiscal'] = (df_filtrado['valor_transacionado'] * 0.032).round(2)
-        
-        return df_filtrado.to_dict("records")
+        return consultar_periodo(start_date, end_date)['registros']
     except Exception as e:
         print(f"Erro de filtragem: {str(e)}")
-        return df.to_dict("records") if not df.empty else []
+        return []
 
 @callback(
     Output("soma-result", "children"),
@@ -242,25 +291,21 @@ def filtrar_dados(start_date, end_date):
 )
 def calcular_soma(start_date, end_date):
     try:
-        # Converter para datetime e tratar valores inválidos
-        start_dt = pd.to_datetime(start_date, errors='coerce') if start_date else df['data'].min()
-        end_dt = pd.to_datetime(end_date, errors='coerce') if end_date else df['data'].max()
+        # Mesma consulta da tabela: período convertido e totais prontos
+        consulta = consultar_periodo(start_date, end_date)
+        start_dt, end_dt = consulta['inicio'], consulta['fim']
 
         # Garantir que as datas são válidas
         start_str = start_dt.strftime('%d/%m/%Y') if not pd.isna(start_dt) else "N/A"
         end_str = end_dt.strftime('%d/%m/%Y') if not pd.isna(end_dt) else "N/A"
-        # Aplicar filtro
-        mask = (df['data'] >= start_dt) & (df['data'] <= end_dt)
-        df_filtrado = df.loc[mask]
-        
-        # Cálculos
+        totais = consulta['totais']
         soma = {
-            'Valor_Transacionado': df_filtrado['valor_transacionado'].sum(),
-            'Valor_Liberado': df_filtrado['valor_liberado'].sum(),
-            'Comissao_Agente': df_filtrado['comissao_agente'].sum(),
-            'Valor_DualCred': df_filtrado['valor_dualcred'].sum(),
-            'Extra_Agente': df_filtrado['extra_agente'].sum(),
-            'nota_fiscal': df_filtrado['nota_fiscal'].sum()
+            'Valor_Transacionado': totais['valor_transacionado'],
+            'Valor_Liberado': totais['valor_liberado'],
+            'Comissao_Agente': totais['comissao_agente'],
+            'Valor_DualCred': totais['valor_dualcred'],
+            'Extra_Agente': totais['extra_agente'],
+            'nota_fiscal': totais['nota_fiscal']
         }
         
         return html.Pre(
@@ -296,8 +341,6 @@ def calcular_soma(start_date, end_date):
     prevent_initial_call=True
 )
 def gerenciar_dados(*args):
-    global processed_sheets
-    #processed_sheets = data_processing.load_and_process_data() 
     ctx = dash.callback_context
     triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
 
@@ -309,42 +352,37 @@ def gerenciar_dados(*args):
         start_date, end_date = args[num_form_inputs+3:num_form_inputs+5]
         selected_rows = args[-1] if len(args) > num_form_inputs+5 else []
 
-        # 2. Converter datas para o formato correto
-        start_date = pd.to_datetime(start_date, errors='coerce') or df['data'].min()
-        end_date = pd.to_datetime(end_date, errors='coerce') or df['data'].max()
-        
-        # 3. Aplicar filtro inicial
-        mask = (df['data'] >= start_date) & (df['data'] <= end_date)
-        filtered_df = df.loc[mask].copy()
+        # 2. Período filtrado (compartilhado com a tabela e o relatório)
+        consulta = consultar_periodo(start_date, end_date)
     except Exception as e:
         print(f"Erro no pré-processamento: {str(e)}")
-        return dash.no_update, dash.no_update, df.to_dict("records"), []
+        return dash.no_update, dash.no_update, dash.no_update, []
 
     # 4. Determinar ação do usuário
     try:
         if triggered_id == "salvar-btn":
-            return salvar_dados(form_inputs, filtered_df, start_date, end_date)
+            return salvar_dados(form_inputs, start_date, end_date)
             
         elif triggered_id == "exportar-btn":
-            export_data = data_processing.exportar_dados(processed_sheets)  # Dicionário de abas
+            # O download sai pelo href do link (/exportar/emprestimos), não pelo dcc.Download
             return (
             "✅ Planilha exportada com sucesso!",  # Mensagem
-            export_data,                          # Dados download
+            dash.no_update,                       # Download feito pela rota
             dash.no_update,                       # Mantém tabela
             []                                    # Limpa seleção
         )
         
             
         elif triggered_id == "apagar-btn":
-            return apagar_linha(selected_rows, start_date, end_date)
+            return apagar_linha(selected_rows, consulta, start_date, end_date)
             
     except Exception as e:
         print(f"Erro na ação: {str(e)}")
         return f"Erro: {str(e)}", None, dash.no_update, []
 
-    return dash.no_update, dash.no_update, filtered_df.to_dict("records"), []
+    return dash.no_update, dash.no_update, consulta['registros'], []
 
-def salvar_dados(form_inputs, filtered_df, start_date, end_date):
+def salvar_dados(form_inputs, start_date, end_date):
     try:
         # Coletar dados do formulário
         novos_dados = {}
@@ -382,50 +420,49 @@ def salvar_dados(form_inputs, filtered_df, start_date, end_date):
         ) if novos_dados['valor_liberado'] else 0
         novos_dados['nota_fiscal'] = round(novos_dados['valor_transacionado'] * 0.032, 2)
 
-        # 3. Atualizar DataFrame global
-        global df
-        df = pd.concat([df, pd.DataFrame([novos_dados])], ignore_index=True)
-        data_processing.salvar_no_excel(df) 
+        # 3. Só a partição do mês da linha nova é lida e regravada
+        chave = data_processing.chave_particao(novos_dados['data'])
+        particao = pd.concat([_particao(chave), pd.DataFrame([novos_dados])], ignore_index=True)
+        if not data_processing.salvar_no_excel(particao, particoes=[chave]):
+            raise RuntimeError("Falha ao gravar a partição")
 
-        # 4. Reaplicar filtro após atualização
-        mask = (df['data'] >= start_date) & (df['data'] <= end_date)
-        filtered_df = df.loc[mask]
-        
+        # 4. Reaplicar filtro após atualização (nova versão do livro)
         return (
             "✅ Dados salvos com sucesso!", 
             None, 
-            filtered_df.to_dict("records"), 
+            consultar_periodo(start_date, end_date)['registros'], 
             []
         )
     except Exception as e:
         print(f"Erro ao salvar: {str(e)}")
         return f"❌ Erro ao salvar: {str(e)}", None, dash.no_update, []
 
-def apagar_linha(selected_rows, start_date, end_date):
-    global df
+def apagar_linha(selected_rows, consulta, start_date, end_date):
     try:
         if not selected_rows:
             return "⚠️ Selecione uma linha antes de apagar!", None, dash.no_update, []
         
-        # 1. Obter índices reais no DataFrame global
-        mask = (df['data'] >= pd.to_datetime(start_date)) & (df['data'] <= pd.to_datetime(end_date))
-        filtered_indices = df[mask].index.tolist()
+        # 1. Obter índices (partição, linha) das linhas da tabela mostrada
+        filtered_indices = consulta['indices']
         
-        # 2. Mapear índices filtrados para índices globais
-        global_indices = [filtered_indices[i] for i in selected_rows]
+        # 2. Agrupar as linhas selecionadas por partição
+        por_particao = {}
+        for chave, linha in (filtered_indices[i] for i in selected_rows):
+            por_particao.setdefault(chave, []).append(linha)
         
-        # 3. Remover linhas
-        df = df.drop(global_indices)
-        data_processing.salvar_no_excel(df)
+        # 3. Remover linhas regravando só as partições envolvidas
+        restantes = pd.concat(
+            [_particao(chave).drop(linhas) for chave, linhas in por_particao.items()],
+            ignore_index=True
+        )
+        if not data_processing.salvar_no_excel(restantes, particoes=set(por_particao)):
+            raise RuntimeError("Falha ao gravar as partições")
         
         # 4. Atualizar DataFrame filtrado
-        mask = (df['data'] >= pd.to_datetime(start_date)) & (df['data'] <= pd.to_datetime(end_date))
-        filtered_df = df.loc[mask]
-        
         return (
             "✅ Linha apagada com sucesso!", 
             None, 
-            filtered_df.to_dict("records"), 
+            consultar_periodo(start_date, end_date)['registros'], 
             []
         )
     except Exception as e:
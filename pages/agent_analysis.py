@@ -1,9 +1,9 @@
 from dash import dcc, html, dash_table, Input, Output, callback, register_page
 import pandas as pd
 import data_processing
+import esquemas
 import logging
 from datetime import datetime
-import numpy as np
 
 
 #REFERENTE A EMPRÉSTIMOS!!!
@@ -21,49 +21,20 @@ def clean_agent_data(raw_data):
         else:
             df = raw_data.copy()
 
-        # Criar colunas essenciais se ausentes
-        essential_columns = {
-            'agente': 'Não Informado',
-            'data': pd.to_datetime('2025-01-01'),
-            'valor_transacionado': 0.0,
-            'valor_liberado': 0.0,
-            'comissao_agente': 0.0,
-            'extra_agente': 0.0
-        }
-
-        for col, default in essential_columns.items():
-            if col not in df.columns:
-                df[col] = default
-                logger.warning(f"Coluna '{col}' criada artificialmente")
-
-        # Tratamento de datas
-        df['data'] = pd.to_datetime(df['data'], errors='coerce').fillna(pd.to_datetime('2025-01-01'))
-        
-        # Tratamento do campo agente
-        df['agente'] = (
-            df['agente']
-            .fillna('Não Informado')
-            .astype(str)
-            .str.strip()
-            .replace({
-                '': 'Não Informado', 
-                'nan': 'Não Informado', 
-                'None': 'Não Informado',
-                'null': 'Não Informado',
-                np.nan: 'Não Informado'
-            })
-        )
+        # Colunas faltantes, tipos e agente em branco pelo esquema dos empréstimos
+        # (as partições do data_processing já chegam assim e o plano é reaproveitado)
+        df = esquemas.normalizar(df, 'emprestimos')
+        df['data'] = df['data'].fillna(pd.to_datetime('2025-01-01'))
 
         # Garantir tipos numéricos
         numeric_cols = ['valor_transacionado', 'valor_liberado', 'comissao_agente', 'extra_agente']
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+        df[numeric_cols] = df[numeric_cols].fillna(0.0)
 
         return df
 
     except Exception as e:
         logger.error(f"Erro na limpeza de dados: {str(e)}")
-        return pd.DataFrame(columns=list(essential_columns.keys()))
+        return pd.DataFrame(columns=esquemas.COLUNAS_EMPRESTIMOS)
 
 # Layout atualizado
 layout = html.Div(
@@ -197,7 +168,8 @@ def update_dynamic_content(n):
 )
 def update_analysis(start_date, end_date, selected_agent):
     try:
-        df = clean_agent_data(data_processing.load_and_process_data())
+        # Só as partições ano-mês que cruzam o período são carregadas
+        df = clean_agent_data(data_processing.load_and_process_data(start_date, end_date))
         
         if df.empty:
             return [], [], html.Div("Nenhum dado disponível para análise")
@@ -4,12 +4,17 @@ import dash
 from dash import dcc, html, Input, Output, dash_table, callback, register_page
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import logging
 import traceback
 import openpyxl
 from openpyxl import Workbook
+import planilhas
+import esquemas
+import memoria
+import observador
+import previsao
 
 register_page(
     __name__,
@@ -32,7 +37,7 @@ def setup_persistent_environment():
         
         if not os.path.exists(EXCEL_PATH):
             wb = Workbook()
-            wb.save(EXCEL_PATH)
+            planilhas.salvar_workbook(wb, EXCEL_PATH)
         
         if not os.access(MOUNT_PATH, os.W_OK):
             logging.error(f"Sem permissão de escrita em: {MOUNT_PATH}")
@@ -44,25 +49,6 @@ def setup_persistent_environment():
 
 setup_persistent_environment()
 
-# =====================================
-# CARREGAMENTO DE DADOS
-# =====================================
-try:
-    df_cadastros = pd.read_excel(EXCEL_PATH, sheet_name='Sheet1', engine='openpyxl')
-    df_transacoes = pd.read_excel(EXCEL_PATH, sheet_name='Transacoes', engine='openpyxl')
-    df_transacoes['DATA'] = pd.to_datetime(df_transacoes['DATA'], dayfirst=True)
-    
-    df = pd.merge(df_transacoes, 
-                df_cadastros[['ESTABELECIMENTO CPF/CNPJ', 'ESTABELECIMENTO NOME1']],
-                left_on='CPF/CNPJ',
-                right_on='ESTABELECIMENTO CPF/CNPJ',
-                how='left')
-
-except Exception as e:
-    df_cadastros = pd.DataFrame()
-    df_transacoes = pd.DataFrame()
-    df = pd.DataFrame()
-
 # =====================================
 # PREPARAÇÃO DOS DADOS MENSAL
 # =====================================
@@ -87,6 +73,23 @@ meses_ordem = [
     'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro Atual'
 ]
 
+# Meses do calendário, na ordem das abas 'Faturamento <mês>'
+meses_calendario = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+                    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+
+# A Sheet1 não guarda o ano: 'Dezembro' é do ano anterior ao de referência e o
+# resto (até 'Dezembro Atual') do próprio ano; as abas semanais também
+def ano_referencia():
+    """ANALISE_ANO_REFERENCIA, ou o ano corrente no momento da chamada"""
+    return int(os.environ.get('ANALISE_ANO_REFERENCIA', datetime.today().year))
+
+def competencias(ano):
+    """Início do mês de cada coluna mensal da Sheet1 para o ano de referência `ano`"""
+    return {
+        col: pd.Timestamp(ano - 1 if idx == 0 else ano, 12 if idx in (0, 12) else idx, 1)
+        for idx, col in enumerate(meses)
+    }
+
 proximo_mes_map = {
     'Dezembro': 'Janeiro',
     'Janeiro': 'Fevereiro',
@@ -103,27 +106,23 @@ proximo_mes_map = {
     'Dezembro Atual': 'Janeiro'
 }
 
-if not df_cadastros.empty:
-    df_long = df_cadastros.melt(
-        id_vars=['ESTABELECIMENTO NOME1', 'STATUS'],
-        value_vars=meses.keys(),
-        var_name='Mês',
-        value_name='Faturamento'
-    )
-    df_long['Mês'] = df_long['Mês'].map(meses)
-    df_long['Mês'] = pd.Categorical(df_long['Mês'], categories=meses_ordem, ordered=True)
-else:
-    df_long = pd.DataFrame()
-
 # =====================================
 # FUNÇÕES AUXILIARES
 # =====================================
 def get_proximo_mes(mes_atual):
     return proximo_mes_map.get(mes_atual, 'Janeiro')
 
-def calcular_previsao(cliente_data):
-    valores = cliente_data['Faturamento'].replace(0, np.nan).dropna()
-    return np.mean(valores) if not valores.empty else 0
+def no_periodo(inicio, fim, start_date, end_date):
+    """Máscara das linhas cujo período [inicio, fim] cruza o intervalo escolhido.
+
+    Linhas sem data ficam; sem start_date/end_date aquele lado não filtra.
+    """
+    mascara = pd.Series(True, index=inicio.index)
+    if start_date:
+        mascara &= fim.isna() | (fim >= pd.Timestamp(start_date).normalize())
+    if end_date:
+        mascara &= inicio.isna() | (inicio <= pd.Timestamp(end_date))
+    return mascara
 
 # =====================================
 # PALETA DE CORES & ESTILOS 
@@ -147,171 +146,268 @@ FONT_STYLE = {
     'color': COLORS['text']
 }
 
-options = [{'label': str(nome), 'value': str(nome)} 
-           for nome in df_cadastros['ESTABELECIMENTO NOME1'].unique() 
-           if pd.notna(nome) and str(nome).strip() != '']
-
-if not options:
-    options = [{'label': 'Sem dados disponíveis', 'value': 'NO_DATA'}]
-
 # =====================================
 # PRÉ CARREGAMENTO DE DADOS 
 # =====================================
+# Snapshot atual fixado no memoria: conta no orçamento de memória, mas fica
+# fora do despejo do LRU, e os callbacks nunca esperam um parse
+ESPACO_DADOS = 'analise.dados'
 cached_data = {
     'df_cadastros': pd.DataFrame(),
     'df_transacoes': pd.DataFrame(),
     'df': pd.DataFrame(),
     'df_long': pd.DataFrame(),
     'weekly_data': pd.DataFrame(),
+    'previsoes': previsao.projetar(pd.DataFrame(), list(meses)),
+    'ano': None,
     'last_modified': None
 }
 
-def load_data():
-    global cached_data
+def _montar_dados(current_modified):
+    """Lê a planilha e monta o snapshot inteiro"""
+    # Ano decidido a cada montagem: um processo que atravessa a virada não fica preso
+    ano = ano_referencia()
+    # Sheet1, Transacoes e as abas semanais num único lote, com parse em paralelo
+    # Nomes e abas da mesma versão do arquivo, mesmo com um save no meio
+    with planilhas.versao_fixa(EXCEL_PATH) as fixo:
+        abas_semanais = [aba for aba in planilhas.nomes_abas(fixo) if aba.startswith('Faturamento ')]
+        abas = planilhas.ler_abas(fixo, ['Sheet1', 'Transacoes'] + abas_semanais, engine='openpyxl')
+
+    df_cadastros = esquemas.normalizar(abas['Sheet1'], 'cadastros')
+    df_transacoes = esquemas.normalizar(abas['Transacoes'], 'transacoes')
+
+    df = pd.merge(
+        df_transacoes, 
+        df_cadastros[[esquemas.CPF_CADASTRO, esquemas.NOME_CADASTRO]],
+        left_on=esquemas.CPF,
+        right_on=esquemas.CPF_CADASTRO,
+        how='left'
+    )
+
+    if not df_cadastros.empty:
+        df_long = df_cadastros.melt(
+            id_vars=[esquemas.NOME_CADASTRO, 'STATUS'],
+            value_vars=meses.keys(),
+            var_name='Mês',
+            value_name='Faturamento'
+        )
+        # Período de cada mês, para o filtro do date-range
+        df_long['Início'] = df_long['Mês'].map(competencias(ano))
+        df_long['Fim'] = df_long['Início'] + pd.offsets.MonthEnd(0)
+        df_long['Mês'] = df_long['Mês'].map(meses)
+        df_long['Mês'] = pd.Categorical(df_long['Mês'], categories=meses_ordem, ordered=True)
+        df_long['Faturamento'] = df_long['Faturamento'].fillna(0)
+    else:
+        df_long = pd.DataFrame()
+
+    weekly_dfs = []
     try:
-        current_modified = os.path.getmtime(EXCEL_PATH)
-        
-        if cached_data['last_modified'] != current_modified:
-            df_cadastros = pd.read_excel(EXCEL_PATH, sheet_name='Sheet1', engine='openpyxl')
-            df_transacoes = pd.read_excel(EXCEL_PATH, sheet_name='Transacoes', engine='openpyxl')
-            df_transacoes['DATA'] = pd.to_datetime(df_transacoes['DATA'], dayfirst=True)
-            
-            df = pd.merge(
-                df_transacoes, 
-                df_cadastros[['ESTABELECIMENTO CPF/CNPJ', 'ESTABELECIMENTO NOME1']],
-                left_on='CPF/CNPJ',
-                right_on='ESTABELECIMENTO CPF/CNPJ',
+        for sheet_name in abas_semanais:
+            df_sheet = esquemas.normalizar(abas[sheet_name], 'faturamento_semanal')
+            if esquemas.CPF in df_sheet.columns:
+                df_sheet.rename(columns={esquemas.CPF: esquemas.CPF_CADASTRO}, inplace=True)
+
+            mes = sheet_name.replace('Faturamento ', '')
+            mes = 'Março' if mes == 'Marco' else mes
+
+            df_sheet = pd.merge(
+                df_sheet,
+                df_cadastros[[esquemas.CPF_CADASTRO, esquemas.NOME_CADASTRO]],
+                on=esquemas.CPF_CADASTRO,
                 how='left'
             )
 
-            if not df_cadastros.empty:
-                df_long = df_cadastros.melt(
-                    id_vars=['ESTABELECIMENTO NOME1', 'STATUS'],
-                    value_vars=meses.keys(),
-                    var_name='Mês',
-                    value_name='Faturamento'
-                )
-                df_long['Mês'] = df_long['Mês'].map(meses)
-                df_long['Mês'] = pd.Categorical(df_long['Mês'], categories=meses_ordem, ordered=True)
-            else:
-                df_long = pd.DataFrame()
+            df_sheet['MÊS'] = mes
+            df_sheet['SEMANA'] = df_sheet.get('SEMANA', 0)
+            weekly_dfs.append(df_sheet)
+
+        df_semanas = pd.concat(weekly_dfs, ignore_index=True) if weekly_dfs else pd.DataFrame()
+        if not df_semanas.empty:
+            df_semanas['SEMANA'] = df_semanas['SEMANA'].fillna(0).astype(int)
+            # Semana N vai do dia 7*(N-1)+1 até 7 dias depois, sem passar do fim do mês
+            inicio_mes = df_semanas['MÊS'].map({
+                mes: pd.Timestamp(ano, numero, 1)
+                for numero, mes in enumerate(meses_calendario, start=1)
+            })
+            fim_mes = inicio_mes + pd.offsets.MonthEnd(0)
+            df_semanas['Início'] = np.minimum(inicio_mes + pd.to_timedelta((df_semanas['SEMANA'].clip(lower=1) - 1) * 7, unit='D'), fim_mes)
+            df_semanas['Fim'] = np.minimum(df_semanas['Início'] + pd.Timedelta(days=6), fim_mes)
+    except Exception as e:
+        print(f"Erro ao carregar semanas: {str(e)}")
+        df_semanas = pd.DataFrame()
+
+    # Previsão do próximo mês de todos os clientes, uma vez por versão da Sheet1
+    previsoes = previsao.projetar(df_cadastros, list(meses))
+
+    return {
+        'df_cadastros': df_cadastros,
+        'df_transacoes': df_transacoes,
+        'df': df,
+        'df_long': df_long,
+        'weekly_data': df_semanas,
+        'previsoes': previsoes,
+        'ano': ano,
+        'last_modified': current_modified
+    }
 
-            weekly_dfs = []
-            try:
-                xls = pd.ExcelFile(EXCEL_PATH)
-                for sheet_name in xls.sheet_names:
-                    if sheet_name.startswith('Faturamento '):
-                        df_sheet = pd.read_excel(xls, sheet_name=sheet_name)
-                        if 'CPF/CNPJ' in df_sheet.columns:
-                            df_sheet.rename(columns={'CPF/CNPJ': 'ESTABELECIMENTO CPF/CNPJ'}, inplace=True)
-                        
-                        mes = sheet_name.replace('Faturamento ', '')
-                        mes = 'Março' if mes == 'Marco' else mes
-                        
-                        df_sheet = pd.merge(
-                            df_sheet,
-                            df_cadastros[['ESTABELECIMENTO CPF/CNPJ', 'ESTABELECIMENTO NOME1']],
-                            on='ESTABELECIMENTO CPF/CNPJ',
-                            how='left'
-                        )
-                        
-                        df_sheet['MÊS'] = mes
-                        df_sheet['SEMANA'] = df_sheet.get('SEMANA', 0)
-                        weekly_dfs.append(df_sheet)
+def load_data():
+    """Remonta o snapshot quando a planilha mudou e troca o atual de uma vez.
 
-                df_semanas = pd.concat(weekly_dfs, ignore_index=True) if weekly_dfs else pd.DataFrame()
-            except Exception as e:
-                print(f"Erro ao carregar semanas: {str(e)}")
-                df_semanas = pd.DataFrame()
-
-            cached_data.update({
-                'df_cadastros': df_cadastros,
-                'df_transacoes': df_transacoes,
-                'df': df,
-                'df_long': df_long,
-                'weekly_data': df_semanas,
-                'last_modified': current_modified
-            })
+    Roda no import e depois na thread do observador; os callbacks leem por
+    dados_atuais(). Devolve False se a carga falhou (o snapshot anterior fica).
+    """
+    global cached_data
+    try:
+        current_modified = os.path.getmtime(EXCEL_PATH)
+
+        if cached_data['last_modified'] != current_modified or cached_data['ano'] != ano_referencia():
+            # Troca atômica: quem já pegou o snapshot antigo continua com ele inteiro
+            cached_data = memoria.fixar(ESPACO_DADOS, 'atual', _montar_dados(current_modified))
 
     except Exception as e:
         logging.error(f"Erro geral: {str(e)}")
+        return False
+    return True
+
+def dados_atuais():
+    """Snapshot para a requisição toda; o observador pode trocar cached_data no meio"""
+    return cached_data
+
+def _ano_vencido():
+    return cached_data['ano'] != ano_referencia()
+
+load_data()
+# A virada do ano remonta no tick do próprio observador, mesmo sem o arquivo mudar
+observador.observar(EXCEL_PATH, load_data, vencido=_ano_vencido)
 
 # =====================================
 # LAYOUT 
 # =====================================
-layout = html.Div(style={'backgroundColor': COLORS['background'], 'minHeight': '100vh'}, children=[
-    html.Div(className='container', style={'padding': '30px', 'maxWidth': '1200px', 'margin': '0 auto'}, children=[
-        
-        html.Div(className='header', style={'textAlign': 'center', 'marginBottom': '40px'}, children=[
-            dcc.Interval(
-                id='interval-component',
-                interval=300*1000,
-                n_intervals=0,
-                disabled=False
-            ),
-            html.H1("📈 Análise de Faturamento", 
-                   style={'color': COLORS['primary'], 'fontSize': '2.5em'}),
-            html.P("Análise de faturamento de clientes DualBank", 
-                  style={'color': COLORS['secondary'], 'fontSize': '1.1em'})
-        ]),
+def layout(**kwargs):
+    # Montado a cada visita: opções do snapshot atual e período do ano de referência de hoje
+    nomes = dados_atuais()['df_cadastros'].get(esquemas.NOME_CADASTRO, pd.Series(dtype=object))
+    options = [{'label': str(nome), 'value': str(nome)} 
+               for nome in nomes.unique() 
+               if pd.notna(nome) and str(nome).strip() != '']
+
+    if not options:
+        options = [{'label': 'Sem dados disponíveis', 'value': 'NO_DATA'}]
+
+    ano = ano_referencia()
+    return html.Div(style={'backgroundColor': COLORS['background'], 'minHeight': '100vh'}, children=[
+        html.Div(className='container', style={'padding': '30px', 'maxWidth': '1200px', 'margin': '0 auto'}, children=[
         
-        html.Div(className='control-card', style={
-            'backgroundColor': COLORS['card'],
-            'padding': '25px',
-            'borderRadius': '15px',
-            'marginBottom': '30px'
-        }, children=[
-            dcc.Dropdown(
-                id='cliente-dropdown',
-                options=options,
-                multi=True,
-                placeholder="🔍 Selecione o cliente desejado...",
-                style={
-                    'width': '100%',
-                    'borderRadius': '8px',
-                    'border': f'1px solid {COLORS["primary"]}',
-                    'backgroundColor': COLORS['card'],
-                    'color': COLORS['text']
-                }
-            ),
-            dcc.DatePickerRange(
-                id='date-range',
-                start_date=datetime.today() - timedelta(days=30),
-                end_date=datetime.today(),
-                display_format='DD/MM/YYYY',
-                style={'marginTop': '15px'}
-            )
-        ]),
+            html.Div(className='header', style={'textAlign': 'center', 'marginBottom': '40px'}, children=[
+                dcc.Interval(
+                    id='interval-component',
+                    interval=300*1000,
+                    n_intervals=0,
+                    disabled=False
+                ),
+                html.H1("📈 Análise de Faturamento", 
+                       style={'color': COLORS['primary'], 'fontSize': '2.5em'}),
+                html.P("Análise de faturamento de clientes DualBank", 
+                      style={'color': COLORS['secondary'], 'fontSize': '1.1em'})
+            ]),
         
-        html.Div(className='graph-container', children=[
-            html.Div(className='graph-card', style={
+            html.Div(className='control-card', style={
                 'backgroundColor': COLORS['card'],
-                'padding': '20px',
+                'padding': '25px',
                 'borderRadius': '15px',
-                'marginBottom': '20px'
+                'marginBottom': '30px'
             }, children=[
-                dcc.Graph(
-                    id='grafico-mensal',
-                    style={'height': '400px'},
-                    config={'displayModeBar': False}
+                dcc.Dropdown(
+                    id='cliente-dropdown',
+                    options=options,
+                    multi=True,
+                    placeholder="🔍 Selecione o cliente desejado...",
+                    style={
+                        'width': '100%',
+                        'borderRadius': '8px',
+                        'border': f'1px solid {COLORS["primary"]}',
+                        'backgroundColor': COLORS['card'],
+                        'color': COLORS['text']
+                    }
+                ),
+                dcc.DatePickerRange(
+                    id='date-range',
+                    # Padrão cobre todas as colunas mensais da Sheet1, até 'Dezembro Atual'
+                    start_date=datetime(ano - 1, 12, 1),
+                    end_date=datetime(ano, 12, 31),
+                    display_format='DD/MM/YYYY',
+                    style={'marginTop': '15px'}
+                ),
+                dcc.RadioItems(
+                    id='metodo-previsao',
+                    options=[{'label': nome, 'value': metodo} for metodo, nome in previsao.METODOS.items()],
+                    value=previsao.METODO_PADRAO,
+                    inline=True,
+                    inputStyle={'marginRight': '4px'},
+                    labelStyle={'marginRight': '16px', 'color': COLORS['text']},
+                    style={'marginTop': '15px'}
                 )
             ]),
+        
+            html.Div(className='graph-container', children=[
+                html.Div(className='graph-card', style={
+                    'backgroundColor': COLORS['card'],
+                    'padding': '20px',
+                    'borderRadius': '15px',
+                    'marginBottom': '20px'
+                }, children=[
+                    dcc.Graph(
+                        id='grafico-mensal',
+                        style={'height': '400px'},
+                        config={'displayModeBar': False}
+                    )
+                ]),
             
-            html.Div(className='graph-card', style={
-                'backgroundColor': COLORS['card'],
-                'padding': '20px',
-                'borderRadius': '15px',
-                'marginBottom': '20px'
-            }, children=[
-                dcc.Graph(
-                    id='grafico-semanal',
-                    style={'height': '400px'},
-                    config={'displayModeBar': False}
-                )
+                html.Div(className='graph-card', style={
+                    'backgroundColor': COLORS['card'],
+                    'padding': '20px',
+                    'borderRadius': '15px',
+                    'marginBottom': '20px'
+                }, children=[
+                    dcc.Graph(
+                        id='grafico-semanal',
+                        style={'height': '400px'},
+                        config={'displayModeBar': False}
+                    )
+                ]),
+
+                html.Div(className='graph-card', style={
+                    'backgroundColor': COLORS['card'],
+                    'padding': '20px',
+                    'borderRadius': '15px',
+                    'marginBottom': '20px'
+                }, children=[
+                    html.H4("Maiores previsões para o próximo mês", style={'color': COLORS['primary']}),
+                    dash_table.DataTable(
+                        id='ranking-previsao',
+                        columns=[
+                            {'name': 'Cliente', 'id': 'Cliente'},
+                            {'name': 'Último mês ativo', 'id': 'Último Mês'},
+                            {'name': 'Último faturamento', 'id': 'Último Faturamento'},
+                            {'name': 'Previsão', 'id': 'Previsão'}
+                        ],
+                        page_size=10,
+                        style_header={'backgroundColor': COLORS['header'], 'color': COLORS['text'], 'fontWeight': 'bold'},
+                        style_cell={'backgroundColor': COLORS['card'], 'color': COLORS['text'], 'textAlign': 'left'}
+                    )
+                ])
             ])
         ])
     ])
-])
+
+# =====================================
+# CACHE DE FIGURAS 
+# =====================================
+# Figuras já serializadas por (clientes, período, método, versão dos dados),
+# no LRU do cache central
+ESPACO_FIGURAS = 'analise.figuras'
+
+# Quantos clientes entram no ranking de previsões
+RANKING_MAX = int(os.environ.get('ANALISE_RANKING_MAX', '50'))
 
 # =====================================
 # CALLBACKS 
@@ -321,10 +417,9 @@ layout = html.Div(style={'backgroundColor': COLORS['background'], 'minHeight': '
     Input('interval-component', 'n_intervals')
 )
 def update_dropdown_options(n):
-    load_data()
-    df_cadastros = cached_data['df_cadastros']
+    df_cadastros = dados_atuais()['df_cadastros']
     options = [{'label': str(nome), 'value': str(nome)} 
-               for nome in df_cadastros['ESTABELECIMENTO NOME1'].unique() 
+               for nome in df_cadastros[esquemas.NOME_CADASTRO].unique() 
                if pd.notna(nome) and str(nome).strip() != '']
     return options if options else [{'label': 'Sem dados', 'value': 'NO_DATA'}]
 
@@ -334,27 +429,73 @@ def update_dropdown_options(n):
     Input('cliente-dropdown', 'value'),
     Input('date-range', 'start_date'),
     Input('date-range', 'end_date'),
+    Input('metodo-previsao', 'value'),
+    Input('interval-component', 'n_intervals')
+)
+def update_analysis(clientes_selecionados, start_date, end_date, metodo, n):
+    if not clientes_selecionados or 'NO_DATA' in clientes_selecionados:
+        return go.Figure(), go.Figure()
+
+    metodo = metodo if metodo in previsao.METODOS else previsao.METODO_PADRAO
+    # Snapshot único para a requisição toda
+    dados = dados_atuais()
+    # Versão do arquivo e ano de referência identificam o snapshot: a virada do
+    # ano remonta os períodos sem mudar o mtime
+    chave = (tuple(clientes_selecionados), start_date, end_date, metodo, dados['last_modified'], dados['ano'])
+
+    # O tick do interval sem mudança nos dados cai aqui, sem pandas nem plotly
+    figuras = memoria.obter(ESPACO_FIGURAS, chave)
+    if figuras is not None:
+        return figuras
+
+    try:
+        fig_mensal, fig_semanal = montar_figuras(dados, clientes_selecionados, start_date, end_date, metodo)
+    except Exception:
+        # Falha não vai para o cache: o próximo tick tenta de novo
+        return go.Figure(), go.Figure()
+    return memoria.guardar(ESPACO_FIGURAS, chave, (fig_mensal.to_plotly_json(), fig_semanal.to_plotly_json()))
+
+@callback(
+    Output('ranking-previsao', 'data'),
+    Input('metodo-previsao', 'value'),
     Input('interval-component', 'n_intervals')
 )
-def update_analysis(clientes_selecionados, start_date, end_date, n):
+def update_ranking(metodo, n):
+    metodo = metodo if metodo in previsao.METODOS else previsao.METODO_PADRAO
+    ranking = previsao.ranking(dados_atuais()['previsoes'], metodo, RANKING_MAX)
+    return [
+        {
+            'Cliente': cliente,
+            'Último Mês': meses.get(linha['Último Mês'], linha['Último Mês']),
+            'Último Faturamento': f"R$ {linha['Último Faturamento']:,.2f}",
+            'Previsão': f"R$ {linha[metodo]:,.2f}"
+        }
+        for cliente, linha in ranking.iterrows()
+    ]
+
+def montar_figuras(dados, clientes_selecionados, start_date, end_date, metodo=previsao.METODO_PADRAO):
+    """Monta as figuras mensal e semanal a partir de um snapshot do cache.
+
+    Erros são logados e repassados, para quem chama não guardar figura incompleta.
+    """
     fig_mensal = go.Figure()
     fig_semanal = go.Figure()
-
-    if not clientes_selecionados or 'NO_DATA' in clientes_selecionados:
-        return fig_mensal, fig_semanal
+    projecoes = dados['previsoes']
 
     try:
-        load_data()
-        
-        if not cached_data['df_long'].empty:
-            filtered_mensal = cached_data['df_long'].copy()
-            filtered_mensal = filtered_mensal[filtered_mensal['ESTABELECIMENTO NOME1'].isin(clientes_selecionados)]
-            filtered_mensal['Faturamento'] = pd.to_numeric(filtered_mensal['Faturamento'], errors='coerce').fillna(0)
+        if not dados['df_long'].empty:
+            # Faturamento já vem float64 e sem vazios do load_data
+            # Clientes e período aplicados de uma vez, antes de qualquer cálculo por cliente
+            filtered_mensal = dados['df_long']
+            filtered_mensal = filtered_mensal[
+                filtered_mensal[esquemas.NOME_CADASTRO].isin(clientes_selecionados) &
+                no_periodo(filtered_mensal['Início'], filtered_mensal['Fim'], start_date, end_date)
+            ]
 
             cores = px.colors.qualitative.Plotly
             
             for idx, cliente in enumerate(clientes_selecionados):
-                cliente_data = filtered_mensal[filtered_mensal['ESTABELECIMENTO NOME1'] == cliente]
+                cliente_data = filtered_mensal[filtered_mensal[esquemas.NOME_CADASTRO] == cliente]
                 if cliente_data.empty:
                     continue
                 
@@ -374,8 +515,13 @@ def update_analysis(clientes_selecionados, start_date, end_date, n):
                 except ValueError:
                     proximo_mes = 'Janeiro'
 
-                valores_validos = cliente_data_valida['Faturamento']
-                previsao = np.mean(valores_validos) if not valores_validos.empty else 0
+                # Previsão já calculada no load_data com o histórico inteiro: só é
+                # desenhada quando o último mês ativo dela está dentro do período
+                if cliente in projecoes.index:
+                    valor_previsto = projecoes.at[cliente, metodo]
+                    ultimo_previsto = meses.get(projecoes.at[cliente, 'Último Mês'])
+                else:
+                    valor_previsto, ultimo_previsto = 0, None
 
                 meses_ativos = cliente_data_valida['Mês'].tolist() + [proximo_mes]
                 dados_plot = cliente_data[cliente_data['Mês'].isin(meses_ativos)]
@@ -390,10 +536,10 @@ def update_analysis(clientes_selecionados, start_date, end_date, n):
                     hovertemplate='<b>%{x}</b><br>R$ %{y:,.2f}<extra></extra>'
                 ))
 
-                if proximo_mes in meses_ordem:
+                if proximo_mes in meses_ordem and ultimo_mes == ultimo_previsto:
                     fig_mensal.add_trace(go.Scatter(
                         x=[ultimo_mes, proximo_mes],
-                        y=[cliente_data_valida['Faturamento'].iloc[-1], previsao],
+                        y=[cliente_data_valida['Faturamento'].iloc[-1], valor_previsto],
                         mode='lines+markers',
                         line=dict(dash='dot', color=cores[idx]),
                         marker=dict(symbol='diamond', size=12),
@@ -443,30 +589,30 @@ def update_analysis(clientes_selecionados, start_date, end_date, n):
                 )
             )
 
-        if not cached_data['weekly_data'].empty:
+        if not dados['weekly_data'].empty:
             try:
+                df_cadastros = dados['df_cadastros']
                 clientes_cpfcnpj = df_cadastros[
-                    df_cadastros['ESTABELECIMENTO NOME1'].isin(clientes_selecionados)
-                ]['ESTABELECIMENTO CPF/CNPJ'].unique()
-
-                filtered_semanas = cached_data['weekly_data'][
-                    (cached_data['weekly_data']['ESTABELECIMENTO CPF/CNPJ'].isin(clientes_cpfcnpj)) &
-                    (cached_data['weekly_data']['MÊS'].notna())
+                    df_cadastros[esquemas.NOME_CADASTRO].isin(clientes_selecionados)
+                ][esquemas.CPF_CADASTRO].unique()
+
+                df_semanas = dados['weekly_data']
+                filtered_semanas = df_semanas[
+                    (df_semanas[esquemas.CPF_CADASTRO].isin(clientes_cpfcnpj)) &
+                    (df_semanas['MÊS'].notna()) &
+                    no_periodo(df_semanas['Início'], df_semanas['Fim'], start_date, end_date)
                 ].copy()
 
                 if not filtered_semanas.empty:
-                    filtered_semanas['SEMANA'] = pd.to_numeric(filtered_semanas['SEMANA'], errors='coerce').fillna(0).astype(int)
                     filtered_semanas['MÊS_SEMANA'] = filtered_semanas['MÊS'] + ' - Semana ' + filtered_semanas['SEMANA'].astype(str)
                     
                     df_agrupado = filtered_semanas.groupby(
-                        ['MÊS_SEMANA', 'ESTABELECIMENTO NOME1', 'MÊS', 'SEMANA']
+                        ['MÊS_SEMANA', esquemas.NOME_CADASTRO, 'MÊS', 'SEMANA']
                     ).agg({'VALOR (R$)': 'sum'}).reset_index()
 
-                    meses_orden = ['Janeiro','Fevereiro','Março','Abril','Maio','Junho',
-                                  'Julho','Agosto','Setembro','Outubro','Novembro','Dezembro']
                     df_agrupado['MÊS'] = pd.Categorical(
                         df_agrupado['MÊS'], 
-                        categories=meses_orden, 
+                        categories=meses_calendario, 
                         ordered=True
                     )
                     df_agrupado = df_agrupado.sort_values(['MÊS', 'SEMANA'])
@@ -475,7 +621,7 @@ def update_analysis(clientes_selecionados, start_date, end_date, n):
                         df_agrupado,
                         x='MÊS_SEMANA',
                         y='VALOR (R$)',
-                        color='ESTABELECIMENTO NOME1',
+                        color=esquemas.NOME_CADASTRO,
                         barmode='group',
                         labels={'VALOR (R$)': 'Faturamento Semanal (R$)'},
                         category_orders={'MÊS_SEMANA': df_agrupado['MÊS_SEMANA'].unique()}
@@ -500,8 +646,10 @@ def update_analysis(clientes_selecionados, start_date, end_date, n):
 
             except Exception as e:
                 print(f"Erro processamento semanal: {str(e)}")
+                raise
 
     except Exception as e:
         print(f"Erro geral na análise: {str(e)}")
+        raise
 
     return fig_mensal, fig_semanal
\ No newline at end of file
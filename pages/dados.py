@@ -4,10 +4,14 @@ import pandas as pd
 import dash_bootstrap_components as dbc
 import uuid
 import os
+import shutil
 import logging
 import openpyxl
 from openpyxl import Workbook
 from pathlib import Path
+import planilhas
+import esquemas
+import exportacoes
 
 register_page(
     __name__,
@@ -30,7 +34,7 @@ def setup_persistent_environment():
         
         if not os.path.exists(EXCEL_PATH):
             wb = Workbook()
-            wb.save(EXCEL_PATH)
+            planilhas.salvar_workbook(wb, EXCEL_PATH)
         
         if not os.access(MOUNT_PATH, os.W_OK):
             logging.error(f"Sem permissão de escrita em: {MOUNT_PATH}")
@@ -43,15 +47,23 @@ def setup_persistent_environment():
 # Executar configuração inicial
 setup_persistent_environment()
 
+# Cópia do stores.xlsx por versão, baixada por /exportar/dados
+exportacoes.registrar_artefato(
+    'dados',
+    EXCEL_PATH,
+    lambda destino: shutil.copyfile(EXCEL_PATH, destino),
+    'stores.xlsx'
+)
+
 # =============================================
 # INICIALIZAÇÃO DO ARQUIVO EXCEL 
 # =============================================
 
-sheet_names = pd.ExcelFile(EXCEL_PATH, engine='openpyxl').sheet_names
+sheet_names = planilhas.abrir_excel(EXCEL_PATH, engine='openpyxl').sheet_names
 
 def initialize_excel():
     if Path(EXCEL_PATH).exists():
-        dfs = pd.read_excel(EXCEL_PATH, sheet_name=None, engine='openpyxl')
+        dfs = planilhas.ler_abas(EXCEL_PATH, engine='openpyxl')
         for sheet in dfs:
             df = dfs[sheet]
             
@@ -67,12 +79,12 @@ def initialize_excel():
             df['temp_id'] = df['temp_id'].astype(str)
         
         # Salvar de volta no Excel
-        with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl', mode='w') as writer:
+        with planilhas.escritor_excel(EXCEL_PATH, engine='openpyxl', mode='w') as writer:
             for sheet_name, df in dfs.items():
                 df.to_excel(writer, sheet_name=sheet_name, index=False)
 
 def load_excel():
-    dfs = pd.read_excel(EXCEL_PATH, sheet_name=None, engine='openpyxl')
+    dfs = planilhas.ler_abas(EXCEL_PATH, engine='openpyxl')
     for sheet in dfs:
         df = dfs[sheet]
         
@@ -94,7 +106,7 @@ def load_excel():
 
 def save_excel(modified_data):
     try:
-        with pd.ExcelWriter(
+        with planilhas.escritor_excel(
             EXCEL_PATH,
             engine='openpyxl',
             mode='w'
@@ -176,6 +188,8 @@ layout = html.Div([
                 dbc.Button(  # Novo botão de exportação
                     "⤵️ Exportar Planilha",
                     id='export-btn',
+                    href=exportacoes.url('dados'),
+                    external_link=True,
                     color="success",
                     className="me-1",
                     style={'margin': '10px'}
@@ -242,7 +256,6 @@ layout = html.Div([
         ], className='table-container animate__animated animate__fadeInUp'),
         
         dcc.Store(id='data-store'),
-        dcc.Download(id="download-dataframe-xlsx"),  # Componente de download
         html.Div(id='dados-output-mensagem', style={'color': 'white', 'padding': '10px'})
     ], className='container-dados')
 ], className='main-container')
@@ -251,14 +264,6 @@ layout = html.Div([
 # CALLBACKS 
 # =============================================
 
-@callback(
-    Output("download-dataframe-xlsx", "data",allow_duplicate=True),
-    Input("export-btn", "n_clicks"),
-    prevent_initial_call=True,
-)
-def export_excel(n_clicks):
-    return dcc.send_file(EXCEL_PATH)
-
 @callback(
     Output('data-store', 'data'),
     Input('sheet-selector', 'value')
@@ -283,7 +288,7 @@ def update_table(data, search_text, selected_representantes, selected_statuses):
     
     # Filtro de busca
     if search_text:
-        df = df[df['ESTABELECIMENTO NOME1'].str.contains(search_text, case=False, na=False)]
+        df = df[df[esquemas.NOME_CADASTRO].str.contains(search_text, case=False, na=False)]
     
     # Filtro de representante
     if selected_representantes and 'REPRESENTANTE NOME1' in df.columns:
@@ -1,5 +1,5 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback, register_page
+from dash import dcc, html, dash_table, Input, Output, State, callback, register_page
 import dash_bootstrap_components as dbc
 import pandas as pd
 from datetime import datetime
@@ -10,6 +10,10 @@ import traceback
 import logging
 import json
 from pathlib import Path
+import importacao
+import planilhas
+import esquemas
+import memoria
 
 
 logging.basicConfig(level=logging.DEBUG)
@@ -23,7 +27,7 @@ def setup_persistent_environment():
         
         if not os.path.exists(EXCEL_PATH):
             wb = Workbook()
-            wb.save(EXCEL_PATH)
+            planilhas.salvar_workbook(wb, EXCEL_PATH)
         
         if not os.access(MOUNT_PATH, os.W_OK):
             logging.error(f"Sem permissão de escrita em: {MOUNT_PATH}")
@@ -300,6 +304,32 @@ layout = dbc.Container([
             ])
         ], style=transaction_style, className="shadow-sm mb-4"),
         
+        # Seção de Importação de Transações em Lote
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("Importação de Transações em Lote", className="form-section-title"),
+                html.Span(
+                    "Arquivo CSV ou Excel com as colunas CPF/CNPJ, DATA e VALOR",
+                    className="text-muted mb-3 d-block"
+                ),
+                dcc.Upload(
+                    id='upload-transacoes',
+                    children=html.Div(["Arraste o arquivo ou ", html.A("clique para selecionar")]),
+                    accept='.csv,.xlsx',
+                    multiple=False,
+                    style={
+                        'width': '100%',
+                        'padding': '20px',
+                        'borderWidth': '1px',
+                        'borderStyle': 'dashed',
+                        'borderRadius': '10px',
+                        'textAlign': 'center'
+                    }
+                ),
+                dcc.Loading(html.Div(id='resultado-importacao', className='mt-3'), type='circle')
+            ])
+        ], style=transaction_style, className="shadow-sm mb-4"),
+        
         # Seção de Faturamento Mensal
         dbc.Card([
             dbc.CardBody([
@@ -356,6 +386,44 @@ layout = dbc.Container([
                     className='mt-2'
                 )
             ])
+        ], style=transaction_style, className="shadow-sm"),
+        
+        # Seção de Faturamento Mensal em Lote
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("Faturamento Mensal em Lote", className="form-section-title"),
+                html.Span(
+                    "Arquivo ou grade colada do Excel com as colunas CPF/CNPJ, MÊS e VALOR",
+                    className="text-muted mb-3 d-block"
+                ),
+                dcc.Upload(
+                    id='upload-faturamento',
+                    children=html.Div(["Arraste o arquivo ou ", html.A("clique para selecionar")]),
+                    accept='.csv,.xlsx',
+                    multiple=False,
+                    style={
+                        'width': '100%',
+                        'padding': '20px',
+                        'borderWidth': '1px',
+                        'borderStyle': 'dashed',
+                        'borderRadius': '10px',
+                        'textAlign': 'center'
+                    }
+                ),
+                dcc.Textarea(
+                    id='grade-faturamento',
+                    placeholder="Ou cole aqui as linhas copiadas do Excel (CPF/CNPJ, MÊS, VALOR)",
+                    style={'width': '100%', 'height': '120px'},
+                    className='mt-3'
+                ),
+                dbc.Button(
+                    "Importar Grade",
+                    id='importar-grade-faturamento',
+                    color="primary",
+                    className='mt-2'
+                ),
+                dcc.Loading(html.Div(id='resultado-faturamento-lote', className='mt-3'), type='circle')
+            ])
         ], style=transaction_style, className="shadow-sm")
         
     ], className="py-5"),
@@ -459,6 +527,34 @@ layout = dbc.Container([
 # =============================================
 # CALLBACKS
 # =============================================
+# Opções de CPF/CNPJ dos três dropdowns: uma leitura da Sheet1 por mtime do
+# stores.xlsx no cache central, compartilhada entre eles
+ESPACO_CLIENTES = 'inputs.clientes'
+
+def opcoes_clientes():
+    mtime = os.path.getmtime(EXCEL_PATH)
+    options = memoria.obter(ESPACO_CLIENTES, mtime)
+    if options is not None:
+        return options
+
+    # Carrega apenas a coluna de CPF/CNPJ
+    df = planilhas.ler_colunas(
+        EXCEL_PATH,
+        'Sheet1',
+        [esquemas.CPF_CADASTRO],
+        texto=[esquemas.CPF_CADASTRO]
+    )
+
+    # Filtra e formata os valores válidos
+    options = [
+        {'label': cnpj, 'value': cnpj} 
+        for cnpj in df[esquemas.CPF_CADASTRO].dropna().unique()
+        if isinstance(cnpj, str) and cnpj.strip() != ''
+    ]
+    # Versões anteriores do arquivo não voltam a ser pedidas
+    memoria.descartar(ESPACO_CLIENTES)
+    return memoria.guardar(ESPACO_CLIENTES, mtime, options)
+
 
 @callback(
     Output('cliente-transacao', 'options'),
@@ -467,19 +563,7 @@ layout = dbc.Container([
 def carregar_clientes(_):
     try:
         if os.path.exists(EXCEL_PATH):  
-            df = pd.read_excel(
-                EXCEL_PATH,  
-                sheet_name='Sheet1',
-                usecols=['ESTABELECIMENTO CPF/CNPJ'], 
-                dtype={'ESTABELECIMENTO CPF/CNPJ': str}
-            )
-            
-            options = [
-                {'label': cnpj, 'value': cnpj} 
-                for cnpj in df['ESTABELECIMENTO CPF/CNPJ'].dropna().unique()
-                if isinstance(cnpj, str) and cnpj.strip() != ''
-            ]
-            return options
+            return opcoes_clientes()
         return []
     except Exception as e:
         logging.error(f"Erro ao carregar clientes: {str(e)}")
@@ -504,7 +588,6 @@ def salvar_transacao(n_clicks, cliente, data_transacao, valor):
         return True, "Preencha todos os campos obrigatórios! ⚠️", "warning"
     
     try:
-        from openpyxl import load_workbook
 
         # Processar dados
         data_transacao = datetime.strptime(data_transacao.split('T')[0], '%Y-%m-%d').strftime('%d/%m/%Y')
@@ -512,17 +595,17 @@ def salvar_transacao(n_clicks, cliente, data_transacao, valor):
 
         # Carregar ou criar arquivo
         if os.path.exists(file_path):
-            wb = load_workbook(file_path)
+            wb = planilhas.carregar_workbook(file_path)
             if 'Transacoes' in wb.sheetnames:
                 ws = wb['Transacoes']
             else:
                 ws = wb.create_sheet('Transacoes')
-                ws.append(['CPF/CNPJ', 'DATA', 'VALOR (R$)', 'STATUS'])
+                ws.append(esquemas.ESQUEMAS['transacoes']['colunas'])
         else:
             wb = Workbook()
             ws = wb.active
             ws.title = 'Transacoes'
-            ws.append(['CPF/CNPJ', 'DATA', 'VALOR (R$)', 'STATUS'])
+            ws.append(esquemas.ESQUEMAS['transacoes']['colunas'])
 
         # Adicionar nova transação
         ws.append([cliente, data_transacao, valor, 'PROCESSADO'])
@@ -532,7 +615,7 @@ def salvar_transacao(n_clicks, cliente, data_transacao, valor):
             wb.create_sheet('Sheet1')
 
         # Salvar alterações
-        wb.save(file_path)
+        planilhas.salvar_workbook(wb, file_path)
 
         return True, f"Transação de R${valor:.2f} registrada com sucesso! ✅", "success"
     
@@ -570,7 +653,6 @@ def salvar_cadastro(n_clicks, data_cadastro, data_aprovacao, nome_estabeleciment
     file_path = EXCEL_PATH
     
     try:
-        from openpyxl import load_workbook
 
         # Processar datas
         def processar_data(date_str):
@@ -588,8 +670,8 @@ def salvar_cadastro(n_clicks, data_cadastro, data_aprovacao, nome_estabeleciment
         novo_registro = {
         'DATA DE CADASTRO': data_cadastro,
         'DATA DE APROVAÇÃO': data_aprovacao,
-        'ESTABELECIMENTO NOME1': nome_estabelecimento or '',
-        'ESTABELECIMENTO CPF/CNPJ': str(cpf_cnpj).strip() if cpf_cnpj else '',
+        esquemas.NOME_CADASTRO: nome_estabelecimento or '',
+        esquemas.CPF_CADASTRO: str(cpf_cnpj).strip() if cpf_cnpj else '',
         'TIPO DE COMÉRCIO': tipo_comercio or 'Outros',  
         'RESPONSÁVEL DO ESTABELECIMENTO': responsavel or '',
         'RESPONSÁVEL E-MAIL': '',  
@@ -623,7 +705,7 @@ def salvar_cadastro(n_clicks, data_cadastro, data_aprovacao, nome_estabeleciment
 
         # Carregar ou criar arquivo
         if os.path.exists(file_path):
-            wb = load_workbook(file_path)
+            wb = planilhas.carregar_workbook(file_path)
             if 'Sheet1' in wb.sheetnames:
                 ws = wb['Sheet1']
                 headers = [cell.value for cell in ws[1]]  # Obter cabeçalhos existentes
@@ -647,7 +729,7 @@ def salvar_cadastro(n_clicks, data_cadastro, data_aprovacao, nome_estabeleciment
         ws.append(row_data)
 
         # Salvar alterações
-        wb.save(file_path)
+        planilhas.salvar_workbook(wb, file_path)
 
         return True, "Cadastro salvo com sucesso! ✔️", "success"
     
@@ -663,20 +745,7 @@ def carregar_clientes_faturamento(_):
     file_path = EXCEL_PATH
     try:
         if os.path.exists(file_path):
-            df = pd.read_excel(
-                file_path, 
-                sheet_name='Sheet1', 
-                usecols=['ESTABELECIMENTO CPF/CNPJ'], 
-                dtype={'ESTABELECIMENTO CPF/CNPJ': str}
-            )
-            
-            options = [
-                {'label': cnpj, 'value': cnpj} 
-                for cnpj in df['ESTABELECIMENTO CPF/CNPJ'].dropna().unique()
-                if isinstance(cnpj, str) and cnpj.strip() != ''
-            ]
-            
-            return options
+            return opcoes_clientes()
         return []
     except Exception as e:
         logging.error(f"Erro ao carregar clientes (faturamento): {str(e)}")
@@ -699,39 +768,46 @@ def salvar_faturamento(n_clicks, cliente, mes, valor):
         return True, "Preencha todos os campos obrigatórios! ⚠️", "warning"
     
     try:
-        from openpyxl import load_workbook
 
         file_path = EXCEL_PATH
-        wb = load_workbook(file_path)
-        ws = wb['Sheet1']
+        cpf_cnpj_col = esquemas.CPF_CADASTRO
+        cpf_cliente = esquemas.identificador(cliente)
+        target_column = f'Faturamento {mes}'
+
+        # Busca em streaming: cabeçalho e linha do cliente sem carregar o workbook
+        # inteiro; sem a coluna do mês no cabeçalho, nenhuma linha é lida
+        header, row_found = planilhas.procurar_linha(
+            file_path, 'Sheet1',
+            lambda registro: esquemas.identificador(registro.get(cpf_cnpj_col)) == cpf_cliente,
+            exigir=[target_column, cpf_cnpj_col]
+        )
         
         # Encontrar coluna do mês
-        target_column = f'Faturamento {mes}'
-        header = [cell.value for cell in ws[1]]
         try:
             col_idx = header.index(target_column) + 1  # Coluna base 1
-        except ValueError:
-            wb.close()
+            cpf_cnpj_idx = header.index(cpf_cnpj_col) + 1
+        except (ValueError, AttributeError):
             return True, f"Coluna '{target_column}' não existe! ❌", "danger"
         
-        # Encontrar linha do cliente
-        cpf_cnpj_col = 'ESTABELECIMENTO CPF/CNPJ'
-        cpf_cnpj_idx = header.index(cpf_cnpj_col) + 1
-        row_found = None
-        
-        for row in ws.iter_rows(min_row=2):
-            current_cpf = str(row[cpf_cnpj_idx - 1].value).strip()
-            if current_cpf == cliente.strip():
-                row_found = row[0].row
-                break
-        
         if not row_found:
-            wb.close()
             return True, "Cliente não encontrado! ❌", "danger"
         
+        wb = planilhas.carregar_workbook(file_path)
+        ws = wb['Sheet1']
+
+        # A planilha pode ter mudado entre a busca e o load: confere a linha antes de gravar
+        if esquemas.identificador(ws.cell(row=row_found, column=cpf_cnpj_idx).value) != cpf_cliente:
+            row_found = next((
+                row[0].row for row in ws.iter_rows(min_row=2)
+                if esquemas.identificador(row[cpf_cnpj_idx - 1].value) == cpf_cliente
+            ), None)
+            if not row_found:
+                wb.close()
+                return True, "Cliente não encontrado! ❌", "danger"
+        
         # Atualizar célula
         ws.cell(row=row_found, column=col_idx, value=valor)
-        wb.save(file_path)
+        planilhas.salvar_workbook(wb, file_path)
         wb.close()
         
         return True, f"Faturamento de R${valor:.2f} salvo para {mes}! ✅", "success"
@@ -749,22 +825,7 @@ def carregar_clientes_semanal(_):
     
     try:
         if os.path.exists(file_path):
-            # Carrega apenas a coluna de CPF/CNPJ
-            df = pd.read_excel(
-                file_path,
-                sheet_name='Sheet1',
-                usecols=['ESTABELECIMENTO CPF/CNPJ'],
-                dtype={'ESTABELECIMENTO CPF/CNPJ': str}
-            )
-            
-            # Filtra e formata os valores válidos
-            options = [
-                {'label': cnpj, 'value': cnpj} 
-                for cnpj in df['ESTABELECIMENTO CPF/CNPJ'].dropna().unique()
-                if isinstance(cnpj, str) and cnpj.strip() != ''
-            ]
-            
-            return options
+            return opcoes_clientes()
         
         return []  # Retorna vazio se arquivo não existir
     
@@ -791,33 +852,35 @@ def salvar_semanal(n_clicks, cliente, mes, semana, valor):
         return True, "Preencha todos os campos obrigatórios! ⚠️", "warning"
     
     try:
-        from openpyxl import load_workbook
         file_path = EXCEL_PATH
         
         # Nome da aba baseado no mês
         sheet_name = f"Faturamento {mes}"
         
+        # Verificar duplicatas em streaming, antes de carregar o workbook inteiro
+        if os.path.exists(file_path):
+            _, duplicada = planilhas.procurar_linha(
+                file_path, sheet_name,
+                lambda registro: (esquemas.identificador(registro.get(esquemas.CPF)) == esquemas.identificador(cliente) and
+                                  registro.get('SEMANA') == semana and
+                                  registro.get('MÊS') == mes)
+            )
+            if duplicada:
+                return True, "Já existe registro para esta semana! ⚠️", "warning"
+
         # Carregar ou criar arquivo
         if os.path.exists(file_path):
-            wb = load_workbook(file_path)
+            wb = planilhas.carregar_workbook(file_path)
             if sheet_name in wb.sheetnames:
                 ws = wb[sheet_name]
             else:
                 ws = wb.create_sheet(sheet_name)
-                ws.append(['CPF/CNPJ', 'MÊS', 'SEMANA', 'VALOR (R$)', 'DATA REGISTRO'])
+                ws.append(esquemas.ESQUEMAS['faturamento_semanal']['colunas'])
         else:
             wb = Workbook()
             ws = wb.active
             ws.title = sheet_name
-            ws.append(['CPF/CNPJ', 'MÊS', 'SEMANA', 'VALOR (R$)', 'DATA REGISTRO'])
-        
-        # Verificar duplicatas
-        for row in ws.iter_rows(min_row=2):
-            if (str(row[0].value) == cliente and 
-                row[2].value == semana and 
-                row[1].value == mes):
-                wb.close()
-                return True, "Já existe registro para esta semana! ⚠️", "warning"
+            ws.append(esquemas.ESQUEMAS['faturamento_semanal']['colunas'])
         
         # Adicionar novo registro
         ws.append([
@@ -828,10 +891,114 @@ def salvar_semanal(n_clicks, cliente, mes, semana, valor):
             datetime.now().strftime('%d/%m/%Y %H:%M')
         ])
         
-        wb.save(file_path)
+        planilhas.salvar_workbook(wb, file_path)
         wb.close()
         return True, f"Semana {semana} de {mes} salva com R${valor:.2f}! ✅", "success"
     
     except Exception as e:
         logging.error(f"Erro: {str(e)}\n{traceback.format_exc()}")
-        return True, f"Erro ao salvar: {str(e)} ❌", "danger"
\ No newline at end of file
+        return True, f"Erro ao salvar: {str(e)} ❌", "danger"
+
+def _tabela_erros(erros):
+    return dash_table.DataTable(
+        columns=[{'name': col, 'id': col} for col in erros.columns],
+        data=erros.to_dict('records'),
+        page_size=10,
+        style_table={'overflowX': 'auto'},
+        style_cell={
+            'textAlign': 'left',
+            'backgroundColor': '#262626',
+            'color': 'white',
+            'border': '1px solid #333333'
+        },
+        style_header={
+            'backgroundColor': '#320c8a',
+            'color': 'white',
+            'fontWeight': 'bold'
+        }
+    )
+
+@callback(
+    Output('resultado-importacao', 'children'),
+    Input('upload-transacoes', 'contents'),
+    State('upload-transacoes', 'filename'),
+    prevent_initial_call=True
+)
+def importar_transacoes(contents, filename):
+    if not contents:
+        return dash.no_update
+
+    try:
+        enviado = importacao.ler_arquivo_enviado(contents, filename)
+
+        with planilhas.abrir_excel(EXCEL_PATH) as excel:
+            clientes_df = planilhas.ler_excel(
+                excel,
+                sheet_name='Sheet1',
+                usecols=[esquemas.CPF_CADASTRO],
+                dtype={esquemas.CPF_CADASTRO: str}
+            )
+            transacoes_df = planilhas.ler_excel(
+                excel,
+                sheet_name='Transacoes',
+                dtype={esquemas.CPF: str}
+            ) if 'Transacoes' in excel.sheet_names else pd.DataFrame(columns=importacao.COLUNAS_TRANSACOES)
+
+        validas, erros = importacao.validar_transacoes(enviado, clientes_df, transacoes_df)
+
+        if not validas.empty:
+            importacao.gravar_transacoes(EXCEL_PATH, validas)
+
+        resumo = dbc.Alert(
+            f"{len(validas)} transações importadas, {len(erros)} linhas rejeitadas ({filename})",
+            color="success" if erros.empty else "warning"
+        )
+        if erros.empty:
+            return resumo
+
+        return html.Div([resumo, _tabela_erros(erros)])
+
+    except Exception as e:
+        logging.error(f"Erro na importação: {str(e)}\n{traceback.format_exc()}")
+        return dbc.Alert(f"Erro ao importar: {str(e)} ❌", color="danger")
+
+@callback(
+    Output('resultado-faturamento-lote', 'children'),
+    Input('upload-faturamento', 'contents'),
+    Input('importar-grade-faturamento', 'n_clicks'),
+    State('upload-faturamento', 'filename'),
+    State('grade-faturamento', 'value'),
+    prevent_initial_call=True
+)
+def importar_faturamento_lote(contents, n_clicks, filename, grade):
+    try:
+        if dash.ctx.triggered_id == 'upload-faturamento':
+            if not contents:
+                return dash.no_update
+            enviado = importacao.ler_arquivo_enviado(contents, filename)
+            origem = filename
+        else:
+            if not grade or not grade.strip():
+                return dbc.Alert("Cole as linhas do faturamento antes de importar! ⚠️", color="warning")
+            enviado = importacao.ler_grade_colada(grade)
+            origem = 'grade colada'
+
+        atualizacoes, erros, nao_encontrados = importacao.importar_faturamento(EXCEL_PATH, enviado)
+
+        conteudo = [dbc.Alert(
+            f"{len(atualizacoes)} faturamentos gravados, {len(erros)} linhas rejeitadas, "
+            f"{len(nao_encontrados)} CPFs não encontrados ({origem})",
+            color="success" if erros.empty and not nao_encontrados else "warning"
+        )]
+        if nao_encontrados:
+            conteudo.append(html.Div([
+                html.Strong("CPFs/CNPJs não encontrados na planilha:"),
+                html.Ul([html.Li(cpf) for cpf in nao_encontrados])
+            ]))
+        if not erros.empty:
+            conteudo.append(_tabela_erros(erros))
+        return html.Div(conteudo)
+
+    except Exception as e:
+        logging.error(f"Erro no faturamento em lote: {str(e)}\n{traceback.format_exc()}")
+        return dbc.Alert(f"Erro ao importar: {str(e)} ❌", color="danger")
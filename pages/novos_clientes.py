@@ -1,5 +1,5 @@
 import dash
-from dash import html, dcc, Input, Output, State, register_page, callback
+from dash import html, dcc, Input, Output, State, register_page, callback, clientside_callback, ctx
 import dash_bootstrap_components as dbc
 import pandas as pd
 import json
@@ -12,7 +12,10 @@ import os
 import openpyxl
 import logging
 from openpyxl import Workbook
-import re
+import threading
+import planilhas
+import memoria
+import esquemas
 
 
 register_page(
@@ -45,7 +48,7 @@ def setup_persistent_environment():
         
         if not os.path.exists(EXCEL_PATH):
             wb = Workbook()
-            wb.save(EXCEL_PATH)
+            planilhas.salvar_workbook(wb, EXCEL_PATH)
         
         if not os.access(MOUNT_PATH, os.W_OK):
             logging.error(f"Sem permissão de escrita em: {MOUNT_PATH}")
@@ -60,15 +63,108 @@ setup_persistent_environment()
 # =====================================
 # FUNÇÕES DE PROCESSAMENTO DE DADOS
 # =====================================
+# Colunas da aba 30_days_analysis: as transações ficam na aba Transacoes
+# e aqui só são mantidas a soma e a contagem por cliente
+COLUNAS_ANALISE = ['cpf_cnpj', 'data_cadastro', 'frequencia', 'soma_valores', 'qtd_transacoes', 'media_valores']
+
+def _ler_transacoes_legadas(valor):
+    try:
+        transacoes = json.loads(valor) if isinstance(valor, str) else {}
+        return {k: float(v) for k, v in transacoes.items()}
+    except (ValueError, TypeError, AttributeError):
+        return {}
+
+def normalizar_analise(analysis_df):
+    """Converte o formato antigo (JSON na coluna 'transacoes') em soma e contagem por cliente"""
+    if 'transacoes' in analysis_df.columns:
+        legado = analysis_df['transacoes'].apply(_ler_transacoes_legadas)
+        if 'soma_valores' not in analysis_df.columns:
+            analysis_df['soma_valores'] = legado.apply(lambda t: round(sum(t.values()), 2))
+        if 'qtd_transacoes' not in analysis_df.columns:
+            analysis_df['qtd_transacoes'] = legado.apply(len)
+        analysis_df = analysis_df.drop(columns=['transacoes'])
+
+    for col in COLUNAS_ANALISE:
+        if col not in analysis_df.columns:
+            analysis_df[col] = 0 if col in ('soma_valores', 'qtd_transacoes', 'media_valores') else None
+
+    analysis_df['soma_valores'] = pd.to_numeric(analysis_df['soma_valores'], errors='coerce').fillna(0.0)
+    analysis_df['qtd_transacoes'] = pd.to_numeric(analysis_df['qtd_transacoes'], errors='coerce').fillna(0).astype(int)
+    extras = [col for col in analysis_df.columns if col not in COLUNAS_ANALISE]
+    return analysis_df[COLUNAS_ANALISE + extras]
+
+def _analise_no_formato_atual(colunas):
+    return 'transacoes' not in colunas and all(col in colunas for col in COLUNAS_ANALISE)
+
+def _valor_celula(valor):
+    return None if not isinstance(valor, (list, dict)) and pd.isna(valor) else valor
+
+def gravar_abas_alteradas(alteradas):
+    """Persiste apenas as abas marcadas como alteradas.
+
+    `alteradas` mapeia o nome da aba para as operações pendentes:
+    'substituir' (DataFrame com o conteúdo completo), 'anexar' (lista de
+    dicionários), 'atualizar' ({cpf: {coluna: valor}}) e 'remover'
+    (lista de CPFs). Só as abas do dicionário são alteradas célula a célula;
+    as outras não passam por DataFrame. O .xlsx não tem anexação no lugar:
+    o salvar_workbook ainda serializa o arquivo inteiro, todas as abas.
+    """
+
+    wb = planilhas.carregar_workbook(EXCEL_PATH)
+    try:
+        for aba, operacoes in alteradas.items():
+            if 'substituir' in operacoes:
+                conteudo = operacoes['substituir']
+                if aba in wb.sheetnames:
+                    wb[aba].delete_rows(1, wb[aba].max_row)
+                    ws = wb[aba]
+                else:
+                    ws = wb.create_sheet(aba)
+                ws.append(list(conteudo.columns))
+                for linha in conteudo.itertuples(index=False):
+                    ws.append([_valor_celula(valor) for valor in linha])
+            elif aba in wb.sheetnames:
+                ws = wb[aba]
+            elif operacoes.get('anexar'):
+                ws = wb.create_sheet(aba)
+                ws.append(list(operacoes['anexar'][0].keys()))
+            else:
+                # Aba inexistente só com 'atualizar'/'remover': não há linha para mexer
+                continue
+
+            header = [cell.value for cell in ws[1]]
+            col_cpf = next((i for i, col in enumerate(header) if col in ('cpf_cnpj', esquemas.CPF)), 0)
+
+            atualizar = operacoes.get('atualizar', {})
+            remover = set(operacoes.get('remover', []))
+            if atualizar or remover:
+                for row in reversed(list(ws.iter_rows(min_row=2))):
+                    cpf = esquemas.identificador(row[col_cpf].value)
+                    if cpf in remover:
+                        ws.delete_rows(row[0].row)
+                    elif cpf in atualizar:
+                        for coluna, valor in atualizar[cpf].items():
+                            ws.cell(row=row[0].row, column=header.index(coluna) + 1, value=valor)
+
+            for registro in operacoes.get('anexar', []):
+                ws.append([_valor_celula(registro.get(col)) for col in header])
+                ws.cell(row=ws.max_row, column=col_cpf + 1).number_format = '@'
+
+        planilhas.salvar_workbook(wb, EXCEL_PATH)
+    finally:
+        wb.close()
+
 def register_new_client(cpf_cnpj, frequencia):
     try:
-        with pd.ExcelFile(EXCEL_PATH) as excel:
-            analysis_df = pd.read_excel(excel, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
-            clientes_df = pd.read_excel(excel, sheet_name='Sheet1', dtype={'ESTABELECIMENTO CPF/CNPJ': str})
+        with planilhas.abrir_excel(EXCEL_PATH) as excel:
+            analysis_df = planilhas.ler_excel(excel, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
+            clientes_df = planilhas.ler_excel(excel, sheet_name='Sheet1', dtype={esquemas.CPF_CADASTRO: str})
 
-        cpf_cnpj = re.sub(r'\D', '', str(cpf_cnpj))
+        formato_atual = _analise_no_formato_atual(analysis_df.columns)
+        analysis_df = normalizar_analise(analysis_df)
+        cpf_cnpj = esquemas.identificador(cpf_cnpj)
         client = clientes_df[
-            clientes_df['ESTABELECIMENTO CPF/CNPJ'].astype(str).str.replace(r'\D', '', regex=True) == cpf_cnpj
+            esquemas.identificadores(clientes_df[esquemas.CPF_CADASTRO]) == cpf_cnpj
         ].iloc[0]
         
         data_cadastro = pd.to_datetime(client['DATA DE CADASTRO']).date()
@@ -76,26 +172,17 @@ def register_new_client(cpf_cnpj, frequencia):
         novo_registro = {
             'cpf_cnpj': cpf_cnpj,
             'data_cadastro': data_cadastro,
-            'transacoes': json.dumps({}),
             'frequencia': frequencia,
+            'soma_valores': 0.0,
+            'qtd_transacoes': 0,
             'media_valores': 0.0
         }
         
-        analysis_df = pd.concat([analysis_df, pd.DataFrame([novo_registro])], ignore_index=True)
-        
-        with pd.ExcelWriter(
-            EXCEL_PATH,
-            engine='openpyxl',
-            mode='a',
-            if_sheet_exists='replace'
-        ) as writer:
-            analysis_df.to_excel(writer, sheet_name='30_days_analysis', index=False)
-            
-            # Formatar coluna 'cpf_cnpj' como texto
-            workbook = writer.book
-            worksheet = workbook['30_days_analysis']
-            for cell in worksheet['A']:
-                cell.number_format = '@'
+        if formato_atual:
+            gravar_abas_alteradas({'30_days_analysis': {'anexar': [novo_registro]}})
+        else:
+            analysis_df = pd.concat([analysis_df, pd.DataFrame([novo_registro])], ignore_index=True)
+            gravar_abas_alteradas({'30_days_analysis': {'substituir': analysis_df}})
         
         return True
     except Exception as e:
@@ -104,58 +191,63 @@ def register_new_client(cpf_cnpj, frequencia):
 
 def register_transaction(cpf_cnpj, valor, frequencia):
     try:
-        with pd.ExcelFile(EXCEL_PATH) as excel:
-            analysis_df = pd.read_excel(excel, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
-            clientes_df = pd.read_excel(excel, sheet_name='Sheet1', dtype={'ESTABELECIMENTO CPF/CNPJ': str})
-            transacoes_df = pd.read_excel(excel, sheet_name='Transacoes') if 'Transacoes' in excel.sheet_names else pd.DataFrame()
-
-        cpf_cnpj = re.sub(r'\D', '', str(cpf_cnpj))  # Normalização
-        clientes_df['ESTABELECIMENTO CPF/CNPJ'] = clientes_df['ESTABELECIMENTO CPF/CNPJ'].str.replace(r'\D', '', regex=True)
+        with planilhas.abrir_excel(EXCEL_PATH) as excel:
+            analysis_df = planilhas.ler_excel(excel, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
+            clientes_df = planilhas.ler_excel(excel, sheet_name='Sheet1', dtype={esquemas.CPF_CADASTRO: str})
+
+        formato_atual = _analise_no_formato_atual(analysis_df.columns)
+        analysis_df = normalizar_analise(analysis_df)
+        cpf_cnpj = esquemas.identificador(cpf_cnpj)  # Normalização
+        # Normalização só para a busca: a aba Sheet1 não é regravada daqui
+        cpfs_clientes = esquemas.identificadores(clientes_df[esquemas.CPF_CADASTRO])
         
-        cliente = clientes_df[clientes_df['ESTABELECIMENTO CPF/CNPJ'] == cpf_cnpj].iloc[0]
+        cliente = clientes_df[cpfs_clientes == cpf_cnpj].iloc[0]
         today = datetime.now(timezone.utc).date()
         data_cadastro = pd.to_datetime(cliente['DATA DE CADASTRO']).date()
 
+        # Abas alteradas por esta transação
+        alteradas = {}
+
         if cpf_cnpj not in analysis_df['cpf_cnpj'].values:
-            novo_registro = pd.DataFrame([{
+            media = round(float(valor), 2)
+            novo_registro = {
                 'cpf_cnpj': cpf_cnpj,
                 'data_cadastro': data_cadastro,
-                'transacoes': json.dumps({str(today): float(valor)}),
                 'frequencia': frequencia,
-                'media_valores': float(valor)
-            }])
-            analysis_df = pd.concat([analysis_df, novo_registro], ignore_index=True)
+                'soma_valores': float(valor),
+                'qtd_transacoes': 1,
+                'media_valores': media
+            }
+            analysis_df = pd.concat([analysis_df, pd.DataFrame([novo_registro])], ignore_index=True)
+            alteradas['30_days_analysis'] = {'anexar': [novo_registro]}
         else:
+            # Média incremental: só a soma e a contagem do cliente são atualizadas
             row_index = analysis_df[analysis_df['cpf_cnpj'] == cpf_cnpj].index[0]
-            transacoes = json.loads(analysis_df.at[row_index, 'transacoes'])
-            transacoes[str(today)] = float(valor)
-            
-            media = sum(transacoes.values()) / len(transacoes) if transacoes else 0
-            media = round(media, 2)
-            
-            analysis_df.at[row_index, 'transacoes'] = json.dumps(transacoes)
+            soma = float(analysis_df.at[row_index, 'soma_valores']) + float(valor)
+            qtd = int(analysis_df.at[row_index, 'qtd_transacoes']) + 1
+            media = round(soma / qtd, 2)
+
+            analysis_df.at[row_index, 'soma_valores'] = round(soma, 2)
+            analysis_df.at[row_index, 'qtd_transacoes'] = qtd
             analysis_df.at[row_index, 'media_valores'] = media
+            alteradas['30_days_analysis'] = {'atualizar': {
+                cpf_cnpj: {'soma_valores': round(soma, 2), 'qtd_transacoes': qtd, 'media_valores': media}
+            }}
 
-        nova_transacao = {
-            'CPF/CNPJ': cpf_cnpj,
+        # Aba no formato antigo: converte uma única vez regravando a análise inteira
+        if not formato_atual:
+            alteradas['30_days_analysis'] = {'substituir': analysis_df}
+
+        alteradas['Transacoes'] = {'anexar': [{
+            esquemas.CPF: cpf_cnpj,
             'DATA': today.strftime('%d/%m/%Y'),
             'VALOR (R$)': float(valor),
             'STATUS': 'PROCESSADO'
-        }
-
-        transacoes_df = pd.concat([transacoes_df, pd.DataFrame([nova_transacao])])
+        }]}
 
-        with pd.ExcelWriter(
-            EXCEL_PATH,
-            engine='openpyxl',
-            mode='a',
-            if_sheet_exists='replace'
-        ) as writer:
-            analysis_df.to_excel(writer, sheet_name='30_days_analysis', index=False)
-            transacoes_df.to_excel(writer, sheet_name='Transacoes', index=False)
-            clientes_df.to_excel(writer, sheet_name='Sheet1', index=False)
+        gravar_abas_alteradas(alteradas)
 
-        return True, f"✅ Transação registrada para {cliente['ESTABELECIMENTO NOME1']}", media
+        return True, f"✅ Transação registrada para {cliente[esquemas.NOME_CADASTRO]}", media
 
     except Exception as e:
         logging.error(f"Erro detalhado: {str(e)}")
@@ -163,12 +255,13 @@ def register_transaction(cpf_cnpj, valor, frequencia):
 
 def load_analysis_data():
     try:
-        df = pd.read_excel(
+        df = planilhas.ler_excel(
             EXCEL_PATH,
             sheet_name='30_days_analysis',
             dtype={'cpf_cnpj': str},
             parse_dates=['data_cadastro']
         )
+        df = normalizar_analise(df)
         
         df['data_cadastro'] = pd.to_datetime(df['data_cadastro']).dt.tz_localize(None)
         today = pd.Timestamp.now().normalize()
@@ -185,6 +278,7 @@ def load_analysis_data():
 layout = html.Div(
     [
         dcc.Store(id='clientes-store', storage_type='memory'),
+        dcc.Store(id='clientes-registrados-store', storage_type='memory'),
         html.Div(
             [
                 html.Div(
@@ -249,11 +343,26 @@ layout = html.Div(
                             [
                                 dbc.CardHeader("Linha do Tempo de Transações", className='card-header'),
                                 dbc.CardBody(
-                                    dcc.Graph(
-                                        id='grafico-transacoes',
-                                        config={'displayModeBar': False},
-                                        style={'height': '400px'}
-                                    )
+                                    [
+                                        dcc.RadioItems(
+                                            id='agrupamento-transacoes',
+                                            options=[
+                                                {'label': 'Automático', 'value': 'auto'},
+                                                {'label': 'Dia', 'value': 'dia'},
+                                                {'label': 'Semana', 'value': 'semana'},
+                                                {'label': 'Mês', 'value': 'mes'}
+                                            ],
+                                            value='auto',
+                                            inline=True,
+                                            inputStyle={'marginRight': '4px'},
+                                            labelStyle={'marginRight': '16px'}
+                                        ),
+                                        dcc.Graph(
+                                            id='grafico-transacoes',
+                                            config={'displayModeBar': False},
+                                            style={'height': '400px'}
+                                        )
+                                    ]
                                 )
                             ],
                             className='mb-4',
@@ -295,40 +404,60 @@ layout = html.Div(
 # CALLBACKS 
 # =====================================
 
-# Callback para estilo do dropdown de cliente
-@callback(
+# Estados puramente visuais ficam no navegador: estilos dos dropdowns e
+# habilitação dos botões a partir do conjunto de clientes registrados,
+# enviado uma vez em 'clientes-registrados-store'
+clientside_callback(
+    """
+    function(value) {
+        return value ? {'border': '2px solid #2ecc71'} : {'border': '1px solid #ffffff'};
+    }
+    """,
     Output('cliente-select', 'style'),
     Input('cliente-select', 'value')
 )
-def update_cliente_style(value):
-    return {'border': '2px solid #2ecc71'} if value else {'border': '1px solid #ffffff'}
 
-# Callback para estilo do dropdown de frequência
-@callback(
+clientside_callback(
+    """
+    function(value) {
+        return value ? {'border': '2px solid #2ecc71'} : {'border': '1px solid #ffffff'};
+    }
+    """,
     Output('frequencia-select', 'style'),
     Input('frequencia-select', 'value')
 )
-def update_freq_style(value):
-    return {'border': '2px solid #2ecc71'} if value else {'border': '1px solid #ffffff'}
 
-
-@callback(
+clientside_callback(
+    """
+    function(selected, registrados) {
+        if (!selected || !registrados) {
+            return [true, true];
+        }
+        var cpf = String(selected).replace(/\\D/g, '');
+        var ativo = (registrados.ativos || []).indexOf(cpf) !== -1;
+        var registrado = (registrados.todos || []).indexOf(cpf) !== -1;
+        return [ativo, !registrado];
+    }
+    """,
+    Output('registrar-cliente-btn', 'disabled'),
     Output('remover-cliente-btn', 'disabled'),
-    Input('cliente-select', 'value')
+    Input('cliente-select', 'value'),
+    Input('clientes-registrados-store', 'data')
 )
-def toggle_remove_button(selected_client):
-    if not selected_client:
-        return True
-    try:
-        df = pd.read_excel(EXCEL_PATH, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
-        df['cpf_cnpj'] = df['cpf_cnpj'].apply(lambda x: re.sub(r'\D', '', str(x)))
-        return re.sub(r'\D', '', str(selected_client)) not in df['cpf_cnpj'].values
-    except:
-        return True
+
+def _clientes_registrados(analysis_df):
+    """Conjunto de CPFs da aba 30_days_analysis enviado ao navegador"""
+    datas = pd.to_datetime(analysis_df['data_cadastro'], errors='coerce')
+    dias_cadastro = (pd.Timestamp.now().normalize() - datas).dt.days
+    return {
+        'todos': analysis_df['cpf_cnpj'].dropna().unique().tolist(),
+        'ativos': analysis_df.loc[dias_cadastro <= 30, 'cpf_cnpj'].dropna().unique().tolist()
+    }
 
 @callback(
     Output('analise-output-mensagem', 'children', allow_duplicate=True),
     Output('cliente-select', 'options', allow_duplicate=True),
+    Output('clientes-registrados-store', 'data', allow_duplicate=True),
     Input('remover-cliente-btn', 'n_clicks'),
     State('cliente-select', 'value'),
     prevent_initial_call=True
@@ -336,23 +465,27 @@ def toggle_remove_button(selected_client):
 def handle_client_removal(n_clicks, cpf_cnpj):
     if n_clicks and cpf_cnpj:
         try:
-            cpf_cnpj = re.sub(r'\D', '', str(cpf_cnpj))
-            df = pd.read_excel(EXCEL_PATH, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
-            df['cpf_cnpj'] = df['cpf_cnpj'].apply(lambda x: re.sub(r'\D', '', str(x)))
+            cpf_cnpj = esquemas.identificador(cpf_cnpj)
+            df = planilhas.ler_excel(EXCEL_PATH, sheet_name='30_days_analysis', dtype={'cpf_cnpj': str})
+            formato_atual = _analise_no_formato_atual(df.columns)
+            df = normalizar_analise(df)
+            df['cpf_cnpj'] = esquemas.identificadores(df['cpf_cnpj'])
             df = df[df['cpf_cnpj'] != cpf_cnpj]
             
-            with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                df.to_excel(writer, sheet_name='30_days_analysis', index=False)
+            if formato_atual:
+                gravar_abas_alteradas({'30_days_analysis': {'remover': [cpf_cnpj]}})
+            else:
+                gravar_abas_alteradas({'30_days_analysis': {'substituir': df}})
             
-            clientes_df = pd.read_excel(EXCEL_PATH, sheet_name='Sheet1', dtype={'ESTABELECIMENTO CPF/CNPJ': str})
-            clientes_df['ESTABELECIMENTO CPF/CNPJ'] = clientes_df['ESTABELECIMENTO CPF/CNPJ'].apply(lambda x: re.sub(r'\D', '', str(x)))
+            clientes_df = planilhas.ler_excel(EXCEL_PATH, sheet_name='Sheet1', dtype={esquemas.CPF_CADASTRO: str})
+            clientes_df[esquemas.CPF_CADASTRO] = esquemas.identificadores(clientes_df[esquemas.CPF_CADASTRO])
             
             options = []
             for _, row in clientes_df.iterrows():
-                current_cpf = re.sub(r'\D', '', str(row['ESTABELECIMENTO CPF/CNPJ']))
+                current_cpf = esquemas.identificador(row[esquemas.CPF_CADASTRO])
                 exists = current_cpf in df['cpf_cnpj'].values
                 options.append({
-                    'label': f"{row['ESTABELECIMENTO NOME1']} {'✅' if exists else '🆕'} - {current_cpf}",
+                    'label': f"{row[esquemas.NOME_CADASTRO]} {'✅' if exists else '🆕'} - {current_cpf}",
                     'value': current_cpf
                 })
             
@@ -362,177 +495,257 @@ def handle_client_removal(n_clicks, cpf_cnpj):
                     html.Br(),
                     html.Small("Atualização concluída", style={'color': COLORS['highlight']})
                 ]),
-                options
+                options,
+                _clientes_registrados(df)
             )
         except Exception as e:
             logging.error(f"Erro na remoção: {str(e)}")
             return (
                 html.Span(f"❌ Erro: {str(e)}", style={'color': COLORS['danger']}),
+                dash.no_update,
                 dash.no_update
             )
     return PreventUpdate()
 
 @callback(
     Output('cliente-select', 'options'),
+    Output('clientes-registrados-store', 'data'),
     Input('clientes-store', 'data')
 )
 def update_dropdown(_):
     try:
         # Carrega e filtra dados
-        clientes_df = pd.read_excel(
+        clientes_df = planilhas.ler_colunas(
             EXCEL_PATH,
-            sheet_name='Sheet1',
-            usecols=['ESTABELECIMENTO NOME1', 'ESTABELECIMENTO CPF/CNPJ'],
-            dtype={'ESTABELECIMENTO CPF/CNPJ': str}
-        ).dropna(subset=['ESTABELECIMENTO CPF/CNPJ'])  
+            'Sheet1',
+            [esquemas.NOME_CADASTRO, esquemas.CPF_CADASTRO],
+            texto=[esquemas.CPF_CADASTRO]
+        ).dropna(subset=[esquemas.CPF_CADASTRO])  
 
-        analysis_df = pd.read_excel(
+        analysis_df = planilhas.ler_excel(
             EXCEL_PATH,
             sheet_name='30_days_analysis',
             dtype={'cpf_cnpj': str}
         ).dropna(subset=['cpf_cnpj'])  # Remove CPFs inválidos
 
         # Normalização rigorosa
-        clientes_df['ESTABELECIMENTO CPF/CNPJ'] = (
-            clientes_df['ESTABELECIMENTO CPF/CNPJ']
-            .astype(str)
-            .str.replace(r'\D', '', regex=True)
-        )
-        analysis_df['cpf_cnpj'] = (
-            analysis_df['cpf_cnpj']
-            .astype(str)
-            .str.replace(r'\D', '', regex=True)
-        )
+        clientes_df[esquemas.CPF_CADASTRO] = esquemas.identificadores(clientes_df[esquemas.CPF_CADASTRO])
+        analysis_df['cpf_cnpj'] = esquemas.identificadores(analysis_df['cpf_cnpj'])
 
         # Remove CPFs vazios ou inválidos
         clientes_df = clientes_df[
-            clientes_df['ESTABELECIMENTO CPF/CNPJ'].str.strip().astype(bool)
+            clientes_df[esquemas.CPF_CADASTRO].str.strip().astype(bool)
         ]
 
         # Gera opções válidas
         options = []
         for _, row in clientes_df.iterrows():
-            cpf = row['ESTABELECIMENTO CPF/CNPJ'].strip()
+            cpf = row[esquemas.CPF_CADASTRO].strip()
             if not cpf:  # Ignora CPFs vazios
                 continue
                 
             exists = cpf in analysis_df['cpf_cnpj'].values
             options.append({
-                'label': f"{row['ESTABELECIMENTO NOME1']} {'✅' if exists else '🆕'} - {cpf}",
+                'label': f"{row[esquemas.NOME_CADASTRO]} {'✅' if exists else '🆕'} - {cpf}",
                 'value': cpf
             })
 
-        return options
+        return options, _clientes_registrados(analysis_df)
 
     except Exception as e:
         logging.error(f"Erro no dropdown: {str(e)}")
-        return []
+        return [], {'todos': [], 'ativos': []}
+
 
+# =====================================
+# SÉRIES DE TRANSAÇÕES POR CLIENTE
+# =====================================
+# Soma e contagem diárias de cada cliente indexadas por data, montadas uma vez
+# por versão do stores.xlsx; o gráfico agrega em baldes a partir delas
+MAX_BARRAS = int(os.environ.get('TRANSACOES_MAX_BARRAS', '90'))
+
+# Regra do resample e duração aproximada em dias de cada balde
+AGRUPAMENTOS = {
+    'dia': ('D', 1),
+    'semana': ('W-MON', 7),
+    'mes': ('MS', 30.44)
+}
+NOMES_AGRUPAMENTO = {'dia': 'dia', 'semana': 'semana', 'mes': 'mês'}
+
+# Uma entrada por mtime do stores.xlsx (e dia, pela janela de 30 dias da
+# análise) no cache central; o lock evita duas montagens simultâneas da mesma versão
+ESPACO_SERIES = 'novos_clientes.transacoes'
+_series_lock = threading.Lock()
+_SERIE_VAZIA = pd.DataFrame(
+    {'soma': pd.Series(dtype=float), 'qtd': pd.Series(dtype=int)},
+    index=pd.DatetimeIndex([], name='DATA')
+)
 
+def _montar_series():
+    # CPF só com dígitos, valor numérico e data dd/mm/aaaa convertidos pelo esquema
+    transacoes_df = esquemas.normalizar(
+        planilhas.ler_excel(EXCEL_PATH, sheet_name='Transacoes', dtype={esquemas.CPF: str}),
+        'transacoes'
+    )
+
+    # Média do cliente conta todas as transações, até as sem data válida
+    totais = transacoes_df.groupby(esquemas.CPF)['VALOR (R$)'].agg(['sum', 'count'])
+
+    diario = (
+        transacoes_df.dropna(subset=['DATA'])
+        .groupby([esquemas.CPF, 'DATA'])['VALOR (R$)']
+        .agg(soma='sum', qtd='count')
+    )
+
+    # Frequência de cada cliente da análise de 30 dias
+    analysis_df = load_analysis_data()
+    frequencias = (
+        analysis_df.drop_duplicates('cpf_cnpj').set_index('cpf_cnpj')['frequencia']
+        if not analysis_df.empty else pd.Series(dtype=object)
+    )
+    return {'diario': diario.sort_index(), 'totais': totais, 'frequencias': frequencias}
+
+def _series_atuais():
+    chave = (os.path.getmtime(EXCEL_PATH), datetime.now().date())
+    with _series_lock:
+        series = memoria.obter(ESPACO_SERIES, chave)
+        if series is None:
+            # Versões anteriores do arquivo não voltam a ser pedidas
+            memoria.descartar(ESPACO_SERIES)
+            series = memoria.guardar(ESPACO_SERIES, chave, _montar_series())
+    return series
+
+def frequencia_cliente(cpf):
+    """Frequência do cliente na análise de 30 dias, ou None se ele não estiver nela"""
+    return _series_atuais()['frequencias'].get(cpf)
+
+def serie_transacoes(cpf):
+    """(série diária indexada por data, (soma, quantidade)) das transações do cliente"""
+    totais = _series_atuais()['totais']
+    if cpf not in totais.index:
+        return _SERIE_VAZIA, (0.0, 0)
+    try:
+        serie = _series_atuais()['diario'].xs(cpf, level=0)
+    except KeyError:
+        # Cliente só com transações sem data válida
+        serie = _SERIE_VAZIA
+    return serie, (totais.at[cpf, 'sum'], totais.at[cpf, 'count'])
+
+def escolher_agrupamento(inicio, fim, escolha='auto'):
+    """Menor balde que mantém o intervalo visível em até MAX_BARRAS barras"""
+    if escolha in AGRUPAMENTOS:
+        return escolha
+    dias = (fim - inicio).days + 1
+    for nome, (_, duracao) in AGRUPAMENTOS.items():
+        if dias / duracao <= MAX_BARRAS:
+            return nome
+    return 'mes'
+
+def intervalo_visivel(relayout):
+    """(início, fim) do zoom do gráfico, ou None quando o eixo está no automático"""
+    if not relayout or relayout.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout:
+        inicio, fim = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    elif 'xaxis.range' in relayout:
+        inicio, fim = relayout['xaxis.range']
+    else:
+        return None
+    return pd.Timestamp(inicio), pd.Timestamp(fim)
+
+def _grafico_transacoes(diario, agrupamento='auto', visivel=None):
+    fig = go.Figure()
+    titulo = 'Histórico de Transações'
+
+    if not diario.empty:
+        inicio, fim = visivel or (diario.index.min(), diario.index.max())
+        nome = escolher_agrupamento(inicio, fim, agrupamento)
+        regra = AGRUPAMENTOS[nome][0]
+
+        # Pega um balde inteiro antes do início para a primeira barra não sair parcial
+        recorte = diario.loc[inicio - pd.Timedelta(days=AGRUPAMENTOS[nome][1]):fim]
+        baldes = recorte.resample(regra, label='left', closed='left').sum()
+        baldes = baldes[baldes['qtd'] > 0]
+
+        fig.add_trace(go.Bar(
+            x=baldes.index,
+            y=baldes['soma'],
+            customdata=baldes['qtd'],
+            marker_color=COLORS['primary'],
+            name='Transações',
+            hovertemplate='R$ %{y:.2f} em %{customdata} transações<extra></extra>'
+        ))
+        titulo = f'Histórico de Transações (por {NOMES_AGRUPAMENTO[nome]})'
+        if visivel:
+            fig.update_xaxes(range=[inicio, fim])
+
+    fig.update_layout(
+        title=titulo,
+        title_x=0.5,
+        xaxis_title='Data',
+        yaxis_title='Valor (R$)',
+        plot_bgcolor=COLORS['plot_bg'],
+        paper_bgcolor=COLORS['card'],
+        font=dict(color=COLORS['text']),
+        margin=dict(l=40, r=40, t=60, b=40),
+        xaxis=dict(type='date'),
+        hovermode='x unified'
+    )
+    
+    return fig
+
+# Trocar de cliente refaz gráfico e métricas numa ida só ao servidor; agrupamento
+# e zoom só refazem o gráfico, a partir das séries em cache
 @callback(
+    Output('grafico-transacoes', 'figure'),
     Output('media-valores', 'children'),
     Output('frequencia-select', 'value'),
     Input('cliente-select', 'value'),
+    Input('agrupamento-transacoes', 'value'),
+    Input('grafico-transacoes', 'relayoutData'),
     prevent_initial_call=True
 )
-def update_metrics(selected_client):
-    try:
-        if not selected_client:
+def update_cliente_selecionado(selected_client, agrupamento, relayout):
+    if not selected_client:
+        raise PreventUpdate
+
+    selected_client = esquemas.identificador(selected_client)
+    troca_cliente = ctx.triggered_id == 'cliente-select'
+
+    visivel = None
+    if not troca_cliente:
+        visivel = intervalo_visivel(relayout)
+        # Eventos que não mexem no eixo x (autosize, zoom só no y) não refazem o gráfico
+        if ctx.triggered_id == 'grafico-transacoes' and visivel is None and not (relayout or {}).get('xaxis.autorange'):
             raise PreventUpdate
-        
-        # Carrega dados da análise para frequência
-        analysis_df = load_analysis_data()
-        selected_client = re.sub(r'\D', '', str(selected_client))
-        client_data = analysis_df[analysis_df['cpf_cnpj'] == selected_client]
-        
-        if client_data.empty:
-            return "N/A", None
-        
-        # Busca transações reais na aba Transacoes
-        transacoes_df = pd.read_excel(
-            EXCEL_PATH,
-            sheet_name='Transacoes',
-            dtype={'CPF/CNPJ': str}
-        )
-        transacoes_df['CPF/CNPJ'] = transacoes_df['CPF/CNPJ'].str.replace(r'\D', '', regex=True)
-        
-        # Filtra e calcula média
-        transacoes_cliente = transacoes_df[transacoes_df['CPF/CNPJ'] == selected_client]
-        media = transacoes_cliente['VALOR (R$)'].mean()
-        media = round(media, 2) if not transacoes_cliente.empty else 0.0
-        
-        return (
-            f"R$ {media:.2f}",
-            client_data.iloc[0]['frequencia']
-        )
-        
+
+    try:
+        diario, (soma, qtd) = serie_transacoes(selected_client)
     except Exception as e:
-        logging.error(f"Erro nas métricas: {str(e)}")
-        return "Erro", None
+        logging.error(f"Erro ao carregar transações: {str(e)}")
+        return go.Figure(), "Erro", None
 
-@callback(
-    Output('grafico-transacoes', 'figure'),
-    Input('cliente-select', 'value'),
-    prevent_initial_call=True
-)
-def update_transaction_chart(selected_client):
     try:
-        if not selected_client:
-            raise PreventUpdate
-            
-        transacoes_df = pd.read_excel(
-            EXCEL_PATH, 
-            sheet_name='Transacoes',
-            dtype={'CPF/CNPJ': str}
-        )
-        selected_client = re.sub(r'\D', '', str(selected_client))
-        transacoes_df['CPF/CNPJ'] = transacoes_df['CPF/CNPJ'].apply(lambda x: re.sub(r'\D', '', str(x)))
-        filtered_df = transacoes_df[transacoes_df['CPF/CNPJ'] == selected_client].copy()
-        
-        filtered_df['DATA'] = pd.to_datetime(filtered_df['DATA'], dayfirst=True)
-        grouped_df = filtered_df.groupby('DATA', as_index=False)['VALOR (R$)'].sum().sort_values('DATA')
-        
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            x=grouped_df['DATA'],
-            y=grouped_df['VALOR (R$)'],
-            marker_color=COLORS['primary'],
-            name='Transações'
-        ))
-        
-        fig.update_layout(
-            title='Histórico de Transações',
-            title_x=0.5,
-            xaxis_title='Data',
-            yaxis_title='Valor (R$)',
-            plot_bgcolor=COLORS['plot_bg'],
-            paper_bgcolor=COLORS['card'],
-            font=dict(color=COLORS['text']),
-            margin=dict(l=40, r=40, t=60, b=40),
-            xaxis=dict(type='category'),
-            hovermode='x unified'
-        )
-        
-        return fig
-        
+        figura = _grafico_transacoes(diario, agrupamento, visivel)
     except Exception as e:
         logging.error(f"Erro no gráfico: {str(e)}")
-        return go.Figure()
+        figura = go.Figure()
+
+    if not troca_cliente:
+        return figura, dash.no_update, dash.no_update
 
-@callback(
-    Output('registrar-cliente-btn', 'disabled'),
-    Input('cliente-select', 'value')
-)
-def toggle_register_button(selected_client):
-    if not selected_client:
-        return True
-        
     try:
-        analysis_df = load_analysis_data()
-        selected_client = re.sub(r'\D', '', str(selected_client))
-        return selected_client in analysis_df['cpf_cnpj'].values
-    except:
-        return True
+        frequencia = frequencia_cliente(selected_client)
+        if frequencia is None:
+            return figura, "N/A", None
+
+        # Calcula média
+        media = round(soma / qtd, 2) if qtd else 0.0
+        return figura, f"R$ {media:.2f}", frequencia
+
+    except Exception as e:
+        logging.error(f"Erro nas métricas: {str(e)}")
+        return figura, "Erro", None
 
 @callback(
     [
@@ -550,7 +763,7 @@ def toggle_register_button(selected_client):
 def handle_new_client_registration(n_clicks, cpf_cnpj, frequencia):
     if n_clicks and cpf_cnpj and frequencia:
         try:
-            cpf_cnpj = re.sub(r'\D', '', str(cpf_cnpj))
+            cpf_cnpj = esquemas.identificador(cpf_cnpj)
             success = register_new_client(cpf_cnpj, frequencia)
             return (
                 {'timestamp': datetime.now().isoformat()},
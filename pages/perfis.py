@@ -0,0 +1,53 @@
+import dash
+from dash import html, dcc, Input, Output, callback, register_page
+import perfis
+
+register_page(
+    __name__,
+    path='/perfis',
+    title='Perfis de callbacks',
+    name='Perfis de callbacks'
+)
+
+# =============================================
+# LAYOUT
+# =============================================
+layout = html.Div([
+    html.H1("🐢 Perfis de callbacks lentos", style={'textAlign': 'center'}),
+    html.P(
+        f"Captura {'ligada' if perfis.PERFIL_ATIVO else 'desligada (PERFIL_CALLBACKS=1)'} - "
+        f"limite de {perfis.LIMITE_SEGUNDOS:g}s - arquivos em {perfis.PERFIS_PATH}",
+        style={'textAlign': 'center', 'color': '#666'}
+    ),
+    html.Div(
+        html.Button('🔄 Atualizar', id='atualizar-perfis', n_clicks=0),
+        style={'textAlign': 'center', 'marginBottom': '20px'}
+    ),
+    html.Div(id='lista-perfis', style={'padding': '0 40px'})
+])
+
+# =============================================
+# CALLBACKS
+# =============================================
+@callback(
+    Output('lista-perfis', 'children'),
+    Input('atualizar-perfis', 'n_clicks')
+)
+def listar_perfis(_):
+    lista = perfis.listar_perfis()
+    if not lista:
+        return html.P("Nenhum perfil salvo ainda.", style={'textAlign': 'center'})
+
+    itens = []
+    for perfil in lista:
+        try:
+            tabela = perfis.top_funcoes(perfil['arquivo'])
+        except Exception as e:
+            tabela = f"Erro ao ler o perfil: {str(e)}"
+        entradas = '\n'.join(f"{chave} = {valor}" for chave, valor in perfil.get('entradas', {}).items())
+        itens.append(html.Details([
+            html.Summary(f"{perfil.get('data', '')} - {perfil['callback']} - {perfil.get('duracao_s', '?')}s"),
+            html.Pre(entradas, style={'backgroundColor': '#f4f4f4', 'padding': '10px'}),
+            html.Pre(tabela, style={'fontSize': '12px', 'overflowX': 'auto'})
+        ], style={'marginBottom': '10px'}))
+    return itens
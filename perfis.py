@@ -0,0 +1,126 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+
+from flask import g, request
+
+import metricas
+
+
+#REFERENTE AOS PERFIS (cProfile) DOS CALLBACKS LENTOS!!!
+
+logger = logging.getLogger(__name__)
+
+# PERFIL_CALLBACKS=1 liga a captura; só callbacks acima do limite geram dump
+PERFIL_ATIVO = os.environ.get('PERFIL_CALLBACKS', '').lower() in ('1', 'true', 'sim')
+LIMITE_SEGUNDOS = float(os.environ.get('PERFIL_LIMITE_SEGUNDOS', '2'))
+MAX_PERFIS = int(os.environ.get('PERFIL_MAX_ARQUIVOS', '50'))
+MAX_CARACTERES_INPUT = 200
+
+MOUNT_PATH = '/data' if os.environ.get('RENDER') else os.path.join(os.getcwd(), 'data')
+PERFIS_PATH = os.path.join(MOUNT_PATH, 'perfis')
+
+
+def _resumir_valor(valor):
+    texto = json.dumps(valor, ensure_ascii=False, default=str)
+    if len(texto) > MAX_CARACTERES_INPUT:
+        return texto[:MAX_CARACTERES_INPUT] + f'... ({len(texto)} caracteres)'
+    return texto
+
+def _valores_de_entrada():
+    corpo = request.get_json(silent=True) or {}
+    valores = {}
+    for chave in ('inputs', 'state'):
+        for item in corpo.get(chave) or []:
+            # Inputs com wildcard chegam como lista de listas
+            itens = item if isinstance(item, list) else [item]
+            for prop in itens:
+                valores[f"{prop.get('id')}.{prop.get('property')}"] = _resumir_valor(prop.get('value'))
+    return valores
+
+def _limpar_antigos():
+    arquivos = sorted(
+        (f for f in os.listdir(PERFIS_PATH) if f.endswith('.prof')),
+        reverse=True
+    )
+    for arquivo in arquivos[MAX_PERFIS:]:
+        for caminho in (arquivo, arquivo[:-len('.prof')] + '.json'):
+            try:
+                os.remove(os.path.join(PERFIS_PATH, caminho))
+            except OSError:
+                pass
+
+def salvar_perfil(profiler, callback_id, duracao, entradas):
+    """Grava o dump do pstats e um .json com callback, entradas e duração"""
+    os.makedirs(PERFIS_PATH, exist_ok=True)
+    nome = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{re.sub(r'[^A-Za-z0-9_-]+', '_', callback_id)[:80]}"
+    caminho = os.path.join(PERFIS_PATH, nome + '.prof')
+    profiler.dump_stats(caminho)
+    with open(os.path.join(PERFIS_PATH, nome + '.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'callback': callback_id,
+            'duracao_s': round(duracao, 3),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'entradas': entradas,
+        }, f, ensure_ascii=False, indent=2)
+    _limpar_antigos()
+    logger.info(f"Perfil de {callback_id} ({duracao:.2f}s) salvo em {caminho}")
+    return caminho
+
+def listar_perfis(limite=20):
+    """Metadados dos dumps mais recentes, do mais novo para o mais antigo"""
+    if not os.path.isdir(PERFIS_PATH):
+        return []
+    perfis = []
+    for arquivo in sorted((f for f in os.listdir(PERFIS_PATH) if f.endswith('.prof')), reverse=True)[:limite]:
+        caminho = os.path.join(PERFIS_PATH, arquivo)
+        try:
+            with open(caminho[:-len('.prof')] + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {'callback': arquivo, 'entradas': {}}
+        perfis.append({**meta, 'arquivo': caminho})
+    return perfis
+
+def top_funcoes(caminho, n=15):
+    """Tabela texto do pstats ordenada por tempo acumulado"""
+    saida = io.StringIO()
+    pstats.Stats(caminho, stream=saida).strip_dirs().sort_stats('cumulative').print_stats(n)
+    return saida.getvalue()
+
+def _antes():
+    if request.path == metricas.ROTA_CALLBACKS:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: só um profiler ativo por vez no processo
+            return
+        g.perfil = profiler
+        g.perfil_inicio = time.perf_counter()
+
+def _depois(response):
+    profiler = getattr(g, 'perfil', None)
+    if profiler is None:
+        return response
+
+    profiler.disable()
+    duracao = time.perf_counter() - g.perfil_inicio
+    if duracao >= LIMITE_SEGUNDOS:
+        try:
+            salvar_perfil(profiler, metricas.identificar_callback(), duracao, _valores_de_entrada())
+        except Exception as e:
+            logger.error(f"Erro ao salvar perfil: {str(e)}")
+    return response
+
+def registrar(server):
+    """Perfila cada requisição de callback quando PERFIL_CALLBACKS está ligado"""
+    if PERFIL_ATIVO:
+        server.before_request(_antes)
+        server.after_request(_depois)
@@ -0,0 +1,391 @@
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import openpyxl
+import pandas as pd
+from flask import g, has_request_context
+
+import metricas
+
+
+#REFERENTE A LEITURA E ESCRITA DAS PLANILHAS!!!
+# Toda leitura/escrita de Excel do app passa por aqui para poder ser medida.
+
+logger = logging.getLogger(__name__)
+
+# PLANILHAS_TRACE=1 registra um evento por operação e um resumo por requisição
+TRACE_ATIVO = os.environ.get('PLANILHAS_TRACE', '').lower() in ('1', 'true', 'sim')
+TOP_RESUMO = 5
+
+# PLANILHAS_PROCESSOS: processos do pool que faz o parse das abas (1 = sequencial)
+PROCESSOS = int(os.environ.get('PLANILHAS_PROCESSOS', os.cpu_count() or 1))
+
+# O pool sobe no import deste módulo (o app.py importa antes das páginas, que
+# criam as threads dos observadores): fork com outras threads vivas pode levar
+# para o filho um lock travado (logging, imports) e o processo nunca responde.
+# Depois disso nenhum fork novo é feito com threads vivas; sem pool, sequencial.
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+# Sufixo único dos caminhos de versao_fixa
+_leituras = itertools.count()
+
+
+def _nome_arquivo(fonte):
+    if isinstance(fonte, pd.ExcelFile):
+        fonte = fonte.io
+    if isinstance(fonte, (str, os.PathLike)):
+        return os.path.basename(os.fspath(fonte))
+    return '<memória>'
+
+def _tamanho(fonte):
+    if isinstance(fonte, pd.ExcelFile):
+        fonte = fonte.io
+    try:
+        if isinstance(fonte, (str, os.PathLike)):
+            return os.path.getsize(fonte)
+        if isinstance(fonte, io.BytesIO):
+            return fonte.getbuffer().nbytes
+    except OSError:
+        pass
+    return 0
+
+def _linhas(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return sum(len(df) for df in resultado.values())
+    return 0
+
+def _registrar(operacao, fonte, aba, inicio, linhas=0):
+    duracao = time.perf_counter() - inicio
+    if operacao in ('ler', 'abrir', 'carregar', 'procurar'):
+        metricas.registrar_leitura(duracao, linhas)
+
+    if not TRACE_ATIVO:
+        return
+    evento = {
+        'arquivo': _nome_arquivo(fonte),
+        'aba': '*' if aba is None else str(aba),
+        'operacao': operacao,
+        'duracao_ms': round(duracao * 1000, 2),
+        'bytes': _tamanho(fonte),
+        'linhas': linhas,
+        'callback': metricas.identificar_callback() if has_request_context() else None,
+    }
+    if has_request_context():
+        g.setdefault('planilhas_eventos', []).append(evento)
+    logger.info(json.dumps(evento, ensure_ascii=False))
+
+def ler_excel(fonte, **kwargs):
+    """pd.read_excel medido (fonte pode ser caminho, BytesIO ou pd.ExcelFile)"""
+    inicio = time.perf_counter()
+    resultado = pd.read_excel(fonte, **kwargs)
+    _registrar('ler', fonte, kwargs.get('sheet_name', 0), inicio, _linhas(resultado))
+    return resultado
+
+def _fork_disponivel():
+    return PROCESSOS > 1 and 'fork' in multiprocessing.get_all_start_methods()
+
+def _iniciar_pool():
+    global _pool, _pool_pid
+    # fork: o filho não reimporta o app (spawn/forkserver rodariam o app.py de novo)
+    pool = ProcessPoolExecutor(max_workers=PROCESSOS, mp_context=multiprocessing.get_context('fork'))
+    # Com fork o primeiro submit já sobe todos os processos, antes de qualquer outra thread
+    pool.submit(os.getpid).result()
+    _pool, _pool_pid = pool, os.getpid()
+
+def _executor():
+    """Pool deste processo, ou None se criar um agora exigiria fork com threads vivas"""
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            return _pool
+        if threading.active_count() > 1:
+            return None
+        _iniciar_pool()
+        return _pool
+
+def _descartar_executor():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _paralelo(abas):
+    return len(abas) > 1 and _fork_disponivel()
+
+def nomes_abas(caminho):
+    """Nomes das abas lendo só o workbook.xml (modo read_only não carrega as células)"""
+    wb = openpyxl.load_workbook(caminho, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+def _em_paralelo(tarefas, kwargs):
+    """{chave: DataFrame} das tarefas (chave, caminho, aba) lidas no pool; None sem pool ou se ele quebrou"""
+    pool = _executor()
+    if pool is None:
+        return None
+    try:
+        futuros = {
+            chave: pool.submit(pd.read_excel, caminho, sheet_name=aba, **kwargs)
+            for chave, caminho, aba in tarefas
+        }
+        return {chave: futuro.result() for chave, futuro in futuros.items()}
+    except BrokenProcessPool as e:
+        logger.error(f"Pool de leitura quebrou, lendo em sequência: {str(e)}")
+        _descartar_executor()
+        return None
+
+@contextmanager
+def versao_fixa(caminho):
+    """Caminho privado para a versão atual de `caminho`, válido dentro do `with`.
+
+    Um hard link para o mesmo inode: um salvar_workbook no meio troca só o nome
+    original, e todas as aberturas pelo caminho fixo leem a mesma versão. Sem
+    suporte a hard link (os.link falha), faz uma cópia, que custa ler o arquivo
+    inteiro uma vez a mais.
+    """
+    pasta, nome = os.path.split(os.fspath(caminho))
+    fixo = os.path.join(pasta, f'.{nome}.leitura.{os.getpid()}.{threading.get_ident()}.{next(_leituras)}.xlsx')
+    try:
+        os.link(caminho, fixo)
+    except OSError:
+        shutil.copyfile(caminho, fixo)
+    try:
+        yield fixo
+    finally:
+        _descartar(fixo)
+
+def ler_abas(caminho, abas=None, **kwargs):
+    """Como ler_excel(sheet_name=lista/None), com o parse de cada aba num processo do pool.
+
+    Devolve {aba: DataFrame} na ordem pedida (ou na ordem do arquivo). Sem fork
+    disponível, com uma aba só ou PLANILHAS_PROCESSOS=1 o parse é sequencial.
+    Todas as abas saem da mesma versão do arquivo (ver versao_fixa); para
+    escolher as abas pelos nomes, abra a versao_fixa antes e passe o caminho dela.
+    """
+    inicio = time.perf_counter()
+    with versao_fixa(caminho) as fixo:
+        abas = nomes_abas(fixo) if abas is None else list(abas)
+        resultado = None
+        if _paralelo(abas):
+            resultado = _em_paralelo([(aba, fixo, aba) for aba in abas], kwargs)
+        if resultado is None:
+            resultado = pd.read_excel(fixo, sheet_name=abas, **kwargs)
+    _registrar('ler', caminho, None, inicio, _linhas(resultado))
+    return resultado
+
+def ler_arquivos(caminhos, aba=0, **kwargs):
+    """A mesma aba de vários arquivos (ex.: partições), um arquivo por processo do pool.
+
+    Devolve {caminho: DataFrame} na ordem de `caminhos`.
+    """
+    caminhos = list(caminhos)
+    if not caminhos:
+        return {}
+    inicio = time.perf_counter()
+    resultado = None
+    if _paralelo(caminhos):
+        resultado = _em_paralelo([(caminho, caminho, aba) for caminho in caminhos], kwargs)
+    if resultado is None:
+        resultado = {caminho: pd.read_excel(caminho, sheet_name=aba, **kwargs) for caminho in caminhos}
+    _registrar('ler', os.path.dirname(caminhos[0]), aba, inicio, _linhas(resultado))
+    return resultado
+
+@contextmanager
+def _aba_streaming(caminho, aba):
+    # read_only: as linhas são lidas do XML sob demanda, sem montar o DOM do workbook
+    wb = openpyxl.load_workbook(caminho, read_only=True)
+    try:
+        yield wb[aba] if aba in wb.sheetnames else None
+    finally:
+        wb.close()
+
+def ler_colunas(caminho, aba, colunas, texto=()):
+    """Só as `colunas` da aba, lidas em streaming; troca read_excel(usecols=...) nos dropdowns.
+
+    Colunas em `texto` viram str (como dtype=str); células vazias ficam None.
+    """
+    inicio = time.perf_counter()
+    with _aba_streaming(caminho, aba) as ws:
+        if ws is None:
+            raise ValueError(f"Worksheet named '{aba}' not found")
+        linhas = ws.iter_rows(values_only=True)
+        cabecalho = list(next(linhas, ()))
+        faltando = [col for col in colunas if col not in cabecalho]
+        if faltando:
+            raise ValueError(f"Colunas {faltando} não existem na aba '{aba}'")
+        indices = [cabecalho.index(col) for col in colunas]
+        dados = [[linha[i] if i < len(linha) else None for i in indices] for linha in linhas]
+
+    df = pd.DataFrame(dados, columns=colunas)
+    for col in texto:
+        df[col] = df[col].map(lambda valor: None if valor is None else str(valor))
+    _registrar('ler', caminho, aba, inicio, len(df))
+    return df
+
+def procurar_linha(caminho, aba, encontrou, exigir=()):
+    """Percorre a aba em streaming até a primeira linha em que `encontrou(registro)` é verdadeiro.
+
+    `registro` é um dict cabeçalho -> valor. Devolve (cabeçalho, número da linha
+    no Excel) ou (cabeçalho, None); para de ler assim que acha. Aba inexistente
+    devolve (None, None). Faltando no cabeçalho alguma coluna de `exigir`, nenhuma
+    linha é lida e volta (cabeçalho, None).
+    """
+    inicio = time.perf_counter()
+    cabecalho, numero, lidas = None, None, 0
+    with _aba_streaming(caminho, aba) as ws:
+        if ws is not None:
+            linhas = ws.iter_rows(values_only=True)
+            cabecalho = list(next(linhas, ()))
+            if any(col not in cabecalho for col in exigir):
+                linhas = ()
+            for lidas, linha in enumerate(linhas, start=1):
+                if encontrou(dict(zip(cabecalho, linha))):
+                    numero = lidas + 1
+                    break
+    _registrar('procurar', caminho, aba, inicio, lidas)
+    return cabecalho, numero
+
+def abrir_excel(fonte, **kwargs):
+    """pd.ExcelFile medido; o parse do arquivo acontece aqui, as abas depois em ler_excel"""
+    inicio = time.perf_counter()
+    excel = pd.ExcelFile(fonte, **kwargs)
+    _registrar('abrir', fonte, None, inicio)
+    return excel
+
+def carregar_workbook(caminho, **kwargs):
+    """openpyxl.load_workbook medido"""
+    inicio = time.perf_counter()
+    wb = openpyxl.load_workbook(caminho, **kwargs)
+    _registrar('carregar', caminho, None, inicio)
+    return wb
+
+# Escritas em arquivo nunca mexem no arquivo que os leitores têm aberto: grava
+# uma versão nova ao lado e troca o nome com os.replace (atômico no mesmo disco).
+# Quem já abriu a versão anterior continua lendo ela inteira até fechar; quem
+# abrir depois pega a nova completa. Nenhum leitor vê zip pela metade. Uma
+# leitura que abre o arquivo mais de uma vez (pool, nomes + abas) precisa da
+# versao_fixa para não misturar versões.
+#
+# Isso vale para POSIX (Linux no Render), onde trocar o nome de um arquivo
+# aberto é permitido e o leitor continua com o inode antigo. No Windows o
+# os.replace falha com PermissionError enquanto alguém tem o destino aberto:
+# trocar_arquivo tenta de novo algumas vezes antes de desistir, e a versao_fixa
+# cai para uma cópia quando o hard link não é possível (FAT, alguns compartilhamentos).
+TROCA_TENTATIVAS = int(os.environ.get('PLANILHAS_TROCA_TENTATIVAS', '5'))
+TROCA_ESPERA_SEGUNDOS = 0.1
+
+def _em_arquivo(destino):
+    return isinstance(destino, (str, os.PathLike))
+
+def _versao_nova(caminho):
+    pasta, nome = os.path.split(os.fspath(caminho))
+    # Começa com ponto e termina em .xlsx: o pandas/openpyxl reconhecem o formato
+    return os.path.join(pasta, f'.{nome}.{os.getpid()}.{threading.get_ident()}.xlsx')
+
+def _descartar(temporario):
+    try:
+        os.remove(temporario)
+    except OSError:
+        pass
+
+def trocar_arquivo(temporario, destino):
+    """os.replace(temporario, destino), repetindo enquanto o destino estiver preso (Windows)"""
+    for tentativa in range(TROCA_TENTATIVAS):
+        try:
+            os.replace(temporario, destino)
+            return
+        except PermissionError:
+            if tentativa == TROCA_TENTATIVAS - 1:
+                raise
+            logger.warning(f"{_nome_arquivo(destino)} em uso, tentando trocar de novo")
+            time.sleep(TROCA_ESPERA_SEGUNDOS * (tentativa + 1))
+
+def salvar_workbook(wb, caminho):
+    """wb.save medido, gravando uma versão nova e trocando o arquivo de uma vez"""
+    inicio = time.perf_counter()
+    if not _em_arquivo(caminho):
+        wb.save(caminho)
+    else:
+        temporario = _versao_nova(caminho)
+        try:
+            wb.save(temporario)
+            trocar_arquivo(temporario, caminho)
+        except BaseException:
+            _descartar(temporario)
+            raise
+    _registrar('salvar', caminho, None, inicio)
+
+@contextmanager
+def escritor_excel(destino, **kwargs):
+    """pd.ExcelWriter medido do início do bloco `with` até o arquivo fechado.
+
+    Em arquivo, escreve numa versão nova e só troca o destino quando o
+    writer fecha sem erro (mode='a' parte de uma cópia do atual).
+    """
+    inicio = time.perf_counter()
+    alvo = _versao_nova(destino) if _em_arquivo(destino) else destino
+    try:
+        if alvo is not destino and kwargs.get('mode') == 'a' and os.path.exists(destino):
+            shutil.copyfile(destino, alvo)
+        with pd.ExcelWriter(alvo, **kwargs) as writer:
+            yield writer
+        if alvo is not destino:
+            trocar_arquivo(alvo, destino)
+    except BaseException:
+        if alvo is not destino:
+            _descartar(alvo)
+        raise
+    _registrar('escrever', destino, ','.join(writer.sheets) or None, inicio)
+
+def resumo(eventos, top=TOP_RESUMO):
+    """Agrupa eventos por arquivo/operação/aba e ordena pelo tempo total"""
+    grupos = {}
+    for evento in eventos:
+        chave = (evento['arquivo'], evento['operacao'], evento['aba'])
+        grupo = grupos.setdefault(chave, {'chamadas': 0, 'duracao_ms': 0.0, 'linhas': 0})
+        grupo['chamadas'] += 1
+        grupo['duracao_ms'] += evento['duracao_ms']
+        grupo['linhas'] += evento['linhas']
+
+    ordenados = sorted(grupos.items(), key=lambda item: item[1]['duracao_ms'], reverse=True)
+    return [
+        {'arquivo': arquivo, 'operacao': operacao, 'aba': aba, **valores}
+        for (arquivo, operacao, aba), valores in ordenados[:top]
+    ]
+
+def _resumo_da_requisicao(response):
+    eventos = getattr(g, 'planilhas_eventos', None)
+    if eventos:
+        total = sum(evento['duracao_ms'] for evento in eventos)
+        logger.info(
+            f"I/O de planilhas em {metricas.identificar_callback()}: {len(eventos)} operações, "
+            f"{total:.1f} ms - " + json.dumps(resumo(eventos), ensure_ascii=False)
+        )
+    return response
+
+def registrar(server):
+    """Loga o resumo dos maiores consumidores de I/O ao fim de cada requisição"""
+    if TRACE_ATIVO:
+        server.after_request(_resumo_da_requisicao)
+
+# Pool criado já no import, com o processo ainda numa thread só
+if _fork_disponivel() and threading.active_count() == 1:
+    try:
+        _iniciar_pool()
+    except Exception as e:
+        logger.error(f"Pool de leitura não subiu, parse sequencial: {str(e)}")
@@ -0,0 +1,104 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import esquemas
+
+
+#REFERENTE À PREVISÃO DE FATURAMENTO!!!
+# Projeção do próximo mês de todos os clientes numa passada só, sobre a matriz
+# clientes × meses da Sheet1. Mês com faturamento até R$ 1 conta como inativo
+# (NaN) e não entra em nenhum método, igual ao gráfico mensal.
+
+logger = logging.getLogger(__name__)
+
+METODOS = {
+    'media': 'Média',
+    'ponderada': 'Média ponderada recente',
+    'exponencial': 'Suavização exponencial'
+}
+METODO_PADRAO = os.environ.get('PREVISAO_METODO', 'media')
+# Peso do mês mais recente na suavização exponencial
+ALFA = float(os.environ.get('PREVISAO_ALFA', '0.5'))
+FATURAMENTO_MINIMO = 1
+
+
+def matriz_faturamento(df_cadastros, colunas, chave=esquemas.NOME_CADASTRO):
+    """(clientes, matriz float clientes × meses) com NaN nos meses inativos.
+
+    Linhas com a mesma chave são somadas mês a mês.
+    """
+    valores = df_cadastros[[chave] + list(colunas)].copy()
+    valores[colunas] = valores[colunas].apply(pd.to_numeric, errors='coerce')
+    valores = valores[valores[chave].notna()].groupby(chave, sort=False)[colunas].sum(min_count=1)
+    matriz = valores.to_numpy(dtype=float)
+    matriz[~(matriz > FATURAMENTO_MINIMO)] = np.nan
+    return valores.index, matriz
+
+def _media(matriz):
+    validos = ~np.isnan(matriz)
+    quantidade = validos.sum(axis=1)
+    soma = np.where(validos, matriz, 0).sum(axis=1)
+    return np.divide(soma, quantidade, out=np.zeros(len(matriz)), where=quantidade > 0)
+
+def _ponderada(matriz):
+    # Peso linear pela posição do mês: o mais recente pesa mais
+    validos = ~np.isnan(matriz)
+    pesos = np.where(validos, np.arange(1, matriz.shape[1] + 1), 0)
+    soma = (np.where(validos, matriz, 0) * pesos).sum(axis=1)
+    total = pesos.sum(axis=1)
+    return np.divide(soma, total, out=np.zeros(len(matriz)), where=total > 0)
+
+def _exponencial(matriz, alfa=None):
+    # Nível começa no primeiro mês ativo; meses inativos mantêm o nível anterior
+    alfa = ALFA if alfa is None else alfa
+    nivel = np.full(len(matriz), np.nan)
+    for coluna in matriz.T:
+        validos = ~np.isnan(coluna)
+        nivel = np.where(validos & np.isnan(nivel), coluna, nivel)
+        nivel = np.where(validos, alfa * coluna + (1 - alfa) * nivel, nivel)
+    return np.nan_to_num(nivel)
+
+_CALCULOS = {
+    'media': _media,
+    'ponderada': _ponderada,
+    'exponencial': _exponencial
+}
+
+def prever(matriz, metodo=METODO_PADRAO):
+    """Previsão do próximo mês de cada linha da matriz (0 para quem nunca faturou)"""
+    if metodo not in _CALCULOS:
+        raise ValueError(f"Método de previsão desconhecido: {metodo}")
+    return _CALCULOS[metodo](matriz)
+
+def projetar(df_cadastros, colunas, chave=esquemas.NOME_CADASTRO):
+    """Tabela por cliente com o último mês ativo e a previsão de cada método.
+
+    Colunas: 'Último Mês' (coluna de `colunas`, ou None), 'Último Faturamento'
+    e uma coluna por método de METODOS.
+    """
+    if df_cadastros.empty:
+        return pd.DataFrame(columns=['Último Mês', 'Último Faturamento'] + list(METODOS))
+
+    clientes, matriz = matriz_faturamento(df_cadastros, colunas, chave)
+    validos = ~np.isnan(matriz)
+    ativo = validos.any(axis=1)
+    # Índice da última coluna ativa de cada cliente
+    ultimo = matriz.shape[1] - 1 - np.argmax(validos[:, ::-1], axis=1)
+
+    projecoes = pd.DataFrame(index=clientes)
+    projecoes['Último Mês'] = np.where(ativo, np.asarray(colunas, dtype=object)[ultimo], None)
+    projecoes['Último Faturamento'] = np.where(ativo, matriz[np.arange(len(matriz)), ultimo], 0.0)
+    for metodo in METODOS:
+        projecoes[metodo] = prever(matriz, metodo)
+
+    logger.info(f"Previsões calculadas para {len(projecoes)} clientes")
+    return projecoes
+
+def ranking(projecoes, metodo=METODO_PADRAO, limite=None):
+    """Clientes ativos ordenados pela previsão do método, do maior para o menor"""
+    ativos = projecoes[projecoes['Último Mês'].notna()]
+    ordenado = ativos.sort_values(metodo, ascending=False)
+    return ordenado if limite is None else ordenado.head(limite)